@@ -1,7 +1,7 @@
+import asyncio
 import os
 import time
 
-import redis.asyncio as redis
 import uvicorn
 from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.responses import HTMLResponse
@@ -10,11 +10,18 @@ from fastapi.templating import Jinja2Templates
 from fastapi_limiter import FastAPILimiter
 from fastapi_pagination import add_pagination
 from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.responses import RedirectResponse
 
-from src.database.db import get_db
+from src.database.db import get_db, AsyncSessionLocal, redis_client
+from src.repository import tags as repository_tags
 from src.routes import users, auth, images, comments, ratings
+from src.services.asyncdevlogging import logger
+from src.services.auth import auth_service
+from src.services.cloud_image import upload_service
+from src.services.storage import ImmutableStaticFiles
+from src.services.transformations import LocalEngine
+from src.services.outbox import email_outbox
 
 from starlette.middleware.cors import CORSMiddleware
 from src.conf.config import settings
@@ -40,13 +47,41 @@ async def startup():
 
     :return: A dictionary, which is used as the context for the app
     """
-    r = await redis.Redis(
-        host=settings.redis_host,
-        port=settings.redis_port,
-        password=settings.redis_password,
-        ssl=True,
-    )
-    await FastAPILimiter.init(r)
+    await FastAPILimiter.init(redis_client)
+
+    async with AsyncSessionLocal() as db:
+        await repository_tags.tag_cache.warm(db)
+    app.state.user_cache_listener = asyncio.create_task(auth_service.token_manager.user_cache.listen(redis_client))
+    app.state.revocation_listener = asyncio.create_task(auth_service.token_manager.revocation_list.listen())
+    app.state.revocation_rebuild = asyncio.create_task(auth_service.token_manager.revocation_list.rebuild())
+    app.state.token_version_listener = asyncio.create_task(
+        auth_service.token_manager.token_versions.listen(redis_client))
+    app.state.email_worker = asyncio.create_task(email_outbox.run())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    The shutdown function is called when the application stops.
+    It stops the background tasks and worker processes started by the application.
+
+    :return: None
+    """
+    if hasattr(app.state, 'user_cache_listener'):
+        app.state.user_cache_listener.cancel()
+    if hasattr(app.state, 'revocation_listener'):
+        app.state.revocation_listener.cancel()
+    if hasattr(app.state, 'revocation_rebuild'):
+        app.state.revocation_rebuild.cancel()
+    if hasattr(app.state, 'token_version_listener'):
+        app.state.token_version_listener.cancel()
+    if hasattr(app.state, 'email_worker'):
+        app.state.email_worker.cancel()
+    auth_service.password_manager.shutdown()
+    upload_service.shutdown()
+    LocalEngine.shutdown()
+    logger.close()
+    await redis_client.aclose()
 
 
 @app.middleware('http')
@@ -68,6 +103,9 @@ async def custom_middleware(request: Request, call_next):
 
 app.mount("/static", StaticFiles(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")), name="static")
 app.mount("/src", StaticFiles(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")), name="src")
+if settings.storage_backend == 'local':
+    os.makedirs(settings.storage_local_root, exist_ok=True)
+    app.mount(settings.storage_local_url, ImmutableStaticFiles(directory=settings.storage_local_root), name="media")
 app.mount("/docs", StaticFiles(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), "docs")), name="docs")
 
 templates = Jinja2Templates(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates"))
@@ -98,18 +136,18 @@ async def project(request: Request):
 
 
 @app.get("/api/healthchecker")
-def healthchecker(db: Session = Depends(get_db)):
+async def healthchecker(db: AsyncSession = Depends(get_db)):
     """
     The healthchecker function is a simple function that checks the health of the database.
     It does this by making a request to the database and checking if it returns any results.
     If there are no results, then we know something is wrong with our connection to the database.
 
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A json object with a message
     """
     try:
         # Make request
-        result = db.execute(text("SELECT 1")).fetchone()
+        result = (await db.execute(text("SELECT 1"))).fetchone()
         if result is None:
             raise HTTPException(
                 status_code=500, detail="Database is not configured correctly"
@@ -123,6 +161,38 @@ def healthchecker(db: Session = Depends(get_db)):
         )
 
 
+@app.get("/api/healthchecker/email")
+async def email_healthchecker():
+    """
+    The email_healthchecker function reports the state of the email outbox:
+    how many emails are queued, due and dead, and the lag of the oldest due email in seconds.
+
+    :return: A json object with the outbox metrics
+    """
+    return await email_outbox.metrics()
+
+
+@app.get("/api/healthchecker/password_hashing")
+async def password_hashing_healthchecker():
+    """
+    The password_hashing_healthchecker function reports the state of the password hashing pool:
+    the calls in flight and waiting for a worker, and how long they waited, in seconds.
+
+    :return: A json object with the pool metrics
+    """
+    return auth_service.password_manager.metrics()
+
+
+@app.get("/api/healthchecker/tag_cache")
+async def tag_cache_healthchecker():
+    """
+    The tag_cache_healthchecker function reports the hits, misses and size of the tag cache of this worker.
+
+    :return: A json object with the cache statistics
+    """
+    return repository_tags.tag_cache.info()
+
+
 app.include_router(users.router, prefix='/api')
 app.include_router(auth.router, prefix='/api')
 app.include_router(images.router, prefix='/api')
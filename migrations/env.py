@@ -7,6 +7,7 @@ from alembic import context
 
 
 from src.conf.config import settings as app_config
+from src.database.db import get_sync_url
 from src.database.models import Base
 
 # this is the Alembic Config object, which provides
@@ -23,7 +24,10 @@ if config.config_file_name is not None:
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
-config.set_main_option("sqlalchemy.url", app_config.sqlalchemy_database_url)
+config.set_main_option(
+    "sqlalchemy.url",
+    get_sync_url(app_config.sqlalchemy_database_url).render_as_string(hide_password=False),
+)
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
@@ -0,0 +1,26 @@
+"""user_token_version
+
+Revision ID: 3b7e5a9c0d12
+Revises: 8f2b6c4d1e93
+Create Date: 2026-10-16 21:40:08.114262
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7e5a9c0d12'
+down_revision: Union[str, None] = '8f2b6c4d1e93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'token_version')
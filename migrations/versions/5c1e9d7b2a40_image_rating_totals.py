@@ -0,0 +1,41 @@
+"""image_rating_totals
+
+Revision ID: 5c1e9d7b2a40
+Revises: fb33f2e4ddf3
+Create Date: 2026-10-16 10:12:41.305118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e9d7b2a40'
+down_revision: Union[str, None] = 'fb33f2e4ddf3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('images', sa.Column('rating_sum', sa.Float(), server_default='0', nullable=False))
+    op.add_column('images', sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+    # backfill totals from the existing ratings
+    op.execute(
+        """
+        UPDATE images
+        SET rating_sum = totals.rating_sum, rating_count = totals.rating_count
+        FROM (
+            SELECT image_id, SUM(rating) AS rating_sum, COUNT(*) AS rating_count
+            FROM ratings
+            GROUP BY image_id
+        ) AS totals
+        WHERE images.id = totals.image_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('images', 'rating_count')
+    op.drop_column('images', 'rating_sum')
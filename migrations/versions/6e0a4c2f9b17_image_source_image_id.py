@@ -0,0 +1,32 @@
+"""image_source_image_id
+
+Revision ID: 6e0a4c2f9b17
+Revises: 3b7e5a9c0d12
+Create Date: 2026-10-16 23:12:45.308117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e0a4c2f9b17'
+down_revision: Union[str, None] = '3b7e5a9c0d12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('images', sa.Column('source_image_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('images_source_image_id_fkey', 'images', 'images', ['source_image_id'], ['id'],
+                          ondelete='SET NULL')
+    # images transformed before this revision have no source_image_id, NULLs do not conflict in the index
+    op.create_index('ux_images_source_image_id_type', 'images', ['source_image_id', 'type'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ux_images_source_image_id_type', table_name='images')
+    op.drop_constraint('images_source_image_id_fkey', 'images', type_='foreignkey')
+    op.drop_column('images', 'source_image_id')
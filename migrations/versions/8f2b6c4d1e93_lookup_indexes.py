@@ -0,0 +1,41 @@
+"""lookup_indexes
+
+Revision ID: 8f2b6c4d1e93
+Revises: 5c1e9d7b2a40
+Create Date: 2026-10-16 11:02:17.540392
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f2b6c4d1e93'
+down_revision: Union[str, None] = '5c1e9d7b2a40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+indexes = [
+    ('ix_ratings_image_id', 'ratings', ['image_id']),
+    ('ix_comments_image_id_id', 'comments', ['image_id', 'id']),
+    ('ix_comments_user_id', 'comments', ['user_id']),
+    ('ix_images_user_id_id', 'images', ['user_id', 'id']),
+    ('ix_image_m2m_tag_tag_id_image_id', 'image_m2m_tag', ['tag_id', 'image_id']),
+    ('ix_image_m2m_tag_image_id_tag_id', 'image_m2m_tag', ['image_id', 'tag_id']),
+    ('ix_users_username', 'users', ['username']),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY can not run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, table, columns in indexes:
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(indexes):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,32 @@
+"""image_content_hash
+
+Revision ID: d41c7b8e3a65
+Revises: 6e0a4c2f9b17
+Create Date: 2026-10-16 23:58:21.640913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41c7b8e3a65'
+down_revision: Union[str, None] = '6e0a4c2f9b17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('images', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    # CREATE INDEX CONCURRENTLY can not run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.create_index('ix_images_content_hash', 'images', ['content_hash'], if_not_exists=True,
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_images_content_hash', table_name='images', if_exists=True, postgresql_concurrently=True)
+    op.drop_column('images', 'content_hash')
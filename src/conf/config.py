@@ -18,12 +18,56 @@ class Settings(BaseSettings):
     mail_port: int = 465
     mail_server: str = "smtp.meta.ua"
     mail_from_name: str = "ImageIQ"
+    email_batch_size: int = 20
+    email_max_attempts: int = 5
+    email_retry_backoff: float = 30
+    email_retry_backoff_max: float = 3600
+    email_dead_max: int = 1000
+    email_dead_ttl: int = 7 * 86400
     redis_host: str = "localhost"
     redis_port: int = 6379
     redis_password: str | None = None
+    redis_ssl: bool = True
+    redis_max_connections: int = 50
+    tag_cache_size: int = 1000
+    user_cache_size: int = 1000
+    user_cache_ttl: int = 10
+    decoded_token_cache_size: int = 10000
+    revocation_bloom_capacity: int = 100000
+    revocation_bloom_error_rate: float = 0.01
+    revocation_bloom_rebuild_interval: float = 3600
+    qrcode_cache_size: int = 256
+    qrcode_cache_ttl: int = 86400
+    password_hash_workers: int = 2
+    password_hash_queue_size: int = 64
+    log_file: str | None = None
+    log_level: str = "info"
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_rotate_interval: float = 86400
+    log_backup_count: int = 5
+    log_queue_size: int = 10000
+    log_batch_size: int = 500
+    log_flush_interval: float = 1.0
+    log_sample_rates: dict[str, float] = {"debug": 0.1}
+    storage_backend: str = "cloudinary"
+    storage_local_root: str = "media"
+    storage_local_url: str = "/media"
+    storage_public_url: str | None = None
+    transformation_engine: str = "cloudinary"
+    transformation_workers: int = 2
+    transformation_queue_size: int = 16
+    transformation_timeout: float = 30
+    s3_bucket: str = "imageiq"
+    s3_endpoint_url: str | None = None
+    s3_access_key: str | None = None
+    s3_secret_key: str | None = None
+    s3_region: str | None = None
     cloudinary_name: str = "cloudinary_name"
     cloudinary_api_key: str = "1111"
     cloudinary_api_secret: str = "1111"
+    cloudinary_upload_workers: int = 4
+    cloudinary_upload_queue_size: int = 16
+    cloudinary_upload_timeout: float = 30
 
     @field_validator("algorithm")
     @classmethod
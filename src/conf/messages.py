@@ -38,3 +38,10 @@ USER_NOT_FOUND = "User not found"
 MSC403_FORBIDDEN = 'Operation forbidden.'
 USER_ROLE_NOT_UPDATED = "Not`updated"
 YOU_ARE_BANNED = "You are banned"
+MSC400_INVALID_CURSOR = "Invalid cursor"
+MSC503_PASSWORD_QUEUE_FULL = "Too many password checks in progress, try again later"
+MSC503_UPLOAD_QUEUE_FULL = "Too many uploads in progress, try again later"
+MSC504_UPLOAD_TIMEOUT = "Image upload timed out"
+MSC501_TRANSFORMATION_NOT_SUPPORTED = "Transformations are not supported by the image storage"
+MSC503_TRANSFORMATION_QUEUE_FULL = "Too many transformations in progress, try again later"
+MSC504_TRANSFORMATION_TIMEOUT = "Image transformation timed out"
@@ -1,33 +1,86 @@
 import configparser
 import pathlib
 
+import redis.asyncio as redis
 from fastapi import HTTPException, status
 from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
 from src.conf.config import settings
 
 
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+    'sqlite+pysqlite': 'sqlite+aiosqlite',
+}
+SYNC_DRIVERS = {
+    'postgresql+asyncpg': 'postgresql+psycopg2',
+    'sqlite+aiosqlite': 'sqlite',
+}
+
+
+def get_async_url(url: str | URL) -> URL:
+    """
+    The get_async_url function converts a database url to the one with an asyncio driver.
+    Urls that already use an asyncio driver are returned unchanged.
+
+    :param url: str | URL: Database url from the settings
+    :return: A database url suitable for create_async_engine
+    """
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+
+def get_sync_url(url: str | URL) -> URL:
+    """
+    The get_sync_url function converts a database url to the one with a blocking driver.
+    It is used by alembic, scripts and tests that work with the plain Session.
+
+    :param url: str | URL: Database url from the settings
+    :return: A database url suitable for create_engine
+    """
+    url = make_url(url)
+    return url.set(drivername=SYNC_DRIVERS.get(url.drivername, url.drivername))
+
+
 URI = settings.sqlalchemy_database_url
 
-engine = create_engine(URI)
+engine = create_engine(get_sync_url(URI))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(get_async_url(URI))
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# one connection pool for the user cache, token blacklist and rate limiter;
+# the client is created at import, because the services that share it are module-level singletons,
+# but no connection is opened until first use inside the event loop.
+# TLS is on by default, as before the pool was shared; set REDIS_SSL=false for a local Redis without TLS
+redis_client = redis.Redis(
+    host=settings.redis_host,
+    port=settings.redis_port,
+    password=settings.redis_password,
+    ssl=settings.redis_ssl,
+    max_connections=settings.redis_max_connections,
+)
+
 
-def get_db():
+async def get_db():
     """
-    The get_db function is a context manager that returns the database session.
+    The get_db function is an async dependency that returns the database session.
     It also handles any exceptions that may occur during the session, and closes
     the connection when it's done.
 
-    :return: A database session
+    :return: An async database session
     """
-    db = SessionLocal()
-    try:
-        yield db
-    except SQLAlchemyError as err:
-        db.rollback()
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
-    finally:
-        db.close()
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except SQLAlchemyError as err:
+            await db.rollback()
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
@@ -3,14 +3,9 @@ from datetime import date
 from typing import List
 
 from sqlalchemy import (String, Integer, ForeignKey, DateTime, func, Enum, Boolean,
-                        Float, CheckConstraint, UniqueConstraint, select)
-from sqlalchemy.ext.hybrid import hybrid_property
+                        Float, CheckConstraint, UniqueConstraint, Index, select)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
-from src.database.db import SessionLocal
-
-session = SessionLocal()
-
 
 class Base(DeclarativeBase):
     pass
@@ -25,7 +20,7 @@ class Role(enum.Enum):
 class User(Base):
     __tablename__ = "users"
     id: Mapped[int] = mapped_column(primary_key=True)
-    username: Mapped[str] = mapped_column(String(50))
+    username: Mapped[str] = mapped_column(String(50), index=True)
     email: Mapped[str] = mapped_column(String(150), nullable=False, unique=True)
     password: Mapped[str] = mapped_column(String(255), nullable=False)
     avatar: Mapped[str] = mapped_column(String(255), nullable=True)
@@ -39,6 +34,7 @@ class User(Base):
     )
     confirmed: Mapped[bool] = mapped_column(Boolean, default=False, nullable=True)
     status_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    token_version: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
 
 
 class TransformationsType(enum.Enum):
@@ -59,6 +55,11 @@ class ImageM2MTag(Base):
     image_id: Mapped[int] = mapped_column(Integer, ForeignKey('images.id', ondelete='CASCADE'))
     tag_id: Mapped[int] = mapped_column(Integer, ForeignKey('tags.id', ondelete='CASCADE'))
 
+    __table_args__ = (
+        Index('ix_image_m2m_tag_tag_id_image_id', 'tag_id', 'image_id'),
+        Index('ix_image_m2m_tag_image_id_tag_id', 'image_id', 'tag_id'),
+    )
+
 
 class Tag(Base):
     __tablename__ = "tags"
@@ -74,19 +75,25 @@ class Image(Base):
     link: Mapped[str] = mapped_column(String, nullable=False)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=True)
     user: Mapped[User] = relationship("User", backref='images')
-    tags: Mapped[List[Tag]] = relationship("Tag", secondary="image_m2m_tag", backref='images')
+    source_image_id: Mapped[int] = mapped_column(Integer, ForeignKey('images.id', ondelete='SET NULL'), nullable=True)
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=True)
+    tags: Mapped[List[Tag]] = relationship("Tag", secondary="image_m2m_tag", backref='images', lazy='selectin')
+    rating_sum: Mapped[float] = mapped_column(Float, default=0, server_default='0', nullable=False)
+    rating_count: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
     created_at: Mapped[date] = mapped_column(DateTime, default=func.now())
     updated_at: Mapped[date] = mapped_column(DateTime, default=func.now(), onupdate=func.now())
 
-    @hybrid_property
-    def rating(self):
-        try:
-            avg_rating = (session.query(func.avg(Rating.rating))
-                          .filter(Rating.image_id == self.id)
-                          .group_by(Rating.image_id).scalar())
-            return avg_rating or 0.0
-        except Exception:
+    __table_args__ = (
+        Index('ix_images_user_id_id', 'user_id', 'id'),
+        Index('ux_images_source_image_id_type', 'source_image_id', 'type', unique=True),
+        Index('ix_images_content_hash', 'content_hash'),
+    )
+
+    @property
+    def rating(self) -> float:
+        if not self.rating_count:
             return 0.0
+        return self.rating_sum / self.rating_count
 
 
 class Comment(Base):
@@ -100,6 +107,11 @@ class Comment(Base):
     created_at: Mapped[date] = mapped_column(DateTime, default=func.now())
     updated_at: Mapped[date] = mapped_column(DateTime, default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        Index('ix_comments_image_id_id', 'image_id', 'id'),
+        Index('ix_comments_user_id', 'user_id'),
+    )
+
 
 class Rating(Base):
     __tablename__ = 'ratings'
@@ -113,4 +125,6 @@ class Rating(Base):
     created_at: Mapped[date] = mapped_column(DateTime, default=func.now())
 
     __table_args__ = (
-        UniqueConstraint('user_id', 'image_id', name='_user_image_uc'),)
+        UniqueConstraint('user_id', 'image_id', name='_user_image_uc'),
+        Index('ix_ratings_image_id', 'image_id'),
+    )
@@ -1,16 +1,17 @@
 from typing import Optional, List, Type
 
 from fastapi import HTTPException, status
-from sqlalchemy import desc
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import Comment, User
 from src.conf import messages
-from src.schemas.images import CommentModel, SortDirection
+from src.schemas.images import CommentModel, SortDirection, CursorParams
+from src.services.cursor import paginate_by_cursor
 
 
 async def add_comment(
-    body: CommentModel, image_id: int, user: User, db: Session
+    body: CommentModel, image_id: int, user: User, db: AsyncSession
 ) -> Optional[Comment]:
     """
     The add_comment function creates a new comment for an image.
@@ -22,13 +23,13 @@ async def add_comment(
     :param body: CommentModel: Get the comment from the request body
     :param image_id: int: Get the image id from the url
     :param user: dict: Get the user id from the token
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: A comment object
     """
     comment = Comment(comment=body.comment, user_id=user.id, image_id=image_id)
     db.add(comment)
-    db.commit()
-    db.refresh(comment)
+    await db.commit()
+    await db.refresh(comment)
 
     return comment
 
@@ -37,7 +38,7 @@ async def update_comment(
     comment_id: int,
     body: CommentModel,
     user: User,
-    db: Session,
+    db: AsyncSession,
 ) -> Optional[Comment]:
     """
     The update_comment function updates a comment in the database.
@@ -49,11 +50,12 @@ async def update_comment(
     :param comment_id: int: Identify the comment to be deleted
     :param body: CommentModel: Get the comment from the request body
     :param user: dict: Check if the user is authorized to delete a comment
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :param : Get the comment id
     :return: The updated comment
     """
-    comment: Optional[Comment] = db.query(Comment).filter_by(id=comment_id).first()
+    result = await db.execute(select(Comment).filter_by(id=comment_id))
+    comment: Optional[Comment] = result.scalar_one_or_none()
 
     if not comment or not body.comment:
         return None
@@ -66,24 +68,23 @@ async def update_comment(
 
     comment.comment = body.comment
     db.add(comment)
-    db.commit()
-    db.refresh(comment)
+    await db.commit()
+    await db.refresh(comment)
 
     return comment
 
 
-async def remove_comment(comment_id: int, user: User, db: Session) -> dict:
+async def remove_comment(comment_id: int, user: User, db: AsyncSession) -> dict:
     """
     The remove_comment function deletes a comment from the database.
 
     :param comment_id: int: Specify the id of the comment that is to be deleted
     :param user: User: Check if the user is authorized to delete a comment
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: A dictionary with a message that the comment has been deleted
     """
-    comment: Optional[Comment] = (
-        db.query(Comment).filter_by(id=comment_id).first()
-    )
+    result = await db.execute(select(Comment).filter_by(id=comment_id))
+    comment: Optional[Comment] = result.scalar_one_or_none()
 
     if comment is None:
         raise HTTPException(
@@ -91,8 +92,8 @@ async def remove_comment(comment_id: int, user: User, db: Session) -> dict:
             detail=messages.MSC404_COMMENT_NOT_FOUND,
         )
 
-    db.delete(comment)
-    db.commit()
+    await db.delete(comment)
+    await db.commit()
 
     return {"message": messages.COMMENT_DELETED}
 
@@ -106,10 +107,11 @@ async def get_comments(image_id, db) -> List[Comment]:
     :param db: Query the database for comments that are associated with a specific image
     :return: All comments associated with a particular image
     """
-    return db.query(Comment).filter_by(image_id=image_id).all()
+    result = await db.execute(select(Comment).filter_by(image_id=image_id))
+    return list(result.scalars().all())
 
 
-async def get_comment_by_id(comment_id: int, db: Session) -> Type[Comment]:
+async def get_comment_by_id(comment_id: int, db: AsyncSession) -> Type[Comment]:
     """
     The get_comment_by_id function takes in a comment_id and a database connection,
     and returns the comment associated with the given comment_id.
@@ -118,25 +120,24 @@ async def get_comment_by_id(comment_id: int, db: Session) -> Type[Comment]:
     :param db: Query the database for a comment by its unique identifier
     :return: The comment associated with a particular comment_id
     """
-    return db.query(Comment).filter_by(id=comment_id).first()
+    result = await db.execute(select(Comment).filter_by(id=comment_id))
+    return result.scalar_one_or_none()
 
 
-async def get_comments_by_image(image_id: int, sort_direction: SortDirection, db: Session) -> List[Type[Comment]]:
+async def get_comments_by_image(
+    image_id: int,
+    sort_direction: SortDirection,
+    cursor_params: CursorParams,
+    db: AsyncSession,
+) -> dict:
     """
-    The get_comments_by_image function returns a list of comments for the image with the given id.
-    Args:
-    image_id (int): The id of an image in the database.
-    db (Session): A database session object to query from.
+    The get_comments_by_image function returns a page of comments for the image with the given id.
+    Comments are read by the (image_id, id) index, and the next page continues after the id stored in the cursor.
     :param image_id: int: Filter the comments by image id
     :param sort_direction: SortDirection: The sort direction of the comments
-    :param db: Session: Pass the database session into the function
-    :return: A list of comments that are associated with a specific image
+    :param cursor_params: CursorParams: Page size and the cursor of the previous page
+    :param db: AsyncSession: Pass the database session into the function
+    :return: A dict with the comments of the page and the cursor of the next page
     """
-    query = db.query(Comment).filter_by(image_id=image_id)
-    if sort_direction == SortDirection.desc:
-        comments = query.order_by(desc(Comment.id)).all()
-    else:
-        comments = query.order_by(Comment.id).all()
-
-    return comments
-
+    query = select(Comment).filter_by(image_id=image_id)
+    return await paginate_by_cursor(db, query, Comment.id, cursor_params, sort_direction)
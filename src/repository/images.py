@@ -1,37 +1,46 @@
 from typing import Optional, List, Type
 
+import redis.asyncio as redis
 from fastapi import HTTPException, status
 from fastapi_pagination import Page, Params
 from fastapi_pagination.ext.sqlalchemy import paginate
-from sqlalchemy import desc
-from sqlalchemy.orm import Session
+from sqlalchemy import desc, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
-from src.database.models import Image, Tag, Role
+from src.database.db import redis_client
+from src.database.models import Image, ImageM2MTag, Tag, Role, TransformationsType
 from src.conf import messages
 from src.repository import tags as repository_tags
 from src.database.models import User
-from src.schemas.images import ImageModel, ImageResponse, SortDirection
+from src.schemas.images import ImageModel, ImageResponse, SortDirection, CursorParams
+from src.services.asyncdevlogging import logger
+from src.services.cursor import paginate_by_cursor
+
+
+TRANSFORM_CACHE_TTL = 3600
 
 
 async def get_images_all(
-        db: Session,
+        db: AsyncSession,
         pagination_params: Params
         ) -> Page[ImageResponse]:
 
     """
     The get_images_all function returns a list of all images in the database.
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :param pagination_params: Params: Pass the pagination parameters to the function
     :return: A page of images
     :doc-author: Trelent
     """
-    query = db.query(Image)
-    images = paginate(query, params=pagination_params)
+    query = select(Image).options(selectinload(Image.tags))
+    images = await paginate(db, query, params=pagination_params)
     return images
 
 
 async def get_images_by_user(
-        db: Session,
+        db: AsyncSession,
         current_user: User,
         pagination_params: Params,
         sort_direction: SortDirection
@@ -39,46 +48,94 @@ async def get_images_by_user(
 
     """
     The get_images_by_user function returns a list of images that belong to the current user.
-    :param db: Session: Get access to the database
+    :param db: AsyncSession: Get access to the database
     :param current_user: User: Pass the current user into the function
     :param pagination_params: Params: Specify the pagination parameters
     :param sort_direction: SortDirection: Specify the sort direction of the images
     :return: A page object
     :doc-author: Trelent
     """
-    query = db.query(Image).filter(Image.user == current_user)
+    query = select(Image).options(selectinload(Image.tags)).filter(Image.user_id == current_user.id)
 
     if sort_direction == SortDirection.asc:
         query = query.order_by(Image.id)
     else:
         query = query.order_by(desc(Image.id))
 
-    images = paginate(query, params=pagination_params)
+    images = await paginate(db, query, params=pagination_params)
     return images
 
 
+async def get_images_all_by_cursor(
+        db: AsyncSession,
+        cursor_params: CursorParams,
+        sort_direction: SortDirection
+        ) -> dict:
+    """
+    The get_images_all_by_cursor function returns a page of all images without counting the total.
+    :param db: AsyncSession: Pass the database session to the function
+    :param cursor_params: CursorParams: Page size and the cursor of the previous page
+    :param sort_direction: SortDirection: Specify the sort direction of the images
+    :return: A dict with the images of the page and the cursor of the next page
+    """
+    query = select(Image).options(selectinload(Image.tags))
+    return await paginate_by_cursor(db, query, Image.id, cursor_params, sort_direction)
+
+
+async def get_images_by_user_by_cursor(
+        db: AsyncSession,
+        current_user: User,
+        cursor_params: CursorParams,
+        sort_direction: SortDirection
+        ) -> dict:
+    """
+    The get_images_by_user_by_cursor function returns a page of images that belong to the current user
+    without counting the total.
+    :param db: AsyncSession: Get access to the database
+    :param current_user: User: Pass the current user into the function
+    :param cursor_params: CursorParams: Page size and the cursor of the previous page
+    :param sort_direction: SortDirection: Specify the sort direction of the images
+    :return: A dict with the images of the page and the cursor of the next page
+    """
+    query = select(Image).options(selectinload(Image.tags)).filter(Image.user_id == current_user.id)
+    return await paginate_by_cursor(db, query, Image.id, cursor_params, sort_direction)
+
+
 async def get_image(
     image_id: int,
     user: User,
-    db: Session,
+    db: AsyncSession,
 ) -> Optional[Image]:
     """
     The get_image function takes in an image_id, a user, and a database session.
     It returns the Image object with the given id if it exists.
     :param image_id: int: Specify the image id that is being requested
     :param user: dict: Pass the user's information to the function
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :param : Get the image id from the database
     :return: The image with the given id
     :doc-author: Trelent
     """
-    return db.query(Image).filter_by(id=image_id).first()
+    result = await db.execute(select(Image).options(selectinload(Image.tags)).filter_by(id=image_id))
+    return result.scalar_one_or_none()
+
+
+async def get_link_by_content_hash(content_hash: str, db: AsyncSession) -> Optional[str]:
+    """
+    The get_link_by_content_hash function returns the link of an image uploaded earlier with the same content.
+
+    :param content_hash: str: sha256 of the uploaded file
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The link of the stored file or None
+    """
+    result = await db.execute(select(Image.link).filter(Image.content_hash == content_hash).limit(1))
+    return result.scalar_one_or_none()
 
 
 async def create_image(
     body: dict,
     user_id: int,
-    db: Session,
+    db: AsyncSession,
     tags_limit: int
 ) -> Image | Exception:
 
@@ -87,46 +144,89 @@ async def create_image(
         Args:
             body (dict): The request body containing the image's description, link and tags.
             user_id (int): The id of the user who created this image.
-            db (Session): A connection to our database session object.
+            db (AsyncSession): A connection to our database session object.
 
     :param body:dict: Get the data from the request body
     :param user_id: int: Get the user id from the token
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :param tags_limit: int: Limit the number of tags that can be added to an image
     :return: A new image object
     :doc-author: Trelent
     """
     tags_names = body['tags'].split()[:tags_limit]
-
-    tags = []
-    for el in tags_names:
-        tag = await repository_tags.get_tag_by_name(el, db)
-        if tag is None:
-            tag = await repository_tags.create_tag(el, db)
-        tags.append(tag)
+    tags = await repository_tags.get_or_create_tags(tags_names, db)
     try:
-        image = Image(description=body['description'], link=body['link'], user_id=user_id, tags=tags)
+        image = Image(description=body['description'], link=body['link'], user_id=user_id, tags=tags,
+                      content_hash=body.get('content_hash'))
     except Exception as er:
         return er
 
     db.add(image)
-    db.commit()
-    db.refresh(image)
+    await db.commit()
+    await db.refresh(image)
+    return image
+
+
+def _transform_key(source_image_id: int, type: TransformationsType) -> str:
+    return f"image_transform:{source_image_id}:{type.value}"
+
+
+async def _cache_transformed_image(image: Image) -> None:
+    try:
+        await redis_client.set(_transform_key(image.source_image_id, image.type), image.id, ex=TRANSFORM_CACHE_TTL)
+    except redis.RedisError as err:
+        logger.warning("redis_save_failed", key=_transform_key(image.source_image_id, image.type), error=str(err))
+
+
+async def get_transformed_image(
+        source_image_id: int,
+        type: TransformationsType,
+        db: AsyncSession
+) -> Optional[Image]:
+    """
+    The get_transformed_image function returns the image created earlier by transforming
+    the source image with the given type. The id of the transformed image is cached in Redis.
+
+    :param source_image_id: int: Id of the source image
+    :param type: TransformationsType: Type of the transformation
+    :param db: AsyncSession: Access the database
+    :return: The transformed image or None
+    """
+    image_id = None
+    try:
+        image_id = await redis_client.get(_transform_key(source_image_id, type))
+    except redis.RedisError as err:
+        logger.warning("redis_read_failed", key=_transform_key(source_image_id, type), error=str(err))
+
+    if image_id is not None:
+        image = await db.get(Image, int(image_id), options=[selectinload(Image.tags)])
+        # the cached id may belong to a deleted image
+        if image is not None and image.source_image_id == source_image_id and image.type == type:
+            return image
+
+    result = await db.execute(
+        select(Image).options(selectinload(Image.tags)).filter_by(source_image_id=source_image_id, type=type)
+    )
+    image = result.scalar_one_or_none()
+    if image is not None:
+        await _cache_transformed_image(image)
     return image
 
 
 async def transform_image(
         body: dict,
         user_id: int,
-        db: Session
+        db: AsyncSession
 ) -> Image:
     """
     The transform_image function takes in a dictionary of image data, the user_id of the user who created it, and a database session.
     It then creates an Image object from that data and adds it to the database. It returns either an error or the newly created Image.
+    If the same source image has been transformed with the same type concurrently, the image created first is returned
+    and an upload that ended up with a different link is logged as orphaned.
 
     :param body: dict: Get the data from the request body
     :param user_id: int: Make sure that the image is created by the user who is logged in
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: An image object
     :doc-author: Trelent
     """
@@ -136,21 +236,35 @@ async def transform_image(
             link=body['link'],
             user_id=user_id,
             type=body['type'],
+            source_image_id=body['source_image_id'],
             tags=body['tags']
         )
     except Exception as er:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Image not transformed")
 
     db.add(image)
-    db.commit()
-    db.refresh(image)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        existing = await get_transformed_image(body['source_image_id'], body['type'], db)
+        if existing is None:
+            raise
+        if existing.link != body['link']:
+            # the losing upload is not referenced by any image; it is not deleted here, because
+            # content-addressed storage may share the file with images uploaded later
+            logger.warning("transformed_image_orphaned", source_image_id=body['source_image_id'],
+                           type=str(body['type']), link=body['link'], kept_link=existing.link)
+        return existing
+    await db.refresh(image)
+    await _cache_transformed_image(image)
     return image
 
 
 async def remove_image(
         image_id: int,
         user: User,
-        db: Session
+        db: AsyncSession
 ) -> dict:
     """
     The remove_image function is used to remove an image from the database.
@@ -162,11 +276,12 @@ async def remove_image(
 
     :param image_id: int: Identify the image to be deleted
     :param user: dict: Check if the user is an admin or moderator
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: A dict with a message saying that the image has been deleted
     :doc-author: Trelent
     """
-    image: Optional[Image] = db.query(Image).filter_by(id=image_id).first()
+    result = await db.execute(select(Image).filter_by(id=image_id))
+    image: Optional[Image] = result.scalar_one_or_none()
 
     if image is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.MSC404_IMAGE_NOT_FOUND)
@@ -174,8 +289,8 @@ async def remove_image(
     if image.user_id != user.id and user.role != Role.admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=messages.NOT_ALLOWED)
 
-    db.delete(image)
-    db.commit()
+    await db.delete(image)
+    await db.commit()
     return {'message': messages.DELETED_IMAGE}
 
 
@@ -183,7 +298,7 @@ async def update_image(
         image_id: int,
         body: ImageModel,
         user: User,
-        db: Session,
+        db: AsyncSession,
         tags_limit: int
 ) -> Optional[Image]:
     """
@@ -196,12 +311,13 @@ async def update_image(
     :param image_id: int: Get the image by id
     :param body: ImageModel: Pass the data from the request body to the function
     :param user: dict: Check if the user is an admin or moderator,
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :param tags_limit: int: Limit the number of tags that can be added to an image
     :return: The updated image
     :doc-author: Trelent
     """
-    image: Optional[Image] = db.query(Image).filter_by(id=image_id).first()
+    result = await db.execute(select(Image).options(selectinload(Image.tags)).filter_by(id=image_id))
+    image: Optional[Image] = result.scalar_one_or_none()
 
     if not image or not body.description:
         return None
@@ -212,21 +328,16 @@ async def update_image(
     image.description = body.description
 
     tags_names = body.tags.split()[:tags_limit]
-    tags = []
-    for el in tags_names:
-        tag = await repository_tags.get_tag_by_name(el, db)
-        if tag is None:
-            tag = await repository_tags.create_tag(el, db)
-        tags.append(tag)
+    tags = await repository_tags.get_or_create_tags(tags_names, db)
 
     image.tags = tags
     db.add(image)
-    db.commit()
-    db.refresh(image)
+    await db.commit()
+    await db.refresh(image)
     return image
 
 
-async def get_images_by_tag(tag: Tag, sort_direction: SortDirection, db: Session) -> List[Type[Image]]:
+async def get_images_by_tag(tag: Tag, sort_direction: SortDirection, db: AsyncSession) -> List[Type[Image]]:
     """
     The get_images_by_tag function takes in a tag and a sort direction,
     then returns all images associated with that tag.
@@ -237,12 +348,15 @@ async def get_images_by_tag(tag: Tag, sort_direction: SortDirection, db: Session
     :return: A list of images, sorted by the created_at field in ascending or descending order
     :doc-author: Trelent
     """
-    query = db.query(Image).filter(Image.tags.any(Tag.name == tag.name))
+    query = select(Image).options(selectinload(Image.tags)).filter(
+        Image.id.in_(select(ImageM2MTag.image_id).filter(ImageM2MTag.tag_id == tag.id))
+    )
 
     if sort_direction == SortDirection.asc:
         query = query.order_by(Image.created_at)
     else:
         query = query.order_by(desc(Image.created_at))
 
-    return query.all()
+    result = await db.execute(query)
+    return list(result.scalars().all())
   
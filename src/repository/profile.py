@@ -1,29 +1,32 @@
 from fastapi import HTTPException, status
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.conf import messages
 from src.repository.users import get_user_by_username, get_user_by_email, clear_user_cache, get_user_by_id
 from src.database.models import User, Comment, Image, Role
 from src.schemas.users import UpdateFullProfile, ProfileResponse
+from src.services.auth import auth_service
 
 
-async def read_profile(user: User, db: Session) -> ProfileResponse:
+async def read_profile(user: User, db: AsyncSession) -> ProfileResponse:
     """
     Retrieves a user profile.
 
     :param user: given user.
     :type user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: All information about user.
     :rtype: ProfileResponse
     """
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.USER_NOT_FOUND)
 
-    comments_count = db.query(func.count(Comment.id)).filter(Comment.user_id == user.id).scalar()
-    images_count = db.query(func.count(Image.id)).filter(Image.user_id == user.id).scalar()
+    result = await db.execute(select(func.count(Comment.id)).filter(Comment.user_id == user.id))
+    comments_count = result.scalar()
+    result = await db.execute(select(func.count(Image.id)).filter(Image.user_id == user.id))
+    images_count = result.scalar()
     result = ProfileResponse(
         id=user.id,
         username=user.username,
@@ -37,7 +40,7 @@ async def read_profile(user: User, db: Session) -> ProfileResponse:
     return result
 
 
-async def update_profile(data: UpdateFullProfile, user: User, db: Session) -> bool:
+async def update_profile(data: UpdateFullProfile, user: User, db: AsyncSession) -> bool:
     """
     Update user profile in the database.
 
@@ -46,11 +49,12 @@ async def update_profile(data: UpdateFullProfile, user: User, db: Session) -> bo
     :param user: The user to update.
     :type user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: True if the profile was updated, None otherwise.
     :rtype: bool | None
     """
     if user:
+        old_email = user.email
         if data.username:
             new_user = await get_user_by_username(str(data.username), db)
             if not new_user:
@@ -60,16 +64,21 @@ async def update_profile(data: UpdateFullProfile, user: User, db: Session) -> bo
             existing_user = await get_user_by_email(str(data.email), db)
             if not existing_user or existing_user.id == user.id:
                 user.email = str(data.email)
+        if user.email != old_email:
+            # tokens carry the email, so the ones issued for the old email must not be authorized by their claims
+            user.token_version = (user.token_version or 0) + 1
         db.add(user)
-        db.commit()
-        db.refresh(user)
-        clear_user_cache(user)
+        await db.commit()
+        await db.refresh(user)
+        await clear_user_cache(user)
+        if old_email != user.email:
+            await auth_service.token_manager.clear_user_cash(old_email)
         return True
 
     return False
 
 
-async def change_role(user_id: int, role_user: Role, db: Session) -> bool:
+async def change_role(user_id: int, role_user: Role, db: AsyncSession) -> bool:
     """
     Update user profile by admin.
 
@@ -78,13 +87,15 @@ async def change_role(user_id: int, role_user: Role, db: Session) -> bool:
     :param role_user: The role of the user to update.
     :type role_user: Role
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: True if the profile was updated, False otherwise.
     :rtype: bool
     """
     user_to_update = await get_user_by_id(user_id, db)
     if user_to_update and user_to_update.role != role_user:
         user_to_update.role = role_user
-        db.commit()
+        user_to_update.token_version = (user_to_update.token_version or 0) + 1
+        await db.commit()
+        await clear_user_cache(user_to_update)
         return True
     return False
@@ -1,8 +1,8 @@
 from typing import List, Type
 
 from fastapi import HTTPException, status
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.conf import messages
 from src.database.models import Rating, Image, User, Role
@@ -10,7 +10,7 @@ from src.schemas.images import RatingModel
 
 
 async def add_rating(
-    body: RatingModel, image_id: int, user: User, db: Session
+    body: RatingModel, image_id: int, user: User, db: AsyncSession
 ) -> Rating:
     """
     The add_rating function adds a rating to an image.
@@ -18,11 +18,12 @@ async def add_rating(
     :param body: RatingModel: Get the rating from the request body
     :param image_id: int: Get the image that is being rated
     :param user: User: Get the user id of the current user
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: A rating object
     """
     # Check if the image exists
-    image = db.query(Image).filter(Image.id == image_id).first()
+    result = await db.execute(select(Image).filter(Image.id == image_id))
+    image = result.scalar_one_or_none()
     if not image:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=messages.IMAGE_NOT_FOUND
@@ -35,26 +36,30 @@ async def add_rating(
         )
 
     # Check if the user has already rated the image
-    existing_rating = (
-        db.query(Rating)
-        .filter(Rating.image_id == image_id, Rating.user_id == user.id)
-        .first()
+    result = await db.execute(
+        select(Rating).filter(Rating.image_id == image_id, Rating.user_id == user.id)
     )
+    existing_rating = result.scalar_one_or_none()
     if existing_rating:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail=messages.ALREADY_RATED
         )
 
-    # Create a new rating
+    # Create a new rating and update the image totals in the same transaction
     rating = Rating(image_id=image_id, user_id=user.id, rating=body.rating)
     db.add(rating)
-    db.commit()
-    db.refresh(rating)
+    await db.execute(
+        update(Image)
+        .where(Image.id == image_id)
+        .values(rating_sum=Image.rating_sum + body.rating, rating_count=Image.rating_count + 1)
+    )
+    await db.commit()
+    await db.refresh(rating)
 
     return rating
 
 
-async def get_rating(rating_id: int, db: Session, user: User) -> Type[Rating]:
+async def get_rating(rating_id: int, db: AsyncSession, user: User) -> Type[Rating]:
     """
     The get_rating function is used to retrieve a rating from the database.
         It checks if the user is an admin or moderator, and if not it raises a 403 error.
@@ -62,7 +67,7 @@ async def get_rating(rating_id: int, db: Session, user: User) -> Type[Rating]:
         our database and returns that rating object.
     
     :param rating_id: int: Get the rating by id
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :param user: User: Check if the user is an admin or moderator
     :return: A type[rating] object
     """
@@ -72,7 +77,8 @@ async def get_rating(rating_id: int, db: Session, user: User) -> Type[Rating]:
             status_code=status.HTTP_403_FORBIDDEN, detail=messages.NOT_ALLOWED
         )
     # Check if the rating exists
-    rating = db.query(Rating).filter(Rating.id == rating_id).first()
+    result = await db.execute(select(Rating).filter(Rating.id == rating_id))
+    rating = result.scalar_one_or_none()
     if not rating:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=messages.RATING_NOT_FOUND
@@ -81,65 +87,70 @@ async def get_rating(rating_id: int, db: Session, user: User) -> Type[Rating]:
     return rating
 
 
-async def get_ratings(image_id: int, db: Session) -> List[Type[Rating]]:
+async def get_ratings(image_id: int, db: AsyncSession) -> List[Type[Rating]]:
     """
     The get_ratings function returns all ratings for a given image.
     
     :param image_id: int: Specify the image id that is passed in from the url
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A list of ratings for the image
     """
     # Check if the image exists
-    image = db.query(Image).filter(Image.id == image_id).first()
+    result = await db.execute(select(Image).filter(Image.id == image_id))
+    image = result.scalar_one_or_none()
     if not image:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=messages.IMAGE_NOT_FOUND
         )
 
     # Get all ratings for the image
-    ratings = db.query(Rating).filter(Rating.image_id == image_id).all()
+    result = await db.execute(select(Rating).filter(Rating.image_id == image_id))
+    ratings = list(result.scalars().all())
 
     return ratings
 
 
-async def get_average_rating(image_id: int, db: Session) -> float:
+async def get_average_rating(image_id: int, db: AsyncSession) -> float:
     """
     The get_average_rating function returns the average rating of an image.
+        It is read from the rating totals stored on the image, not aggregated over the ratings table.
         Args:
             image_id (int): The id of the image to get ratings for.
-            db (Session): A database session object used to query the database.
+            db (AsyncSession): A database session object used to query the database.
         Returns:
             float: The average rating rounded to 2 decimal places.
     
     :param image_id: int: Get the image id from the database
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: The average rating of an image
     """
-    average_rating = (
-        db.query(func.avg(Rating.rating)).filter_by(image_id=image_id).scalar()
+    result = await db.execute(
+        select(Image.rating_sum, Image.rating_count).filter(Image.id == image_id)
     )
-    if not average_rating:
+    totals = result.one_or_none()
+    if not totals or not totals.rating_count:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=messages.RATING_NOT_FOUND
         )
-    return round(average_rating, 2)
+    return round(totals.rating_sum / totals.rating_count, 2)
 
 
-async def remove_rating(rating_id: int, db: Session, user: User) -> dict:
+async def remove_rating(rating_id: int, db: AsyncSession, user: User) -> dict:
     """
     The remove_rating function removes a rating from the database.
         Args:
             rating_id (int): The id of the rating to be removed.
-            db (Session): A connection to the database.
+            db (AsyncSession): A connection to the database.
             user (User): The user making this request, used for authorization purposes.
     
     :param rating_id: int: Specify the id of the rating to be deleted
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :param user: User: Check if the user is admin or moderator
     :return: A dict, but the function expects a rating
     """
     # Check if the rating exists
-    rating = db.query(Rating).filter(Rating.id == rating_id).first()
+    result = await db.execute(select(Rating).filter(Rating.id == rating_id))
+    rating = result.scalar_one_or_none()
     if not rating:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=messages.RATING_NOT_FOUND
@@ -151,8 +162,13 @@ async def remove_rating(rating_id: int, db: Session, user: User) -> dict:
             status_code=status.HTTP_403_FORBIDDEN, detail=messages.NOT_AUTHORIZED
         )
 
-    # Delete the rating
-    db.delete(rating)
-    db.commit()
+    # Delete the rating and update the image totals in the same transaction
+    await db.delete(rating)
+    await db.execute(
+        update(Image)
+        .where(Image.id == rating.image_id)
+        .values(rating_sum=Image.rating_sum - rating.rating, rating_count=Image.rating_count - 1)
+    )
+    await db.commit()
 
     return {"message": messages.RATING_DELETED}
@@ -1,57 +1,232 @@
+from collections import OrderedDict
 from typing import List, Optional, Type
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from src.conf.config import settings
 from src.database.models import Tag
 
 
-async def create_tag(name, db: Session)-> Tag:
+UPSERTS = {
+    'postgresql': postgresql_insert,
+    'sqlite': sqlite_insert,
+}
+
+# tags inserted in the transaction of a session, cached once it commits
+NEW_TAGS_KEY = 'tag_cache.new_tags'
+
+
+class TagCache:
+    """
+    Bounded LRU cache of tag name -> tag id shared by the requests of one worker.
+    Tags are never renamed or deleted, so entries stay valid for the lifetime of the worker.
+    Tags created by this worker are cached when their transaction commits,
+    a tag created by another worker is a miss until it is read once.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, name: str) -> Optional[int]:
+        """
+        The get function returns the id of the tag with the given name, if it is cached, and counts the hit or miss.
+
+        :param self: Represent the instance of the class
+        :param name: str: Name of the tag
+        :return: The id of the tag or None
+        """
+        tag_id = self._data.get(name)
+        if tag_id is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(name)
+        return tag_id
+
+    def put(self, tag: Tag) -> None:
+        """
+        The put function caches the id of the tag and evicts the least recently used entry if the cache is full.
+
+        :param self: Represent the instance of the class
+        :param tag: Tag: Tag stored in the database
+        :return: None
+        """
+        self._data[tag.name] = tag.id
+        self._data.move_to_end(tag.name)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def discard(self, name: str) -> None:
+        """
+        The discard function removes the tag from the cache of this worker.
+
+        :param self: Represent the instance of the class
+        :param name: str: Name of the tag
+        :return: None
+        """
+        self._data.pop(name, None)
+
+    def clear(self) -> None:
+        """
+        The clear function removes all tags from the cache and resets the counters.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self) -> dict:
+        """
+        The info function returns the hit and miss counters of the cache.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with hits, misses, size and maxsize
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data), 'maxsize': self.maxsize}
+
+    async def warm(self, db: AsyncSession) -> None:
+        """
+        The warm function fills the cache with the tags from the database.
+
+        :param self: Represent the instance of the class
+        :param db: AsyncSession: Pass the database session to the function
+        :return: None
+        """
+        for tag in (await get_tags(db))[:self.maxsize]:
+            self.put(tag)
+
+
+tag_cache = TagCache(settings.tag_cache_size)
+
+
+@event.listens_for(Session, 'after_commit')
+def _cache_new_tags(session: Session) -> None:
+    for tag_id, name in session.info.pop(NEW_TAGS_KEY, ()):
+        tag_cache.put(Tag(id=tag_id, name=name))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_new_tags(session: Session) -> None:
+    session.info.pop(NEW_TAGS_KEY, None)
+
+
+async def create_tag(name, db: AsyncSession)-> Tag:
     """
     The create_tag function creates a new tag in the database.
 
     :param name: Create a new tag
-    :param db: Session: Create a database session
+    :param db: AsyncSession: Create a database session
     :return: The newly created tag
     :doc-author: Trelent
     """
     tag = Tag(name=name)
     db.add(tag)
-    db.commit()
-    db.refresh(tag)
+    await db.commit()
+    await db.refresh(tag)
     return tag
 
 
-async def get_tags(db: Session) -> List[Type[Tag]]:
+async def get_tags(db: AsyncSession) -> List[Type[Tag]]:
     """
     The get_tags function returns a list of all tags in the database.
 
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A list of tags
     :doc-author: Trelent
     """
-    return db.query(Tag).all()
+    result = await db.execute(select(Tag))
+    return list(result.scalars().all())
 
 
-async def get_tag(tag_id: int, db: Session)-> Optional[Tag]:
+async def get_tag(tag_id: int, db: AsyncSession)-> Optional[Tag]:
     """
     The get_tag function returns a tag object from the database.
         Args:
             tag_id (int): The id of the tag to be returned.
-            db (Session): A connection to the database.
+            db (AsyncSession): A connection to the database.
 
     :param tag_id: int: Specify the id of the tag we want to get
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A tag object
     :doc-author: Trelent
     """
-    return db.query(Tag).filter_by(id=tag_id).first()
+    result = await db.execute(select(Tag).filter_by(id=tag_id))
+    return result.scalar_one_or_none()
 
 
-async def get_tag_by_name(name: str, db: Session) -> Optional[Tag]:
+async def get_tag_by_name(name: str, db: AsyncSession) -> Optional[Tag]:
     """
     The get_tag_by_name function returns a Tag object from the database, given its name.
+    If the id of the tag is cached, a Tag object is built without querying the database.
 
     :param name: str: Specify the name of the tag we want to get
-    :param db: Session: Pass in the database session
+    :param db: AsyncSession: Pass in the database session
     :return: The first tag in the database with a name that matches the argument
     :doc-author: Trelent
     """
-    return db.query(Tag).filter_by(name=name).first()
\ No newline at end of file
+    tag_id = tag_cache.get(name)
+    if tag_id is not None:
+        return Tag(id=tag_id, name=name)
+
+    result = await db.execute(select(Tag).filter_by(name=name))
+    tag = result.scalar_one_or_none()
+    if tag is not None:
+        tag_cache.put(tag)
+    return tag
+
+
+async def get_or_create_tags(names: List[str], db: AsyncSession) -> List[Tag]:
+    """
+    The get_or_create_tags function returns Tag objects for all given names, creating the missing ones.
+    Tags with cached ids are loaded by one select. The rest are inserted by a single
+    INSERT ... ON CONFLICT (name) DO NOTHING RETURNING, and the ones that already existed are read by one more select,
+    so a concurrent upload that creates the same tag does not fail on the unique constraint.
+    Nothing is committed: the tags become part of the caller's transaction, and the inserted ones are cached
+    when it commits.
+
+    :param names: List[str]: Names of the tags
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The tags in the order of the names, without duplicates
+    """
+    names = list(dict.fromkeys(names))
+    if not names:
+        return []
+
+    tags = {}
+    cached = {name: tag_id for name in names if (tag_id := tag_cache.get(name)) is not None}
+    if cached:
+        result = await db.execute(select(Tag).filter(Tag.id.in_(cached.values())))
+        tags = {tag.name: tag for tag in result.scalars().all() if cached.get(tag.name) == tag.id}
+        for name in cached.keys() - tags.keys():
+            tag_cache.discard(name)
+
+    missing = [name for name in names if name not in tags]
+    if missing:
+        insert = UPSERTS[db.get_bind().dialect.name]
+        statement = (
+            insert(Tag)
+            .values([{'name': name} for name in missing])
+            .on_conflict_do_nothing(index_elements=[Tag.name])
+            .returning(Tag)
+        )
+        result = await db.scalars(statement)
+        inserted = result.all()
+        tags.update({tag.name: tag for tag in inserted})
+        db.info.setdefault(NEW_TAGS_KEY, []).extend((tag.id, tag.name) for tag in inserted)
+
+        existing = [name for name in missing if name not in tags]
+        if existing:
+            result = await db.execute(select(Tag).filter(Tag.name.in_(existing)))
+            for tag in result.scalars().all():
+                tags[tag.name] = tag
+                tag_cache.put(tag)
+
+    return [tags[name] for name in names]
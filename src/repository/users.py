@@ -1,26 +1,28 @@
-import pickle
 from typing import Optional, List, Type
 
 from fastapi import HTTPException, status
 from libgravatar import Gravatar
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.conf import messages
 from src.database.models import User, Role
 from src.schemas.users import UserModel
+from src.services.asyncdevlogging import logger
 from src.services.auth import auth_service
+from src.services.user_cache import CachedUser, CACHE_TTL
 
 
-async def get_cache_user_by_email(email: str, cache = None) -> User | None:
+async def get_cache_user_by_email(email: str, cache = None) -> CachedUser | None:
     """
-    The get_cache_user_by_email function is used to retrieve a user from the cache.
+    The get_cache_user_by_email function is used to retrieve a user snapshot from the cache.
         Args:
             email (str): The email of the user to be retrieved.
             cache (Redis): A Redis connection object, if not provided will use default global connection.
 
     :param email: str: Specify the email of the user to be retrieved from cache
     :param cache: Pass in the redis cache object
-    :return: A user object or none
+    :return: A CachedUser object or none
     """
     if email:
         user_bytes = None
@@ -29,10 +31,9 @@ async def get_cache_user_by_email(email: str, cache = None) -> User | None:
                 user_bytes = await cache.get(f"user:{email}")
             if user_bytes is None:
                 return None
-            user = pickle.loads(user_bytes)  # type: ignore
-            print(f"Get from Redis  {str(user.email)}")
+            user = CachedUser.loads(user_bytes)
         except Exception as err:
-            print(f"Error Redis read {err}")
+            logger.warning("redis_read_failed", key=f"user:{email}", error=str(err))
             user = None
         return user
 
@@ -41,7 +42,7 @@ async def update_cache_user(user: User, cache = None):
     """
     The update_cache_user function takes a user object and an optional cache object.
     If the cache is provided, it will save the user to Redis with a key of &quot;user:&lt;email&gt;&quot;.
-    The value will be pickled so that we can store arbitrary Python objects in Redis.
+    Only the CachedUser snapshot of the user is stored, serialized as a compact JSON array.
     We also set an expiration time of 900 seconds (15 minutes) on this key.
     :param user: User: Pass in the user object
     :param cache: Pass in the cache object
@@ -50,109 +51,112 @@ async def update_cache_user(user: User, cache = None):
     if user and cache:
         email = user.email
         try:
-            await cache.set(f"user:{email}", pickle.dumps(user))
-            await cache.expire(f"user:{email}", 900)
-            print(f"Save to Redis {str(user.email)}")
+            await cache.set(f"user:{email}", CachedUser.from_user(user).dumps(), ex=CACHE_TTL)
+            logger.debug("user_cached", email=email)
         except Exception as err:
-            print(f"Error redis save, {err}")
+            logger.warning("redis_save_failed", key=f"user:{email}", error=str(err))
 
 
-async def get_user_by_email(email: str, db: Session) -> User | None:
+async def get_user_by_email(email: str, db: AsyncSession) -> User | None:
     """
     The get_user_by_email function takes in an email and a database session,
     and returns the user with that email if it exists. If no such user exists,
     it returns None.
     :param email: str: Specify the email of the user we want to retrieve from our database
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: The first user that matches the email
     """
-    return db.query(User).filter_by(email=email).first()
+    result = await db.execute(select(User).filter_by(email=email))
+    return result.scalar_one_or_none()
 
 
-async def get_user_by_id(user_id: int, db: Session) -> Optional[User]:
+async def get_user_by_id(user_id: int, db: AsyncSession) -> Optional[User]:
     """
     The get_user_by_id function returns a user object from the database, given an id.
     :param user_id: int: Specify the type of data that is expected to be passed into the function
-    :param db: Session: Pass in the database session that is created in the main
+    :param db: AsyncSession: Pass in the database session that is created in the main
     :return: The first user in the database with a matching id
     :doc-author: Trelent
     """
-    return db.query(User).filter(User.id == user_id).first()
+    result = await db.execute(select(User).filter(User.id == user_id))
+    return result.scalar_one_or_none()
 
 
-async def create_user(body: UserModel, db: Session):
+async def create_user(body: UserModel, db: AsyncSession):
     """
     The create_user function creates a new user in the database.
 
     :param body: UserModel: Get the data from the request body
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A user object, which is a sqlalchemy model
     """
     g = Gravatar(body.email)
 
-    existing_user = db.query(User).first()
+    result = await db.execute(select(User).limit(1))
+    existing_user = result.scalar_one_or_none()
     role = Role.user if existing_user else Role.admin
 
     new_user = User(**body.dict(), avatar=g.get_image(), role=role)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
-async def update_token(user: User, token: str | None, db: Session) -> None:
+async def update_token(user: User, token: str | None, db: AsyncSession) -> None:
     """
     The update_token function updates the refresh token for a user.
     Args:
     user (UserModel): The UserModel object to update.
     refresh_token (str): The new refresh token to use for this user.
-    db (Session): A database session object used to commit changes.
+    db (AsyncSession): A database session object used to commit changes.
     :param user: UserModel: Pass in the user object that is returned from the get_user function
     :param token: Update the refresh_token in the database
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: The user object
     """
     user.refresh_token = token
-    db.commit()
+    await db.commit()
 
 
-async def confirmed_email(email: str, db: Session) -> None:
+async def confirmed_email(email: str, db: AsyncSession) -> None:
     """
     The confirmed_email function takes in an email and a database session,
     and sets the confirmed field of the user with that email to True.
 
 
     :param email: str: Specify the email address of the user
-    :param db: Session: Pass in the database session
+    :param db: AsyncSession: Pass in the database session
     :return: None
     """
     user = await get_user_by_email(email, db)
     user.confirmed = True
-    db.commit()
+    await db.commit()
 
 
-async def update_avatar(email, url: str, db: Session) -> User:
+async def update_avatar(email, url: str, db: AsyncSession) -> User:
     """
     The update_avatar function updates the avatar of a user.
 
     :param email: Find the user in the database
     :param url: str: Specify the type of data that will be passed into the function
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: The user with the updated avatar
     """
     user = await get_user_by_email(email, db)
     user.avatar = url
-    db.commit()
+    await db.commit()
     return user
 
 
-async def ban_user(user_id: int, active_status: bool, db: Session) -> Type[User] | None:
+async def ban_user(user_id: int, active_status: bool, db: AsyncSession) -> Type[User] | None:
     """
     The ban_user function is used to ban a user from the site.
     The function takes in an email and a database session, and returns
     the user that was banned.
     """
-    user = db.query(User).filter_by(id=user_id).first()
+    result = await db.execute(select(User).filter_by(id=user_id))
+    user = result.scalar_one_or_none()
 
     # Print user values before commit
     # print(f"User values before commit: {user.id}, {user.username}, {user.email}, {user.status_active}")
@@ -164,43 +168,45 @@ async def ban_user(user_id: int, active_status: bool, db: Session) -> Type[User]
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=messages.NOT_ALLOWED)
 
     user.status_active = active_status
-    db.commit()
-    db.refresh(user)
+    user.token_version = (user.token_version or 0) + 1
+    await db.commit()
+    await db.refresh(user)
     return user
 
 
-async def change_password_for_user(user: User, password: str, db: Session) -> User:
+async def change_password_for_user(user: User, password: str, db: AsyncSession) -> User:
     user.password = password
+    user.token_version = (user.token_version or 0) + 1
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
 
-async def get_all_users(db: Session) -> List[User]:
+async def get_all_users(db: AsyncSession) -> List[User]:
     """
     The get_all_users function returns a list of all users in the database.
 
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A list of users
     :doc-author: Trelent
     """
-    users = db.query(User).all()
-    users = [await get_user_by_id(user.id, db) for user in users]
+    result = await db.execute(select(User))
+    users = list(result.scalars().all())
     return users
 
 
-def clear_user_cache(user: User) -> None:
+async def clear_user_cache(user: User | CachedUser) -> None:
     """_summary_
 
     :param user: Clear user from cached storage
-    :type user: User
+    :type user: User | CachedUser
     """
-    auth_service.token_manager.r.delete(f"user:{user.email}")
+    await auth_service.token_manager.clear_user_cash(user.email, user.id)
 
 
 async def get_user_by_username(
-        username: str, db: Session,
+        username: str, db: AsyncSession,
         status_active: bool | None = True) -> User | None:
     """
     Retrieves a user by his username.
@@ -208,9 +214,10 @@ async def get_user_by_username(
     :param username: An username to get user from the database by.
     :type username: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The user.
     :rtype: User
     """
-    user = db.query(User).filter(User.username == username).first()
+    result = await db.execute(select(User).filter(User.username == username))
+    user = result.scalars().first()
     return user
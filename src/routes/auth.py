@@ -2,7 +2,7 @@ from fastapi import Request, Depends, HTTPException, status, APIRouter, Security
 from fastapi.responses import JSONResponse, HTMLResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer, OAuth2PasswordRequestForm
 from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.responses import RedirectResponse
 from starlette.templating import _TemplateResponse, Jinja2Templates
 
@@ -11,6 +11,7 @@ from src.database.db import get_db
 from src.database.models import User
 from src.repository import users as repository_users
 from src.schemas.users import UserModel, UserResponse, TokenModel, RequestEmail, ChangePasswordModel, MessageResponse
+from src.services.asyncdevlogging import logger
 from src.services.auth import auth_service
 from src.services.email import send_email, send_new_password, send_reset_password
 
@@ -23,7 +24,7 @@ templates = Jinja2Templates(directory=template_directories)
 
 @router.post("/logout", response_class=JSONResponse)
 async def logout_new_route(token: str = Depends(auth_service.token_manager.oauth2_scheme),
-                           db: Session = Depends(get_db)) -> JSONResponse:
+                           db: AsyncSession = Depends(get_db)) -> JSONResponse:
     try:
         await auth_service.token_manager.logout_user(token=token, db=db)
         return JSONResponse(content={"message": "You have logged out!!!"}, status_code=200)
@@ -32,7 +33,7 @@ async def logout_new_route(token: str = Depends(auth_service.token_manager.oauth
 
 
 @router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def signup(request: Request, body: UserModel, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def signup(request: Request, body: UserModel, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)):
     """
     The signup function creates a new user in the database.
         It takes a request object, body (which is the UserModel), background_tasks, and db as parameters.
@@ -41,28 +42,28 @@ async def signup(request: Request, body: UserModel, background_tasks: Background
     :param request: Request: Get the request object
     :param body: UserModel: Get the user data from the request body
     :param background_tasks: BackgroundTasks: Add a task to the background queue
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: A usermodel object
     """
-    print("Request Body:", await request.body())
+    logger.info("signup", email=body.email, username=body.username)
     exist_user = await repository_users.get_user_by_email(body.email, db)
     if exist_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
-    body.password = auth_service.password_manager.get_password_hash(body.password)
+    body.password = await auth_service.password_manager.get_password_hash_async(body.password)
     new_user = await repository_users.create_user(body, db)
     background_tasks.add_task(send_email, new_user.email, new_user.username, str(request.base_url))
     return new_user
 
 
 @router.post("/login", response_model=TokenModel)
-async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
     The login function is used to authenticate a user.
         It takes the username and password from the request body,
         verifies that they are correct, and returns an access token.
 
     :param body: OAuth2PasswordRequestForm: Get the username and password from the request body
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: A dictionary with access_token, refresh_token and token_type
     """
     user = await repository_users.get_user_by_email(body.username, db)
@@ -70,13 +71,14 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
     if not user.confirmed:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
-    if not auth_service.password_manager.verify_password(body.password, user.password):
+    if not await auth_service.password_manager.verify_password_async(body.password, user.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
     if not user.status_active:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=messages.YOU_ARE_BANNED)
-    access_token = await auth_service.token_manager.create_access_token(data={"sub": user.email})
+    access_token = await auth_service.token_manager.create_access_token(
+        data=auth_service.token_manager.access_token_data(user))
     refresh_token = await auth_service.token_manager.create_refresh_token(data={"sub": user.email})
-    await repository_users.update_token(user, refresh_token, db)
+    await auth_service.token_manager.refresh_tokens.add(user, refresh_token, db)
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer",
             "username": user.username, "avatar": user.avatar}
 
@@ -88,7 +90,7 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
              response_model=MessageResponse)
 async def change_password(body: ChangePasswordModel,
                           current_user: User = Depends(auth_service.token_manager.get_current_user),
-                          db: Session = Depends(get_db)) -> MessageResponse:
+                          db: AsyncSession = Depends(get_db)) -> MessageResponse:
     """
         The change_password function is used to change the password of a user.
             The function takes in the current_user, body (which is the ChangePasswordModel), and db as parameters.
@@ -97,45 +99,45 @@ async def change_password(body: ChangePasswordModel,
 
         :param body: ChangePasswordModel: Get the current_password and new_password from the request body
         :param current_user: User: Get the current_user from the token
-        :param db: Session: Get a database session
+        :param db: AsyncSession: Get a database session
     """
-    if not auth_service.password_manager.verify_password(body.current_password, current_user.password):
+    user = await repository_users.get_user_by_id(current_user.id, db)
+    if not await auth_service.password_manager.verify_password_async(body.current_password, user.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid current password")
-    new_password = auth_service.password_manager.get_password_hash(body.new_password)
-    user = await repository_users.change_password_for_user(current_user, new_password, db)
+    new_password = await auth_service.password_manager.get_password_hash_async(body.new_password)
+    user = await repository_users.change_password_for_user(user, new_password, db)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Password change failed")
-    await auth_service.token_manager.clear_user_cash(user.email)
+    await auth_service.token_manager.clear_user_cash(user.email, user.id)
     return MessageResponse(message="Password changed successfully")
 
 
 @router.get('/refresh_token', response_model=TokenModel)
-async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security), db: Session = Depends(get_db)):
+async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security), db: AsyncSession = Depends(get_db)):
     """
         The refresh_token function is used to refresh the access token.
             The function takes in a refresh token and returns an access_token, a new refresh_token, and the type of token.
-            If there is no user with that email or if the user's current refresh_token does not match what was passed in,
-            then it will return an HTTP 401 Unauthorized error.
+            If the refresh token is not stored for the user any more, e.g. it has already been used,
+            all refresh tokens of the user are revoked and an HTTP 401 Unauthorized error is returned.
 
         :param credentials: HTTPAuthorizationCredentials: Get the token from the request header
-        :param db: Session: Get a database session
+        :param db: AsyncSession: Get a database session
         :return: A dictionary with the new access_token, refresh_token and token type
     """
     token = credentials.credentials
     email = await auth_service.token_manager.decode_refresh_token(token)
     user = await repository_users.get_user_by_email(email, db)
-    if user.refresh_token != token:
-        await repository_users.update_token(user, None, db)
+    new_refresh_token = await auth_service.token_manager.create_refresh_token(data={"sub": email})
+    if not await auth_service.token_manager.refresh_tokens.rotate(user, token, new_refresh_token, db):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
 
-    access_token = await auth_service.token_manager.create_access_token(data={"sub": email})
-    new_refresh_token = await auth_service.token_manager.create_refresh_token(data={"sub": email})
-    await repository_users.update_token(user, new_refresh_token, db)
+    access_token = await auth_service.token_manager.create_access_token(
+        data=auth_service.token_manager.access_token_data(user))
     return {"access_token": access_token, "refresh_token": new_refresh_token, "token_type": "bearer"}
 
 
 @router.get("/confirmed_email/{token}")
-async def confirmed_email(token: str, db: Session = Depends(get_db)):
+async def confirmed_email(token: str, db: AsyncSession = Depends(get_db)):
     """
     The confirmed_email function is used to confirm a user's email address.
     It takes the token from the URL and uses it to get the email of the user who requested confirmation.
@@ -145,7 +147,7 @@ async def confirmed_email(token: str, db: Session = Depends(get_db)):
     otherwise we call our repository_users' confirmed_email function with that email as its argument.
 
     :param token: str: Get the email from the token
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: A message that indicates whether the email is already confirmed or not
     """
     email = auth_service.token_manager.get_email_from_token(token)
@@ -160,7 +162,7 @@ async def confirmed_email(token: str, db: Session = Depends(get_db)):
 
 @router.post("/request_email", response_class=JSONResponse)
 async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
-                        db: Session = Depends(get_db)) -> JSONResponse:
+                        db: AsyncSession = Depends(get_db)) -> JSONResponse:
     """
     The request_email function is used to send an email to the user with a link that will allow them
     to confirm their account. The function takes in a RequestEmail object, which contains the email of
@@ -170,7 +172,7 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
     :param body: RequestEmail: Get the email from the request body
     :param background_tasks: BackgroundTasks: Add a task to the background tasks queue
     :param request: Request: Get the base_url of the request
-    :param db: Session: Get a database session
+    :param db: AsyncSession: Get a database session
     :return: A message that depends on whether the user is already confirmed or not
     """
     user = await repository_users.get_user_by_email(body.email, db)
@@ -209,7 +211,7 @@ async def email_confirm_done(request: Request) -> _TemplateResponse:
 
 @router.get("/reset-password/confirm/{token}", response_class=HTMLResponse, status_code=status.HTTP_303_SEE_OTHER)
 async def reset_password_confirm(token: str, background_tasks: BackgroundTasks, request: Request,
-                                 db: Session = Depends(get_db)) -> HTMLResponse:
+                                 db: AsyncSession = Depends(get_db)) -> HTMLResponse:
     """
     The reset_password_confirm function is used to reset a user's password.
         It takes the token from the URL and uses it to get the email of the user who requested a password reset.
@@ -220,7 +222,7 @@ async def reset_password_confirm(token: str, background_tasks: BackgroundTasks,
     :param token: str: Get the email from the token
     :param background_tasks: BackgroundTasks: Add a task to the background tasks queue
     :param request: Request: Get the base url of the application
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: A dictionary with the token and username
     """
     email: str = auth_service.token_manager.get_email_from_token(token)
@@ -230,11 +232,12 @@ async def reset_password_confirm(token: str, background_tasks: BackgroundTasks,
                             detail=messages.MSC503_UNKNOWN_USER)
 
     new_password: str = auth_service.password_manager.get_new_password()
-    password: str = auth_service.password_manager.get_password_hash(new_password)
+    password: str = await auth_service.password_manager.get_password_hash_async(new_password)
     updated_user: User = await repository_users.change_password_for_user(exist_user, password, db)
     if updated_user is None:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                             detail=messages.MSC503_UNKNOWN_USER)
+    await auth_service.token_manager.clear_user_cash(updated_user.email, updated_user.id)
 
     background_tasks.add_task(send_new_password,
                               updated_user.email,
@@ -248,7 +251,7 @@ async def reset_password_confirm(token: str, background_tasks: BackgroundTasks,
 
 @router.post("/reset-password", response_class=JSONResponse)
 async def reset_password(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
-                         db: Session = Depends(get_db)) -> JSONResponse:
+                         db: AsyncSession = Depends(get_db)) -> JSONResponse:
     """
     The reset_password function is used to send a password reset email to the user.
         The function takes in an email address and sends a password reset link to that address.
@@ -257,7 +260,7 @@ async def reset_password(body: RequestEmail, background_tasks: BackgroundTasks,
     :param body: RequestEmail: Get the email from the request body
     :param background_tasks: BackgroundTasks: Add a task to the background tasks queue
     :param request: Request: Get the base url of the application
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: A jsonresponse object
     """
     user = await repository_users.get_user_by_email(body.email, db)
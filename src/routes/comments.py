@@ -3,13 +3,13 @@ from typing import Optional, List, Type
 from fastapi import APIRouter, Depends, HTTPException, Path, status
 from fastapi.security import HTTPBearer
 from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.conf import messages
 from src.database.db import get_db
 from src.database.models import Comment, User
 from src.repository import comments as repository_comments, images as repository_images
-from src.schemas.images import CommentModel, CommentResponse, SortDirection, ImageResponse
+from src.schemas.images import CommentModel, CommentResponse, SortDirection, ImageResponse, CursorParams, CommentCursorPage
 from src.schemas.users import MessageResponse
 from src.services.auth import auth_service
 from src.services.role import allowed_all_roles_access, allowed_admin_moderator
@@ -30,14 +30,14 @@ security = HTTPBearer()
 )
 async def get_comment_by_id(
     comment_id: int = Path(ge=1),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.token_manager.get_current_user),
 ) -> Type[Comment]:
     """
     Get a specific comment by its ID.
 
     :param comment_id: int: ID of the comment to retrieve
-    :param db: Session: Database session dependency
+    :param db: AsyncSession: Database session dependency
     :param current_user: User: Current user dependency
     :return: Comment: The retrieved comment
     """
@@ -51,27 +51,30 @@ async def get_comment_by_id(
 
 @router.get(
     "/image/{image_id}",
-    description="Get all comments on image.\nNo more than 12 requests per minute.",
+    description="Get comments on image page by page using next_cursor.\nNo more than 12 requests per minute.",
     dependencies=[
         Depends(allowed_all_roles_access),
         Depends(RateLimiter(times=12, seconds=60)),
     ],
-    response_model=List[CommentResponse],
+    response_model=CommentCursorPage,
 )
 async def get_comments_by_image_id(
     image_id: int = Path(ge=1),
     sort_direction: SortDirection = SortDirection.desc,
-    db: Session = Depends(get_db),
+    cursor_params: CursorParams = Depends(),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.token_manager.get_current_user),
-) -> List[Type[Comment]]:
+) -> dict:
     """
-    The get_comments_by_image_id function returns a list of comments for the image with the given id.
+    The get_comments_by_image_id function returns a page of comments for the image with the given id.
+    Pass next_cursor of the response as cursor to get the next page.
 
     :param image_id: int: Get the comments of a specific image
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param sort_direction: Sort the comments in ascending or descending order
+    :param cursor_params: CursorParams: Get the page size and cursor from the request
     :param current_user: dict: Get the current user's information
-    :return: The comments associated with the image
+    :return: The page of comments associated with the image
     """
     image = await repository_images.get_image(image_id, current_user, db)
     if image is None:
@@ -79,7 +82,7 @@ async def get_comments_by_image_id(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=messages.MSC404_IMAGE_NOT_FOUND,
         )
-    comments = await repository_comments.get_comments_by_image(image_id, sort_direction, db)
+    comments = await repository_comments.get_comments_by_image(image_id, sort_direction, cursor_params, db)
     return comments
 
 
@@ -95,7 +98,7 @@ async def get_comments_by_image_id(
 async def add_comment(
     body: CommentModel,
     image_id: int = Path(ge=1),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.token_manager.get_current_user),
 ) -> Optional[CommentResponse]:
     """
@@ -107,7 +110,7 @@ async def add_comment(
 
     :param body: CommentModel: Get the body of the comment
     :param image_id: int: Get the image_id from the url
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param current_user: dict: Get the current user from the database
     :return: The created comment
     """
@@ -134,7 +137,7 @@ async def add_comment(
 async def update_comment(
     body: CommentModel,
     comment_id: int = Path(ge=1),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.token_manager.get_current_user),
 ) -> Comment:
     """
@@ -144,7 +147,7 @@ async def update_comment(
 
     :param body: CommentModel: Get the data from the request body
     :param comment_id: int: Get the comment id of the comment to be deleted
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param current_user: dict: Get the user information from authuser
     :return: A comment object
     """
@@ -171,7 +174,7 @@ async def update_comment(
 )
 async def remove_comment(
     comment_id: int = Path(ge=1),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.token_manager.get_current_user),
 ) -> dict:
     """
@@ -180,7 +183,7 @@ async def remove_comment(
     and returns a dictionary containing information about whether or not it was successful.
 
     :param comment_id: int: Get the comment id from the path
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :param current_user: dict: Get the current user information
     :return: A dict with the message key and value
     """
@@ -1,21 +1,24 @@
 from typing import Optional, List
 
-from fastapi import APIRouter, Depends, File, HTTPException, Path, status, UploadFile
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Path, status, UploadFile
 from fastapi.security import HTTPBearer
 from fastapi_limiter.depends import RateLimiter
 from fastapi_pagination import Page, Params
-from sqlalchemy.orm import Session
-from starlette.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import Response
 
 from src.conf import messages
 from src.database.db import get_db
 from src.database.models import Image, TransformationsType, User, Role
 from src.repository import images as repository_images
 from src.repository import tags as repository_tags
-from src.schemas.images import ImageModel, ImageResponse, SortDirection
+from src.schemas.images import ImageModel, ImageResponse, SortDirection, CursorParams, ImageCursorPage, QRCodeFormat
 from src.schemas.users import MessageResponse
 from src.services.auth import auth_service
-from src.services.cloud_image import CloudImage
+from src.services.cloud_image import CloudImage, upload_service
+from src.services.qrcode_cache import MEDIA_TYPES, qrcode_cache
+from src.services.storage import hash_file
+from src.services.transformations import transformation_engine
 from src.services.role import allowed_all_roles_access, allowed_admin_moderator
 
 router = APIRouter(prefix='/images', tags=['images'])
@@ -23,7 +26,8 @@ security = HTTPBearer()
 
 
 @router.get("/all", response_model=Page[ImageResponse],
-            description='Get images.\nNo more than 12 requests per minute.',
+            description='Get images.\nFor deep pages use /all/cursor, it does not slow down with the page number.'
+                        '\nNo more than 12 requests per minute.',
             dependencies=[
                           Depends(allowed_admin_moderator),
                           Depends(RateLimiter(times=12, seconds=60))
@@ -31,14 +35,14 @@ security = HTTPBearer()
             summary="Get all images if you are admin or moderator"
             )
 async def get_images_all(
-                 db: Session = Depends(get_db),
+                 db: AsyncSession = Depends(get_db),
                  pagination_params: Params = Depends()
                     ) -> Page[ImageResponse]:
 
 
         """
         The get_images_all function returns a list of all images in the database.
-        :param db: Session: Pass the database session to the repository layer
+        :param db: AsyncSession: Pass the database session to the repository layer
         :param pagination_params: Params: Get the pagination parameters from the request
         :return: A list of images
         """
@@ -46,15 +50,43 @@ async def get_images_all(
         return images
 
 
+@router.get("/all/cursor", response_model=ImageCursorPage,
+            description='Get images page by page using next_cursor.\nNo more than 12 requests per minute.',
+            dependencies=[
+                          Depends(allowed_admin_moderator),
+                          Depends(RateLimiter(times=12, seconds=60))
+                          ],
+            summary="Get all images by cursor if you are admin or moderator"
+            )
+async def get_images_all_by_cursor(
+                 db: AsyncSession = Depends(get_db),
+                 cursor_params: CursorParams = Depends(),
+                 sort_direction: SortDirection = SortDirection.desc
+                    ) -> ImageCursorPage:
+
+
+        """
+        The get_images_all_by_cursor function returns a page of all images in the database.
+        Pass next_cursor of the response as cursor to get the next page. Total count is not calculated.
+        :param db: AsyncSession: Pass the database session to the repository layer
+        :param cursor_params: CursorParams: Get the page size and cursor from the request
+        :param sort_direction: SortDirection: Determine whether the images are sorted in ascending or descending order
+        :return: A page of images with the cursor of the next page
+        """
+        images = await repository_images.get_images_all_by_cursor(db, cursor_params, sort_direction)
+        return images
+
+
 @router.get("/by_user", response_model=Page[ImageResponse],
-            description='Get images.\nNo more than 12 requests per minute.',
+            description='Get images.\nFor deep pages use /by_user/cursor, it does not slow down with the page number.'
+                        '\nNo more than 12 requests per minute.',
             dependencies=[
                           Depends(allowed_all_roles_access),
                           Depends(RateLimiter(times=12, seconds=60))
                           ],
             )
 async def get_images_by_user(
-                 db: Session = Depends(get_db),
+                 db: AsyncSession = Depends(get_db),
                  current_user: User = Depends(auth_service.token_manager.get_current_user),
                  pagination_params: Params = Depends(),
                  sort_direction: SortDirection = SortDirection.desc
@@ -64,7 +96,7 @@ async def get_images_by_user(
         """
         The get_images_by_user function returns a list of images that the current user has uploaded.
         The function takes in a pagination_params object, which is used to determine how many images are returned per page and what page number to return.
-        :param db: Session: Access the database
+        :param db: AsyncSession: Access the database
         :param current_user: User: Get the current user from the database
         :param pagination_params: Params: Get the pagination parameters from the request
         :param sort_direction: SortDirection: Determine whether the images are sorted in ascending or descending order
@@ -74,6 +106,34 @@ async def get_images_by_user(
         return images
 
 
+@router.get("/by_user/cursor", response_model=ImageCursorPage,
+            description='Get images page by page using next_cursor.\nNo more than 12 requests per minute.',
+            dependencies=[
+                          Depends(allowed_all_roles_access),
+                          Depends(RateLimiter(times=12, seconds=60))
+                          ],
+            )
+async def get_images_by_user_by_cursor(
+                 db: AsyncSession = Depends(get_db),
+                 current_user: User = Depends(auth_service.token_manager.get_current_user),
+                 cursor_params: CursorParams = Depends(),
+                 sort_direction: SortDirection = SortDirection.desc
+                    ) -> ImageCursorPage:
+
+
+        """
+        The get_images_by_user_by_cursor function returns a page of images that the current user has uploaded.
+        Pass next_cursor of the response as cursor to get the next page. Total count is not calculated.
+        :param db: AsyncSession: Access the database
+        :param current_user: User: Get the current user from the database
+        :param cursor_params: CursorParams: Get the page size and cursor from the request
+        :param sort_direction: SortDirection: Determine whether the images are sorted in ascending or descending order
+        :return: A page of images with the cursor of the next page
+        """
+        images = await repository_images.get_images_by_user_by_cursor(db, current_user, cursor_params, sort_direction)
+        return images
+
+
 @router.get('/{image_id}',
             description='Get image.\nNo more than 12 requests per minute',
             dependencies=[
@@ -84,7 +144,7 @@ async def get_images_by_user(
             )
 async def get_image(
                     image_id: int = Path(ge=1),
-                    db: Session = Depends(get_db),
+                    db: AsyncSession = Depends(get_db),
                     current_user: User = Depends(auth_service.token_manager.get_current_user),
                     ) -> Optional[Image]:
         """
@@ -92,7 +152,7 @@ async def get_image(
         The function takes in an image_id as a path parameter, and returns an Image object if it exists.
         If no such Image exists, then the function will return None.
         :param image_id: int: Get the image id from the path
-        :param db: Session: Get the database session
+        :param db: AsyncSession: Get the database session
         :param current_user: dict: Get the current user from the database
         :return: The image object
         """
@@ -113,7 +173,7 @@ async def get_image(
 async def transform_image(
                         type: TransformationsType,
                         image_id: int,
-                        db: Session = Depends(get_db),
+                        db: AsyncSession = Depends(get_db),
                         current_user: User = Depends(auth_service.token_manager.get_current_user)
                     ):
     """
@@ -124,9 +184,9 @@ async def transform_image(
 
     :param type: TransformationsType: Specify the type of transformation that will be applied to the image
     :param image_id: int: Get the image from the database
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param current_user: dict: Get the current user from the database
-    :return: A new image with the transformation applied
+    :return: A new image with the transformation applied, or the image created by the same transformation earlier
     """
     image = await repository_images.get_image(image_id, current_user, db)
     if image is None:
@@ -134,12 +194,17 @@ async def transform_image(
     if image.user_id != current_user.id and current_user.role != Role.admin:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=messages.MSC400_BAD_REQUEST)
 
-    transform_image_link = CloudImage.transformation(image, type)
+    transformed_image = await repository_images.get_transformed_image(image.id, type, db)
+    if transformed_image is not None:
+        return transformed_image
+
+    transform_image_link = await transformation_engine.transform(image, type)
     body = {
         'description': image.description + ' ' + type.value,
         'link': transform_image_link,
         'tags': image.tags,
-        'type': image.type
+        'type': type,
+        'source_image_id': image.id
     }
     new_image = await repository_images.transform_image(body, image.user_id, db)
     return new_image
@@ -155,24 +220,36 @@ async def transform_image(
             )
 async def image_qry(
                     image_id: int = Path(ge=1),
-                    db: Session = Depends(get_db),
+                    format: QRCodeFormat = QRCodeFormat.png,
+                    if_none_match: Optional[str] = Header(None),
+                    db: AsyncSession = Depends(get_db),
                     current_user: User = Depends(auth_service.token_manager.get_current_user),
                     ):
         """
         The image_qry function is used to generate a QR code for the image.
         The QR code contains the URL of the image, which can be scanned by a mobile device.
         This function requires an authentication token and returns an HTTP response containing
-        a PNG file with the QR code.
+        a PNG or SVG file with the QR code. The QR code depends only on the link of the image, so it is cached
+        and sent with an ETag; a request with a matching If-None-Match gets 304 Not Modified.
         :param image_id: int: Get the image id from the url
-        :param db: Session: Get the database session
+        :param format: QRCodeFormat: png or svg
+        :param if_none_match: Optional[str]: ETags of the QR codes cached by the client
+        :param db: AsyncSession: Get the database session
         :param current_user: dict: Get the current user from the token
         :return: A qr code image of the given image
         """
         image = await repository_images.get_image(image_id, current_user, db)
         if image is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.MSC404_IMAGE_NOT_FOUND)
-        qr_code = CloudImage.get_qrcode(image)
-        return StreamingResponse(qr_code, media_type="image/png")
+
+        etag = qrcode_cache.etag(image.link, format.value)
+        headers = {'ETag': etag, 'Cache-Control': 'private, max-age=86400'}
+        if if_none_match and (if_none_match.strip() == '*' or etag in
+                              (tag.strip().removeprefix('W/') for tag in if_none_match.split(','))):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        content, _ = await qrcode_cache.get(image.link, format.value)
+        return Response(content, media_type=MEDIA_TYPES[format.value], headers=headers)
 
 
 @router.post(
@@ -188,26 +265,31 @@ async def create_image(
                         description: str = '-',
                         tags: str = '',
                         file: UploadFile = File(),
-                        db: Session = Depends(get_db),
+                        db: AsyncSession = Depends(get_db),
                         current_user: User = Depends(auth_service.token_manager.get_current_user),
                         ) -> Image:
 
         """
         The create_image function creates a new image in the database.
+        If the same content has been uploaded before, the stored file is reused instead of being uploaded again.
         :param description: str: Set the description of the image
         :param tags: str: Add tags to the image
         :param file: UploadFile: Get the file from the request
-        :param db: Session: Get a database session
+        :param db: AsyncSession: Get a database session
         :param current_user: dict: Get the current user
         :return: A new image
         """
-        public_id = CloudImage.generate_name_image(current_user.email, file.filename)
-        r = CloudImage.image_upload(file.file, public_id)
-        src_url = CloudImage.get_url_for_image(public_id, r)
+        content_hash = await upload_service.run(hash_file, file.file)
+        src_url = await repository_images.get_link_by_content_hash(content_hash, db)
+        if src_url is None:
+            public_id = CloudImage.generate_name_image(current_user.email, content_hash)
+            r = await upload_service.run(CloudImage.image_upload, file.file, public_id)
+            src_url = CloudImage.get_url_for_image(public_id, r)
         body = {
             'description': description,
             'link': src_url,
-            'tags': tags
+            'tags': tags,
+            'content_hash': content_hash
         }
         image = await repository_images.create_image(body, current_user.id, db, 5)
         return image
@@ -224,7 +306,7 @@ async def create_image(
                )
 async def remove_image(
                     image_id: int = Path(ge=1),
-                    db: Session = Depends(get_db),
+                    db: AsyncSession = Depends(get_db),
                     current_user: User = Depends(auth_service.token_manager.get_current_user)
                     ) -> dict:
 
@@ -232,7 +314,7 @@ async def remove_image(
         The remove_image function removes an image from the database.
         The function takes in an image_id and a database session, and returns a dictionary with a message.
         :param image_id: int: Get the image id from the path
-        :param db: Session: Pass the database session to the repository
+        :param db: AsyncSession: Pass the database session to the repository
         :param current_user: dict: Get the current user from the database
         :return: A dictionary with a message
         """
@@ -254,17 +336,17 @@ async def remove_image(
 async def update_image(
                     body: ImageModel,
                     image_id: int = Path(ge=1),
-                    db: Session = Depends(get_db),
+                    db: AsyncSession = Depends(get_db),
                     current_user: User = Depends(auth_service.token_manager.get_current_user),
                     ) -> Image:
         """
         The update_image function updates an image in the database.
         The function takes a body of type ImageModel, which is defined in models/image.py, and an image_id of type int as parameters.
-        The function also takes a db Session object from the get_db() dependency injection method, which is defined in crud/base.py;
+        The function also takes a db AsyncSession object from the get_db() dependency injection method, which is defined in crud/base.py;
         this allows us to access our database session for querying purposes (see https://docs.sqlalchemy.org/en/13/)
         :param body: ImageModel: Get the data from the request body
         :param image_id: int: Get the image id from the url
-        :param db: Session: Get the database session
+        :param db: AsyncSession: Get the database session
         :param current_user: dict: Get the current user
         :return: An image object
         """
@@ -286,7 +368,7 @@ async def update_image(
 async def get_image_by_tag_name(
                     tag_name: str,
                     sort_direction: SortDirection = SortDirection.desc,
-                    db: Session = Depends(get_db),
+                    db: AsyncSession = Depends(get_db),
                     current_user: User = Depends(auth_service.token_manager.get_current_user),
             ) -> List[Image]:
 
@@ -299,7 +381,7 @@ async def get_image_by_tag_name(
         in length.
         :param tag_name: str: Get the tag from the database
         :param sort_direction: SortDirection: Specify the sort direction of the images
-        :param db: Session: Pass the database session to the function
+        :param db: AsyncSession: Pass the database session to the function
         :param current_user: dict: Get the current user from the token manager
         :return: A list of images
         """
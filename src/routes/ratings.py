@@ -3,7 +3,8 @@ from typing import List, Type
 from fastapi import APIRouter, Depends, Path, HTTPException, status
 from fastapi.security import HTTPBearer
 from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.conf import messages
 from src.database.db import get_db
@@ -30,13 +31,13 @@ security = HTTPBearer()
 )
 async def get_all_ratings(
     image_id: int = Path(ge=1),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.token_manager.get_current_user),
 ) -> List[Type[Rating]]:
     """
     The get_all_ratings function returns a list of all ratings for the image with the given ID.
     :param image_id: int: Specify the id of the image to get all ratings for
-    :param db: Session: Pass the database session to the repository layer
+    :param db: AsyncSession: Pass the database session to the repository layer
     :param current_user: User: Get the user that is currently logged in
     :param : Get the image id from the url path
     :return: A list of rating objects
@@ -63,13 +64,13 @@ async def get_all_ratings(
 )
 async def get_rating(
     image_id: int = Path(ge=1),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.token_manager.get_current_user),
 ) -> AverageRatingResponse:
     """
     The get_rating function returns the average rating of an image.
     :param image_id: int: Get the image id from the url path
-    :param db: Session: Pass the database session to the repository function
+    :param db: AsyncSession: Pass the database session to the repository function
     :param current_user: User: Get the user who is making the request
     :param : Get the image id from the url
     :return: An average rating response object
@@ -97,14 +98,14 @@ async def get_rating(
 async def add_rating(
     body: RatingModel,
     image_id: int = Path(ge=1),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.token_manager.get_current_user),
 ) -> Rating:
     """
     The add_rating function creates a new rating for an image.
     :param body: RatingModel: Get the rating value from the request body
     :param image_id: int: Get the id of the image that is being rated
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :param current_user: User: Get the user who is currently logged in
     :param : Get the image id from the path
     :return: A rating object
@@ -116,11 +117,10 @@ async def add_rating(
             status_code=status.HTTP_404_NOT_FOUND, detail=messages.IMAGE_NOT_FOUND
         )
 
-    existing_rating = (
-        db.query(Rating)
-        .filter(Rating.image_id == image_id, Rating.user_id == current_user.id)
-        .first()
+    result = await db.execute(
+        select(Rating).filter(Rating.image_id == image_id, Rating.user_id == current_user.id)
     )
+    existing_rating = result.scalar_one_or_none()
 
     if existing_rating:
         raise HTTPException(
@@ -149,7 +149,7 @@ async def add_rating(
 )
 async def remove_rating(
     rating_id: int = Path(ge=1),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(auth_service.token_manager.get_current_user),
 ) -> dict:
     """
@@ -157,7 +157,7 @@ async def remove_rating(
     The function takes in an integer representing the id of the rating to be removed,
     and returns a dictionary containing a message indicating that the removal was successful.
     :param rating_id: int: Get the id of the rating that will be removed
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param current_user: User: Get the user id of the current user
     :param : Get the rating id from the url
     :return: A dictionary with a message key and value
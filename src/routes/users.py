@@ -1,20 +1,17 @@
 from typing import Optional, List
 
-import cloudinary
-import cloudinary.uploader
 from fastapi import APIRouter, Depends, status, UploadFile, File, HTTPException, Path
 from fastapi.security import HTTPBearer
 from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.conf import messages
-from src.conf.config import settings
 from src.database.db import get_db
 from src.database.models import User, Role
 from src.repository import users as repository_users, profile as repository_profile
 from src.schemas.users import UserResponse, UpdateFullProfile, ProfileResponse, ChangeRoleModel, ResponseBanned
 from src.services.auth import auth_service
-from src.services.cloud_image import CloudImage
+from src.services.cloud_image import CloudImage, upload_service
 from src.services.role import allowed_all_roles_access, allowed_admin
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -31,25 +28,19 @@ security = HTTPBearer()
               response_model=UserResponse)
 async def update_avatar_user(file: UploadFile = File(),
                              current_user: User = Depends(auth_service.token_manager.get_current_user),
-                             db: Session = Depends(get_db)) -> User:
+                             db: AsyncSession = Depends(get_db)) -> User:
     """
     The update_avatar_user function updates the avatar of a user.
         The function takes in an UploadFile object, which is a file that has been uploaded to the server.
-        It also takes in a User object and Session object as dependencies.
+        It also takes in a User object and AsyncSession object as dependencies.
 
     :param file: UploadFile: Upload the file to cloudinary
     :param current_user: User: Get the current user
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: A user object
     """
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
     public_id = CloudImage.generate_name_avatar(current_user.email)
-    r = CloudImage.upload(file.file, public_id)
+    r = await upload_service.run(CloudImage.upload, file.file, public_id)
     src_url = CloudImage.get_url_for_avatar(public_id, r)
     user = await repository_users.update_avatar(current_user.email, src_url, db)
     return user
@@ -66,21 +57,21 @@ async def update_avatar_user(file: UploadFile = File(),
 async def ban_user(
                    user_id: int,
                    current_user: dict = Depends(auth_service.token_manager.get_current_user),
-                   db: Session = Depends(get_db)
+                   db: AsyncSession = Depends(get_db)
                    ) -> ResponseBanned:
     """
     The ban_user function is used to ban a user from the system.
 
     :param user_id: int: Identify the user to be banned
     :param current_user: dict: Get the current user from the auth user class
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: MessageResponse: message that the user has been banned
     """
     user: Optional[User] = await repository_users.ban_user(user_id, False, db)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.MSC404_USER_NOT_FOUND)
 
-    await auth_service.token_manager.clear_user_cash(user.email)
+    await auth_service.token_manager.clear_user_cash(user.email, user.id)
 
     return ResponseBanned(message=f"User with id={user_id} and email={user.email} has been banned")
 
@@ -96,21 +87,21 @@ async def ban_user(
 async def unban_user(
                    user_id: int,
                    current_user: dict = Depends(auth_service.token_manager.get_current_user),
-                   db: Session = Depends(get_db)
+                   db: AsyncSession = Depends(get_db)
                    ) -> ResponseBanned:
     """
     The unban_user function is used to unban a user.
 
     :param user_id: int: Identify the user to be unbanned
     :param current_user: dict: Get the current user from the auth user class
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: ResponseBanned: message that the user has been unbanned
     """
     user: Optional[User] = await repository_users.ban_user(user_id, True, db)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.MSC404_USER_NOT_FOUND)
 
-    await auth_service.token_manager.clear_user_cash(user.email)
+    await auth_service.token_manager.clear_user_cash(user.email, user.id)
 
     return ResponseBanned(message=f"User with id={user_id} and email={user.email} has been unbanned")
 
@@ -125,18 +116,19 @@ async def unban_user(
             response_model=ProfileResponse)
 async def read_profile(
     current_user: User = Depends(auth_service.token_manager.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> ProfileResponse:
     """
     Get profile of current user
 
     :param current_user: The current user.
     :type current_user: User
-    :param db: Session: Connection to the database
+    :param db: AsyncSession: Connection to the database
     :return: The current user.
     :rtype: dict
     """
-    result = await repository_profile.read_profile(current_user, db)
+    user = await repository_users.get_user_by_id(current_user.id, db)
+    result = await repository_profile.read_profile(user, db)
     return result
 
 
@@ -151,7 +143,7 @@ async def read_profile(
 async def update_profile(
     data: UpdateFullProfile,
     current_user: User = Depends(auth_service.token_manager.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> ProfileResponse:
     """
     Updates profile of current user
@@ -159,13 +151,14 @@ async def update_profile(
     :param data: UpdateFullProfile: data to change
     :param current_user: The current user.
     :type current_user: User
-    :param db: Session: Connection to the database
+    :param db: AsyncSession: Connection to the database
     :return: The current updated user.
     :rtype: dict
     """
-    updated = await repository_profile.update_profile(data, current_user, db)
+    user = await repository_users.get_user_by_id(current_user.id, db)
+    updated = await repository_profile.update_profile(data, user, db)
     if updated:
-        result = await repository_profile.read_profile(current_user, db)
+        result = await repository_profile.read_profile(user, db)
         return result
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND, detail=messages.USER_NOT_FOUND
@@ -183,7 +176,7 @@ async def update_profile(
 async def change_role(
     body: ChangeRoleModel,
     current_user: User = Depends(auth_service.token_manager.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> ProfileResponse:
     """
     The update_profile_by_admin function allows an admin to update the role of a user.
@@ -193,7 +186,7 @@ async def change_role(
 
     :param body: ChangeRoleModel: id and role of a user to change.
     :param current_user: User: Get the user from the token
-    :param db: Session: Create a connection to the database
+    :param db: AsyncSession: Create a connection to the database
     :return: A profile
     """
     if current_user.role != Role.admin:
@@ -225,12 +218,12 @@ async def change_role(
 async def read_profile_user(
     username: str = Path(min_length=2, max_length=16),
     current_user: User = Depends(auth_service.token_manager.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Get profile of selected user by their username
 
-    :param db: Session: connection to the database
+    :param db: AsyncSession: connection to the database
     :param username: username of user.
     :type current_user: str
     :return: The current user.
@@ -255,12 +248,12 @@ async def read_profile_user(
 async def read_profile_user(
     user_id: int = Path(ge=1),
     current_user: User = Depends(auth_service.token_manager.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Get profile of selected user by their username
 
-    :param db: Session: connection to the database
+    :param db: AsyncSession: connection to the database
     :param user_id: int: user_id of user.
     :type current_user: str
     :return: The current user.
@@ -284,7 +277,7 @@ async def read_profile_user(
             response_model=List[ProfileResponse])
 async def read_profile_all_users(
     current_user: User = Depends(auth_service.token_manager.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> List[ProfileResponse]:
 
     """
@@ -292,7 +285,7 @@ async def read_profile_all_users(
     This function can only be accessed by an admin user.
     The function returns a list of dictionaries containing the information for each user.
     :param current_user: User: Get the current user that is logged in
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param : Get the current user
     :return: A list of all users
     """
@@ -1,5 +1,6 @@
 import enum
 from datetime import datetime
+from fastapi import Query
 from pydantic import BaseModel, Field
 from typing import List, Optional
 
@@ -32,6 +33,16 @@ class ImageResponse(ImageModel):
         orm_mode = True
 
 
+class CursorParams(BaseModel):
+    size: int = Query(50, ge=1, le=100, description="Page size")
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page")
+
+
+class ImageCursorPage(BaseModel):
+    items: List[ImageResponse]
+    next_cursor: Optional[str] = None
+
+
 class TransformateModel(BaseModel):
     Type: TransformationsType
 
@@ -41,6 +52,11 @@ class SortDirection(enum.Enum):
     desc = 'desc'
 
 
+class QRCodeFormat(enum.Enum):
+    png = 'png'
+    svg = 'svg'
+
+
 class CommentModel(BaseModel):
     comment: str = Field(max_length=2000)
 
@@ -57,6 +73,11 @@ class CommentResponse(CommentModel):
         orm_mode = True
 
 
+class CommentCursorPage(BaseModel):
+    items: List[CommentResponse]
+    next_cursor: Optional[str] = None
+
+
 class RatingModel(BaseModel):
     rating: Optional[float] = Field(ge=1, le=5)
 
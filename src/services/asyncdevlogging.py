@@ -1,38 +1,190 @@
 from pathlib import Path
-import logging
+import json
+import os
+import queue
+import random
 import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
 
-from aiofile import async_open
-from aiopath import AsyncPath
+from src.conf.config import settings
 
 
-logging.basicConfig(level=logging.DEBUG, format='%(threadName)s %(message)s')
+LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40}
+
 async_log_file = 'frt_photo_share_asynclog.txt'
 async_log_file = str(Path(sys.argv[0]).parent.absolute().joinpath('logs', async_log_file))
 
 
-async def async_logging_to_file(message: str) -> None:
+class QueueLogger:
     """
-    The async_logging_to_file function is a coroutine that takes in a message string and writes it to the async_log_file.
-    It first checks if the parent directory of async_log_file exists, and if not, creates it. It then checks whether or not
-    async_logging exists as a file; if so, it opens the file in append mode (a+), otherwise it opens the file in write mode (w+).
-    If neither of these conditions are met, an error message is logged to stdout.
-
-    :param message: str: Pass the message to be logged
-    :return: None
-    :doc-author: Trelent
+    Writes log records as JSON lines without blocking the caller.
+    log only puts the record into an in-memory queue; a background thread takes the records
+    in batches, writes each batch with one call and rotates the file by size and by age.
+    Records of a level with a sample rate below 1 are kept with that probability,
+    and records that do not fit into a full queue are dropped and counted.
     """
-    apath = AsyncPath(Path(async_log_file).parent)
-    await apath.mkdir(parents=True, exist_ok=True)
-    if apath.exists() and apath.is_file():
-        mode_file_open: str = 'a+'
 
-    elif not apath.exists():
-        mode_file_open: str = 'w+'
+    def __init__(self, path: str, max_bytes: int, rotate_interval: float, backup_count: int,
+                 queue_size: int, batch_size: int, flush_interval: float,
+                 sample_rates: Optional[Dict[str, float]] = None, level: str = 'debug'):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sample_rates = {name.lower(): rate for name, rate in (sample_rates or {}).items()}
+        self.level = LEVELS[level.lower()]
+        self.dropped = 0
+        self.sampled_out = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._opened_at = 0.0
+
+    def log(self, level: str, event: str, **fields) -> None:
+        """
+        The log function queues a record. It never waits for the file to be written.
+
+        :param self: Represent the instance of the class
+        :param level: str: debug, info, warning or error
+        :param event: str: Short name of what happened
+        :param fields: Values added to the record
+        :return: None
+        """
+        if LEVELS[level] < self.level:
+            return
+        rate = self.sample_rates.get(level, 1.0)
+        if rate < 1.0 and random.random() >= rate:
+            self.sampled_out += 1
+            return
+        record = {'ts': datetime.now(timezone.utc).isoformat(timespec='milliseconds'), 'level': level, 'event': event}
+        record.update(fields)
+        if rate < 1.0:
+            record['sample_rate'] = rate
+        self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def debug(self, event: str, **fields) -> None:
+        self.log('debug', event, **fields)
+
+    def info(self, event: str, **fields) -> None:
+        self.log('info', event, **fields)
+
+    def warning(self, event: str, **fields) -> None:
+        self.log('warning', event, **fields)
+
+    def error(self, event: str, **fields) -> None:
+        self.log('error', event, **fields)
+
+    def _start(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='QueueLogger', daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stop = True
+                batch = [record for record in batch if record is not None]
+            if batch:
+                self._write(batch)
+        self._close_file()
+
+    def _write(self, batch: list) -> None:
+        lines = ''.join(json.dumps(record, default=str, ensure_ascii=False) + '\n' for record in batch)
+        try:
+            if self._file is None:
+                self._open_file()
+            elif self._should_rotate():
+                self._rotate()
+            self._file.write(lines)
+            self._file.flush()
+            self.written += len(batch)
+        except OSError as err:
+            self.dropped += len(batch)
+            sys.stderr.write(f'Error writing log "{self.path}", {err}\n')
+            self._close_file()
+
+    def _open_file(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._opened_at = time.time()
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _should_rotate(self) -> bool:
+        return (self._file.tell() >= self.max_bytes
+                or time.time() - self._opened_at >= self.rotate_interval)
+
+    def _rotate(self) -> None:
+        self._close_file()
+        for i in range(self.backup_count - 1, 0, -1):
+            source = self.path.with_name(f'{self.path.name}.{i}')
+            if source.exists():
+                os.replace(source, self.path.with_name(f'{self.path.name}.{i + 1}'))
+        if self.backup_count > 0:
+            os.replace(self.path, self.path.with_name(f'{self.path.name}.1'))
+        else:
+            self.path.unlink(missing_ok=True)
+        self._open_file()
+
+    def close(self, timeout: float = 5) -> None:
+        """
+        The close function writes the queued records and stops the writer thread.
+
+        :param self: Represent the instance of the class
+        :param timeout: float: Seconds to wait for the writer thread
+        :return: None
+        """
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def info_stats(self) -> dict:
+        """
+        The info_stats function returns the counters of the logger.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with the logger statistics
+        """
+        return {'queued': self._queue.qsize(), 'written': self.written,
+                'dropped': self.dropped, 'sampled_out': self.sampled_out}
 
-    else:
-        logging.warning(f'Sorry, no log-file and can\'t create "{async_log_file}".')
-        return None
 
-    async with async_open(async_log_file, mode_file_open) as afp:
-        await afp.write(f'{message}\n')
\ No newline at end of file
+logger = QueueLogger(
+    settings.log_file or async_log_file,
+    max_bytes=settings.log_max_bytes,
+    rotate_interval=settings.log_rotate_interval,
+    backup_count=settings.log_backup_count,
+    queue_size=settings.log_queue_size,
+    batch_size=settings.log_batch_size,
+    flush_interval=settings.log_flush_interval,
+    sample_rates=settings.log_sample_rates,
+    level=settings.log_level,
+)
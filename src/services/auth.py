@@ -1,24 +1,65 @@
-import pickle
+import asyncio
 import string
+import uuid
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 
-import redis as redis
 import secrets
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.conf import messages
 from src.conf.config import settings
-from src.database.db import get_db
+from src.database.db import get_db, redis_client
+from src.database.models import Role
 from src.repository import users as repository_users
+from src.services.asyncdevlogging import logger
+from src.services.refresh_tokens import DatabaseRefreshTokenStore, RedisRefreshTokenStore
+from src.services.revocation import revocation_list
+from src.services.token_cache import decoded_token_cache
+from src.services.user_cache import CachedUser, TokenClaims, CACHE_TTL, USERS_CHANNEL, user_cache, token_versions
+
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _timed(func, submitted: float, *args):
+    """
+    The _timed function runs func in a worker process and reports how long the call waited for a free worker.
+
+    :param func: Function to call in the worker
+    :param submitted: float: time.monotonic() at the moment the call was submitted to the pool
+    :param args: Arguments of func
+    :return: A tuple of the wait time in seconds and the result of func
+    """
+    return time.monotonic() - submitted, func(*args)
+
+
+def _verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def _get_password_hash(password: str) -> str:
+    return pwd_context.hash(password)
 
 
 class PasswordManager:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    pwd_context = pwd_context
+    executor: Optional[ProcessPoolExecutor] = None
+    workers = settings.password_hash_workers
+    max_pending = settings.password_hash_workers + settings.password_hash_queue_size
+
+    def __init__(self):
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
 
     def verify_password(self, plain_password, hashed_password):
         """
@@ -44,6 +85,92 @@ class PasswordManager:
         """
         return self.pwd_context.hash(password)
 
+    async def verify_password_async(self, plain_password: str, hashed_password: str) -> bool:
+        """
+        The verify_password_async function checks the password in the process pool, so bcrypt does not block the event loop.
+        If too many hashes are already waiting, an HTTPException with status code 503 is raised.
+
+        :param self: Represent the instance of the class
+        :param plain_password: str: Password entered by the user
+        :param hashed_password: str: Hashed password from the database
+        :return: A boolean value
+        """
+        return await self._run_in_pool(_verify_password, plain_password, hashed_password)
+
+    async def get_password_hash_async(self, password: str) -> str:
+        """
+        The get_password_hash_async function hashes the password in the process pool, so bcrypt does not block the event loop.
+        If too many hashes are already waiting, an HTTPException with status code 503 is raised.
+
+        :param self: Represent the instance of the class
+        :param password: str: Password to hash
+        :return: A string that is the hashed password
+        """
+        return await self._run_in_pool(_get_password_hash, password)
+
+    async def _run_in_pool(self, func, *args):
+        """
+        The _run_in_pool function submits func to the process pool and counts the calls waiting for a worker.
+
+        :param self: Represent the instance of the class
+        :param func: Module level function to call in the worker
+        :param args: Arguments of func
+        :return: The result of func
+        """
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail=messages.MSC503_PASSWORD_QUEUE_FULL,
+                                headers={'Retry-After': '1'})
+
+        if PasswordManager.executor is None:
+            PasswordManager.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            wait_time, result = await loop.run_in_executor(
+                PasswordManager.executor, _timed, func, time.monotonic(), *args
+            )
+        finally:
+            self.pending -= 1
+
+        self.completed += 1
+        self.wait_time_total += wait_time
+        self.wait_time_max = max(self.wait_time_max, wait_time)
+        return result
+
+    def metrics(self) -> dict:
+        """
+        The metrics function returns the state of the password hashing pool.
+        queue_depth is the number of calls waiting for a free worker, wait times are in seconds.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with the pool metrics
+        """
+        return {
+            'workers': self.workers,
+            'in_flight': self.pending,
+            'queue_depth': max(self.pending - self.workers, 0),
+            'queue_size': self.max_pending - self.workers,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'wait_time_avg': self.wait_time_total / self.completed if self.completed else 0.0,
+            'wait_time_max': self.wait_time_max,
+        }
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """
+        The shutdown function stops the worker processes of the password hashing pool.
+
+        :param cls: Represent the class
+        :return: None
+        """
+        if cls.executor is not None:
+            cls.executor.shutdown(cancel_futures=True)
+            cls.executor = None
+
     def get_new_password(self, password_length: int = 12, meeting_limit: int = 3) -> str:
         """
         The get_new_password function generates a random password of length 12 characters.
@@ -74,11 +201,12 @@ class TokenManager:
     SECRET_KEY = settings.secret_key
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-    r = redis.Redis(
-        host=settings.redis_host,
-        port=settings.redis_port,
-        password=settings.redis_password)
-    invalid_tokens = set()
+    r = redis_client
+    user_cache = user_cache
+    token_versions = token_versions
+    decoded_token_cache = decoded_token_cache
+    refresh_tokens = RedisRefreshTokenStore(redis_client, DatabaseRefreshTokenStore())
+    revocation_list = revocation_list
 
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
         """
@@ -98,10 +226,22 @@ class TokenManager:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
             expire = datetime.utcnow() + timedelta(days=7)
-        to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "access_token"})
+        to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "access_token", "jti": uuid.uuid4().hex})
         encoded_access_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_access_token
 
+    def access_token_data(self, user) -> dict:
+        """
+        The access_token_data function returns the claims of an access token for the user:
+        the email, and the id, role and token version used to authorize requests without loading the user.
+
+        :param self: Represent the instance of the class
+        :param user: User: User from the database
+        :return: A dictionary of claims to pass to create_access_token
+        """
+        return {"sub": user.email, "uid": user.id, "role": user.role.value if user.role else None,
+                "tv": user.token_version or 0}
+
     async def create_refresh_token(self, data: dict, expires_delta: Optional[float] = None):
         """
         The create_refresh_token function creates a refresh token for the user.
@@ -119,26 +259,32 @@ class TokenManager:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
             expire = datetime.utcnow() + timedelta(days=7)
-        to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token"})
+        to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token", "jti": uuid.uuid4().hex})
         encoded_refresh_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_refresh_token
 
-    async def is_token_valid(self, token: str) -> bool:
+    async def is_token_valid(self, payload: dict) -> bool:
         """
         Перевіряє, чи токен дійсний (не анульований).
+        Tokens issued without a jti cannot be revoked and are valid until they expire.
         """
-        return token not in self.invalid_tokens
+        jti = payload.get("jti")
+        return jti is None or not await self.revocation_list.is_revoked(jti)
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
         """
         The get_current_user function is a dependency that will be used in the
             protected endpoints. It takes a token as an argument and returns the user
             if it's valid, or raises an HTTPException with status code 401 if not.
 
+        If the token carries the current token version of the user, the id, email and role
+        are taken from the token and the user is not loaded at all.
+        Verified claims are cached until the token expires; the revocation check runs every time.
+
         :param self: Make the function a method of the class
         :param token: str: Get the token from the authorization header
-        :param db: Session: Get the database session
-        :return: The user object of the logged in user
+        :param db: AsyncSession: Get the database session
+        :return: The TokenClaims or the CachedUser snapshot of the logged in user
         """
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -146,12 +292,11 @@ class TokenManager:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-        is_valid_token = await self.is_token_valid(token)
-        if not is_valid_token:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-
         try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.decoded_token_cache.get(token)
+            if payload is None:
+                payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+                self.decoded_token_cache.put(token, payload)
             if payload.get("scope") == "access_token":
                 email = payload.get("sub")
                 if email is None:
@@ -161,16 +306,31 @@ class TokenManager:
         except JWTError as e:
             raise credentials_exception
 
-        user = self.r.get(f"user:{email}")
+        is_valid_token = await self.is_token_valid(payload)
+        if not is_valid_token:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+        user_id, role, token_version = payload.get("uid"), payload.get("role"), payload.get("tv")
+        current_version = None
+        if user_id is not None and role is not None and token_version is not None:
+            current_version = await self.token_versions.get(user_id, self.r)
+            if current_version == token_version:
+                return TokenClaims(user_id, email, Role(role), token_version)
+
+        user = self.user_cache.get(email)
         if user is None:
-            user = await repository_users.get_user_by_email(email, db)
+            cached = await self.r.get(f"user:{email}")
+            user = CachedUser.loads(cached) if cached is not None else None
             if user is None:
-                raise credentials_exception
-            self.r.set(f"user:{email}", pickle.dumps(user))
-            self.r.expire(f"user:{email}", 900)
-
-        else:
-            user = pickle.loads(user)
+                db_user = await repository_users.get_user_by_email(email, db)
+                if db_user is None:
+                    raise credentials_exception
+                user = CachedUser.from_user(db_user)
+                await self.r.set(f"user:{email}", user.dumps(), ex=CACHE_TTL)
+            # a bump deletes the snapshot, so the snapshot carries a version that can be published again
+            if current_version is None:
+                await self.token_versions.put(user.id, user.token_version, self.r)
+            self.user_cache.put(user)
 
         if not user.status_active:
             raise HTTPException(
@@ -178,8 +338,6 @@ class TokenManager:
                 detail=messages.YOU_ARE_BANNED,
             )
 
-        if user is None:
-            raise credentials_exception
         return user
 
     async def decode_refresh_token(self, refresh_token: str):
@@ -195,12 +353,13 @@ class TokenManager:
         """
         try:
             payload = jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload['scope'] == 'refresh_token':
-                email = payload['sub']
-                return email
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid scope for token")
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+        if payload['scope'] != 'refresh_token':
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid scope for token")
+        if not await self.is_token_valid(payload):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+        return payload['sub']
 
     def create_email_token(self, data: dict):
         """
@@ -260,47 +419,48 @@ class TokenManager:
 
         return email
 
-    async def invalidate_token(self, token: str) -> None:
+    async def invalidate_token(self, payload: dict) -> None:
         """
-        Анулює токен, додаючи його до списку анульованих токенів.
+        Анулює токен, додаючи його jti до списку анульованих токенів до кінця терміну дії токена.
         """
-        self.invalid_tokens.add(token)
+        if payload.get("jti") is not None:
+            await self.revocation_list.revoke(payload["jti"], payload["exp"])
 
     async def logout_user(self,
             token: str = Depends(oauth2_scheme),
-            db: Session = Depends(get_db)
+            db: AsyncSession = Depends(get_db)
     ) -> None:
         try:
             payload = jwt.decode(token, self.SECRET_KEY, self.ALGORITHM)
             email = await self.token_check(payload, token_type='access_token')
-            print("Before invalidation:", self.invalid_tokens)
-            await self.invalidate_token(token)
-            print("After invalidation:", self.invalid_tokens)
         except:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
 
-        now = datetime.timestamp(datetime.now())
-        time_delta = payload['exp'] - now + 300
-        self.r.set(token, 'True')
-        self.r.expire(token, int(time_delta))
+        await self.invalidate_token(payload)
+        logger.info("token_revoked", jti=payload.get('jti'), email=email)
 
         user = await repository_users.get_user_by_email(email, db)
-        user.refresh_token = None
-        db.commit()
-        db.refresh(user)
+        await self.refresh_tokens.revoke_all(user, db)
 
-    async def clear_user_cash(self, user_email) -> None:
+    async def clear_user_cash(self, user_email, user_id: Optional[int] = None) -> None:
         """
-        The clear_user_cash function deletes the user's cash from the Redis database.
+        The clear_user_cash function deletes the user's cash from the Redis database
+        and tells all workers to drop the user from their in-process cache.
+        If user_id is given, the cached token version of the user is dropped as well.
             Args:
                 user_email (str): The email of the user whose cash is to be deleted.
 
         :param self: Represent the instance of the class
         :param user_email: Identify the user in the database
+        :param user_id: Optional[int]: Id of the user whose token version has changed
         :return: None
         :doc-author: Trelent
         """
-        self.r.delete(f"user:{user_email}")
+        self.user_cache.discard(user_email)
+        await self.r.delete(f"user:{user_email}")
+        await self.r.publish(USERS_CHANNEL, user_email)
+        if user_id is not None:
+            await self.token_versions.invalidate(user_id, self.r)
 
 
 class AuthService:
@@ -1,17 +1,19 @@
-import cloudinary.uploader
+import asyncio
+import functools
 import hashlib
-import io
-import qrcode
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+from src.conf import messages
 from src.conf.config import settings
 from src.database.models import Image
+from src.services.storage import storage
+
 
 class CloudImage:
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
+    storage = storage
 
     filters = {
         'basic': [
@@ -60,67 +62,146 @@ class CloudImage:
         :param r: Pass in the request object
         :return: A url for an image with a public_id
         """
-        src_url = cloudinary.CloudinaryImage(public_id).build_url(width=250, height=250, crop='fill', version=r.get('version'))
+        src_url = CloudImage.storage.url(public_id, r, width=250, height=250, crop='fill')
         return src_url
 
     @staticmethod
     def upload(file, public_id: str):
         """
         The upload function takes a file and public_id as arguments.
-            The function then uploads the file to cloudinary using the public_id provided.
+            The function then uploads the file to the storage backend using the public_id provided.
             If no public_id is provided, one will be generated for you.
 
         :param file: Specify the file to be uploaded
         :param public_id: str: Set the public id of the image
         :return: A dictionary with the following keys:
         """
-        r = cloudinary.uploader.upload(file, public_id=public_id, owerwrite=True)
+        r = CloudImage.storage.upload(file, public_id)
         return r
 
     @classmethod
-    def generate_name_image(cls, email: str, filename: str):
+    def generate_name_image(cls, email: str, content_hash: str):
+        """
+        The generate_name_image function builds the public id of an uploaded image from the email of the owner
+        and the hash of the content, so different files never overwrite each other.
+
+        :param email: str: Email of the owner
+        :param content_hash: str: sha256 of the file
+        :return: A string
+        """
         image_name = hashlib.sha256(email.encode('utf-8')).hexdigest()[:12]
-        image_sufix = hashlib.sha256(filename.encode('utf-8')).hexdigest()[:12]
+        image_sufix = content_hash[:24]
 
         return f'FRT-PHOTO-SHARE-IMAGES/{image_name}-{image_sufix}'
 
 
     @classmethod
     def image_upload(cls, file, public_id: str):
-        return cloudinary.uploader.upload(file, public_id=public_id, overwrite=True)
+        return cls.storage.upload(file, public_id)
 
 
     @classmethod
     def get_url_for_image(cls, public_id, r):
-        src_url = cloudinary.CloudinaryImage(public_id).build_url(version=r.get('version'))
+        src_url = cls.storage.url(public_id, r)
 
         return src_url
 
 
     @classmethod
     def transformation(cls, image: Image, type):
-        old_link = image.link
-        break_point = old_link.find('/upload/') + 8
-        image_name = old_link[break_point:]
-        new_link = cloudinary.CloudinaryImage(image_name).build_url(transformation=CloudImage.filters[type.value])
+        if not cls.storage.supports_transformation_url:
+            raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED,
+                                detail=messages.MSC501_TRANSFORMATION_NOT_SUPPORTED)
+        new_link = cls.storage.transformation_url(image.link, CloudImage.filters[type.value])
 
         return new_link
 
 
-    @classmethod
-    def get_qrcode(cls, image: Image):
-        qr_code = qrcode.QRCode(
-            error_correction=qrcode.constants.ERROR_CORRECT_M,
-            box_size=7,
-            border=4,
-        )
-        url = image.link
-        qr_code.add_data(url)
-        qr_code.make(fit=True)
-        img = qr_code.make_image(fill_color="black", back_color="white")
-        output = io.BytesIO()
-        img.save(output)
-        output.seek(0)
-        return output
+class UploadService:
+    """
+    Runs the blocking Cloudinary uploads in a dedicated thread pool, so they do not block the event loop
+    and do not take the default executor used by the rest of the application.
+    At most workers + queue_size uploads are in flight, further uploads are rejected with status code 503.
+    An upload that takes longer than timeout seconds is answered with status code 504.
+    """
+
+    def __init__(self, workers: int, queue_size: int, timeout: float):
+        self.workers = workers
+        self.max_pending = workers + queue_size
+        self.timeout = timeout
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    async def run(self, func, *args):
+        """
+        The run function calls func in the upload pool and waits for the result at most timeout seconds.
+        A timed out upload still counts as in flight until its thread finishes.
+
+        :param self: Represent the instance of the class
+        :param func: Blocking function that uploads the file
+        :param args: Arguments of func
+        :return: The result of func
+        """
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail=messages.MSC503_UPLOAD_QUEUE_FULL,
+                                headers={'Retry-After': '1'})
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='cloudinary-upload')
+
+        self.pending += 1
+        future = asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(func, *args))
+        future.add_done_callback(self._done)
+        try:
+            # shield keeps the timeout from cancelling the future, which could not stop the thread anyway
+            result = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=messages.MSC504_UPLOAD_TIMEOUT)
+        self.completed += 1
+        return result
+
+    def _done(self, future: asyncio.Future) -> None:
+        self.pending -= 1
+        if not future.cancelled():
+            # the result of a timed out upload is never awaited
+            future.exception()
+
+    def metrics(self) -> dict:
+        """
+        The metrics function returns the state of the upload pool.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with the pool metrics
+        """
+        return {
+            'workers': self.workers,
+            'in_flight': self.pending,
+            'queue_depth': max(self.pending - self.workers, 0),
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+        }
+
+    def shutdown(self) -> None:
+        """
+        The shutdown function stops the threads of the upload pool.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
 
 
+upload_service = UploadService(
+    settings.cloudinary_upload_workers,
+    settings.cloudinary_upload_queue_size,
+    settings.cloudinary_upload_timeout,
+)
@@ -0,0 +1,84 @@
+import base64
+import binascii
+import json
+
+from fastapi import HTTPException, status
+from sqlalchemy import Select, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+
+from src.conf import messages
+from src.schemas.images import CursorParams, SortDirection
+
+
+def encode_cursor(values: dict) -> str:
+    """
+    The encode_cursor function packs the sort key of the last returned row into an opaque token.
+    The client sends the token back to get the next page.
+
+    :param values: dict: Sort key values of the last row on the page
+    :return: A url-safe cursor string
+    """
+    data = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, keys: tuple) -> dict:
+    """
+    The decode_cursor function unpacks a token made by encode_cursor.
+    If the token is malformed or does not contain the expected keys, an HTTPException with status code 400 is raised.
+
+    :param cursor: str: Cursor from the request
+    :param keys: tuple: Names of the sort key values the cursor must contain
+    :return: A dictionary with the sort key values
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(data)
+        if not isinstance(values, dict) or any(not isinstance(values.get(key), int) for key in keys):
+            raise ValueError(cursor)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=messages.MSC400_INVALID_CURSOR)
+    return values
+
+
+async def paginate_by_cursor(
+        db: AsyncSession,
+        query: Select,
+        key: InstrumentedAttribute,
+        cursor_params: CursorParams,
+        sort_direction: SortDirection
+        ) -> dict:
+    """
+    The paginate_by_cursor function applies keyset pagination on a unique integer column to the query.
+    Instead of OFFSET it continues after the key stored in the cursor, so deep pages cost the same as the first one.
+    One extra row is fetched to find out whether the next page exists.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :param query: Select: Query to paginate
+    :param key: InstrumentedAttribute: Unique column the rows are ordered by, e.g. Image.id
+    :param cursor_params: CursorParams: Page size and the cursor of the previous page
+    :param sort_direction: SortDirection: Specify the sort direction of the rows
+    :return: A dict with the rows of the page and the cursor of the next page
+    """
+    if cursor_params.cursor:
+        last = decode_cursor(cursor_params.cursor, (key.key,))[key.key]
+        if sort_direction == SortDirection.asc:
+            query = query.filter(key > last)
+        else:
+            query = query.filter(key < last)
+
+    if sort_direction == SortDirection.asc:
+        query = query.order_by(key)
+    else:
+        query = query.order_by(desc(key))
+
+    result = await db.execute(query.limit(cursor_params.size + 1))
+    items = list(result.scalars().all())
+
+    next_cursor = None
+    if len(items) > cursor_params.size:
+        items = items[:cursor_params.size]
+        next_cursor = encode_cursor({key.key: getattr(items[-1], key.key)})
+
+    return {'items': items, 'next_cursor': next_cursor}
@@ -1,34 +1,16 @@
-import traceback
-from datetime import datetime
-from pathlib import Path
-
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+import redis.asyncio as redis
 from pydantic import EmailStr
 
 from src.conf import messages
-from src.conf.config import settings
 from src.services.auth import auth_service
-from src.services.asyncdevlogging import async_logging_to_file
-
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=settings.mail_from,
-    MAIL_PORT=settings.mail_port,
-    MAIL_SERVER=settings.mail_server,
-    MAIL_FROM_NAME=settings.mail_from_name,
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / "templates",
-)
+from src.services.asyncdevlogging import logger
+from src.services.outbox import email_outbox
 
 
 async def send_email(email: EmailStr, username: str, host: str):
     """
-    The send_email function sends an email to the user with a link to confirm their email address.
+    The send_email function puts an email with a link to confirm the email address into the outbox,
+    it is sent by the outbox worker.
         The function takes in three parameters:
             -email: EmailStr, the user's email address.
             -username: str, the username of the user who is registering for an account.  This will be used in a greeting message within the body of the email sent to them.
@@ -43,7 +25,8 @@ async def send_email(email: EmailStr, username: str, host: str):
         token_verification = auth_service.token_manager.create_email_token(
             {"sub": email}
         )
-        message = MessageSchema(
+        await email_outbox.enqueue(
+            template="email_template.html",
             subject="Confirm your email ",
             recipients=[email],
             template_body={
@@ -51,20 +34,15 @@ async def send_email(email: EmailStr, username: str, host: str):
                 "username": username,
                 "token": token_verification,
             },
-            subtype=MessageType.html,
-        )
-
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
-    except ConnectionErrors as err:
-        await async_logging_to_file(
-            f"\n500:\t{datetime.now()}\t{messages.MSC500_SENDING_EMAIL}: {err}\t{traceback.extract_stack(None, 2)[1][2]}"
         )
+    except redis.RedisError as err:
+        logger.error("email_enqueue_failed", detail=messages.MSC500_SENDING_EMAIL, email=email, error=str(err))
 
 
 async def send_new_password(email: EmailStr, username: str, host: str, password: str):
     """
-    The send_new_password function sends an email to the user with their new password.
+    The send_new_password function sends an email with the new password of the user at once.
+    The password must not be stored, so this email does not go through the outbox and is not retried.
         Args:
             email (str): The user's email address.
             username (str): The user's username.
@@ -77,28 +55,21 @@ async def send_new_password(email: EmailStr, username: str, host: str, password:
     :return: A string
     :doc-author: Trelent
     """
-    try:
-        message = MessageSchema(
-            subject=messages.PASSWORD_RESET_REQUEST,
-            recipients=[email],
-            template_body={
-                "host": host,
-                "username": username,
-                "new_password": password,
-            },
-            subtype=MessageType.html,
-        )
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="new_password.html")
-    except ConnectionErrors as err:
-        await async_logging_to_file(
-            f"\n500:\t{datetime.now()}\t{messages.MSC500_SENDING_EMAIL}: {err}\t{traceback.extract_stack(None, 2)[1][2]}"
-        )
+    await email_outbox.send_now(
+        template="new_password.html",
+        subject=messages.PASSWORD_RESET_REQUEST,
+        recipients=[email],
+        template_body={
+            "host": host,
+            "username": username,
+            "new_password": password,
+        },
+    )
 
 
 async def send_reset_password(email: EmailStr, username: str, host: str):
     """
-    The send_reset_password function is used to send a password reset email to the user.
+    The send_reset_password function puts a password reset email into the outbox.
         Args:
             email (str): The user's email address.
             username (str): The user's username.
@@ -114,7 +85,8 @@ async def send_reset_password(email: EmailStr, username: str, host: str):
         token_verification = auth_service.token_manager.create_email_token(
             {"sub": email}
         )
-        message = MessageSchema(
+        await email_outbox.enqueue(
+            template="password_reset.html",
             subject=messages.PASSWORD_RESET_REQUEST,
             recipients=[email],
             template_body={
@@ -122,11 +94,6 @@ async def send_reset_password(email: EmailStr, username: str, host: str):
                 "username": username,
                 "token": token_verification,
             },
-            subtype=MessageType.html,
-        )
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="password_reset.html")
-    except ConnectionErrors as err:
-        await async_logging_to_file(
-            f"\n500:\t{datetime.now()}\t{messages.MSC500_SENDING_EMAIL}: {err}\t{traceback.extract_stack(None, 2)[1][2]}"
         )
+    except redis.RedisError as err:
+        logger.error("email_enqueue_failed", detail=messages.MSC500_SENDING_EMAIL, email=email, error=str(err))
@@ -0,0 +1,312 @@
+import asyncio
+import json
+import time
+import uuid
+from email.message import EmailMessage
+from email.utils import formataddr
+from pathlib import Path
+from typing import List, Optional
+
+import aiosmtplib
+import redis.asyncio as redis
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from src.conf.config import settings
+from src.database.db import redis_client
+from src.services.asyncdevlogging import logger
+
+
+OUTBOX_KEY = 'email:outbox'
+DEAD_KEY = 'email:dead'
+
+# moves up to ARGV[2] messages due at ARGV[1] to ARGV[3], so a worker that dies while
+# sending does not lose them: they become due again when the lease runs out
+CLAIM_SCRIPT = """
+local items = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, item in ipairs(items) do
+    redis.call('ZADD', KEYS[1], ARGV[3], item)
+end
+return items
+"""
+
+templates = Environment(
+    loader=FileSystemLoader(Path(__file__).parent / "templates"),
+    autoescape=select_autoescape(['html']),
+)
+
+
+def render_message(message: dict) -> EmailMessage:
+    """
+    The render_message function builds the email from a message of the outbox.
+
+    :param message: dict: Message stored in the outbox
+    :return: An EmailMessage object
+    """
+    email = EmailMessage()
+    email['Subject'] = message['subject']
+    email['From'] = formataddr((settings.mail_from_name, settings.mail_from))
+    email['To'] = ', '.join(message['recipients'])
+    email.set_content(templates.get_template(message['template']).render(**message['template_body']), subtype='html')
+    return email
+
+
+class SMTPSender:
+    """
+    Sends emails through one SMTP connection that is kept open between batches
+    and reopened when the server closes it. Callers take turns on the connection.
+    """
+
+    def __init__(self, hostname: str, port: int, username: Optional[str] = None, password: Optional[str] = None,
+                 use_tls: bool = True, start_tls: Optional[bool] = False, validate_certs: bool = True):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.start_tls = start_tls
+        self.validate_certs = validate_certs
+        self.connections = 0
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+        self._lock = asyncio.Lock()
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        if self._smtp is None or not self._smtp.is_connected:
+            self._smtp = aiosmtplib.SMTP(hostname=self.hostname, port=self.port, username=self.username,
+                                         password=self.password, use_tls=self.use_tls, start_tls=self.start_tls,
+                                         validate_certs=self.validate_certs)
+            await self._smtp.connect()
+            self.connections += 1
+        return self._smtp
+
+    async def send(self, emails: List[EmailMessage]) -> List[Optional[Exception]]:
+        """
+        The send function sends the emails over the open connection.
+        An email the server rejects gets its error in the result, so the rest of the batch is still sent.
+        If the connection is lost, it is reopened once; if that fails too, the email and the rest of the batch
+        get the connection error, while the emails sent before keep their None.
+
+        :param self: Represent the instance of the class
+        :param emails: List[EmailMessage]: Emails to send
+        :return: A list with None for every sent email and the error for every failed one
+        """
+        results = []
+        async with self._lock:
+            for email in emails:
+                try:
+                    results.append(await self._send_one(email))
+                except (aiosmtplib.SMTPException, OSError) as err:
+                    self._smtp = None
+                    results += [err] * (len(emails) - len(results))
+                    break
+        return results
+
+    async def _send_one(self, email: EmailMessage) -> Optional[Exception]:
+        for attempt in range(2):
+            smtp = await self._connect()
+            try:
+                await smtp.send_message(email)
+                return None
+            except aiosmtplib.SMTPServerDisconnected:
+                self._smtp = None
+                if attempt:
+                    raise
+            except (aiosmtplib.SMTPResponseException, aiosmtplib.SMTPRecipientsRefused) as err:
+                return err
+
+    async def close(self) -> None:
+        """
+        The close function closes the SMTP connection.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        if self._smtp is not None and self._smtp.is_connected:
+            try:
+                await self._smtp.quit()
+            except aiosmtplib.SMTPException:
+                self._smtp.close()
+        self._smtp = None
+
+
+class EmailOutbox:
+    """
+    Emails waiting to be sent, kept in a Redis sorted set scored by the time they are due,
+    so they survive restarts of the application. A long-lived worker claims the due emails in batches,
+    sends them through one SMTP connection and retries failed ones with exponential backoff.
+    Emails that still fail after max_attempts go to the email:dead list, which keeps the last dead_max emails
+    and expires dead_ttl seconds after the last one was added.
+    Emails carrying secrets are sent at once with send_now and never stored.
+    """
+
+    def __init__(self, r: redis.Redis, sender: SMTPSender, batch_size: int, max_attempts: int,
+                 backoff: float, backoff_max: float, lease: float = 300, poll_interval: float = 1,
+                 dead_max: int = 1000, dead_ttl: int = 7 * 86400):
+        self.r = r
+        self.sender = sender
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.dead_max = dead_max
+        self.dead_ttl = dead_ttl
+        self.sent = 0
+        self.failed = 0
+        self._claim = None
+
+    async def enqueue(self, template: str, subject: str, recipients: List[str], template_body: dict) -> None:
+        """
+        The enqueue function stores an email in the outbox, it is sent by the worker.
+        The values are stored as they are, so emails with secrets go through send_now instead.
+
+        :param self: Represent the instance of the class
+        :param template: str: Name of the template in src/services/templates
+        :param subject: str: Subject of the email
+        :param recipients: List[str]: Email addresses of the recipients
+        :param template_body: dict: Values for the template
+        :return: None
+        """
+        now = time.time()
+        message = {'id': uuid.uuid4().hex, 'template': template, 'subject': subject, 'recipients': recipients,
+                   'template_body': template_body, 'attempts': 0, 'enqueued_at': now}
+        await self.r.zadd(OUTBOX_KEY, {json.dumps(message): now})
+
+    async def send_now(self, template: str, subject: str, recipients: List[str], template_body: dict) -> None:
+        """
+        The send_now function renders and sends an email at once, without storing it.
+        It is used for emails that carry secrets, such as a new password, which must not be kept in Redis.
+        Such an email is not retried: a failure is logged, without the values.
+
+        :param self: Represent the instance of the class
+        :param template: str: Name of the template in src/services/templates
+        :param subject: str: Subject of the email
+        :param recipients: List[str]: Email addresses of the recipients
+        :param template_body: dict: Values for the template
+        :return: None
+        """
+        email = render_message({'template': template, 'subject': subject, 'recipients': recipients,
+                                'template_body': template_body})
+        error, = await self.sender.send([email])
+        if error is not None:
+            self.failed += 1
+            logger.error("email_send_failed", template=template, recipients=recipients, error=str(error))
+        else:
+            self.sent += 1
+
+    async def claim(self) -> List[str]:
+        """
+        The claim function takes up to batch_size due emails and hides them from the other workers for lease seconds.
+
+        :param self: Represent the instance of the class
+        :return: A list of the claimed messages as stored in Redis
+        """
+        if self._claim is None:
+            self._claim = self.r.register_script(CLAIM_SCRIPT)
+        now = time.time()
+        return await self._claim(keys=[OUTBOX_KEY], args=[now, self.batch_size, now + self.lease])
+
+    async def process_batch(self) -> int:
+        """
+        The process_batch function sends one batch of due emails.
+        Sent emails are removed from the outbox, failed ones are rescheduled or moved to the dead list.
+        An email that cannot be rendered fails on its own, without holding up the rest of the batch.
+
+        :param self: Represent the instance of the class
+        :return: The number of claimed emails
+        """
+        items = await self.claim()
+        if not items:
+            return 0
+
+        messages = [json.loads(item) for item in items]
+        results, emails = [], []
+        for message in messages:
+            try:
+                emails.append(render_message(message))
+                results.append(None)
+            except Exception as err:
+                results.append(err)
+        sent = iter(await self.sender.send(emails))
+        results = [next(sent) if error is None else error for error in results]
+
+        async with self.r.pipeline(transaction=True) as pipe:
+            for item, message, error in zip(items, messages, results):
+                pipe.zrem(OUTBOX_KEY, item)
+                if error is None:
+                    self.sent += 1
+                    continue
+                self.failed += 1
+                message['attempts'] += 1
+                message['last_error'] = str(error)
+                if message['attempts'] >= self.max_attempts:
+                    pipe.rpush(DEAD_KEY, json.dumps(message))
+                    pipe.ltrim(DEAD_KEY, -self.dead_max, -1)
+                    pipe.expire(DEAD_KEY, self.dead_ttl)
+                else:
+                    delay = min(self.backoff * 2 ** (message['attempts'] - 1), self.backoff_max)
+                    pipe.zadd(OUTBOX_KEY, {json.dumps(message): time.time() + delay})
+            await pipe.execute()
+        return len(items)
+
+    async def run(self) -> None:
+        """
+        The run function is the worker loop. It runs for the lifetime of the application,
+        sending full batches back to back and polling the outbox every poll_interval seconds when it is idle.
+        Errors are logged and the loop backs off exponentially until a batch succeeds again.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        errors = 0
+        try:
+            while True:
+                try:
+                    claimed = await self.process_batch()
+                    errors = 0
+                    if claimed < self.batch_size:
+                        await asyncio.sleep(self.poll_interval)
+                except Exception as err:
+                    errors += 1
+                    logger.error("email_outbox_failed", error=repr(err), errors=errors)
+                    # claimed emails are retried by any worker once their lease runs out
+                    await asyncio.sleep(min(self.poll_interval * 2 ** errors, self.backoff_max))
+        finally:
+            await self.sender.close()
+
+    async def metrics(self) -> dict:
+        """
+        The metrics function returns the state of the outbox.
+        lag is how long, in seconds, the oldest due email has been waiting.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with the outbox metrics
+        """
+        now = time.time()
+        async with self.r.pipeline(transaction=False) as pipe:
+            pipe.zcard(OUTBOX_KEY)
+            pipe.zcount(OUTBOX_KEY, '-inf', now)
+            pipe.zrange(OUTBOX_KEY, 0, 0, withscores=True)
+            pipe.llen(DEAD_KEY)
+            queued, due, oldest, dead = await pipe.execute()
+        return {
+            'queued': queued,
+            'due': due,
+            'dead': dead,
+            'lag': max(now - oldest[0][1], 0.0) if oldest else 0.0,
+            'sent': self.sent,
+            'failed': self.failed,
+            'smtp_connections': self.sender.connections,
+        }
+
+
+email_outbox = EmailOutbox(
+    redis_client,
+    SMTPSender(settings.mail_server, settings.mail_port, settings.mail_username, settings.mail_password),
+    batch_size=settings.email_batch_size,
+    max_attempts=settings.email_max_attempts,
+    backoff=settings.email_retry_backoff,
+    backoff_max=settings.email_retry_backoff_max,
+    dead_max=settings.email_dead_max,
+    dead_ttl=settings.email_dead_ttl,
+)
@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+import io
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import qrcode
+import qrcode.image.svg
+import redis.asyncio as redis
+
+from src.conf.config import settings
+from src.database.db import redis_client
+from src.services.asyncdevlogging import logger
+
+
+MEDIA_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+
+def render_qrcode(link: str, fmt: str) -> bytes:
+    """
+    The render_qrcode function encodes the link as a QR code image.
+
+    :param link: str: Link of the image
+    :param fmt: str: png or svg
+    :return: The content of the QR code image
+    """
+    qr_code = qrcode.QRCode(
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        box_size=7,
+        border=4,
+        image_factory=qrcode.image.svg.SvgPathImage if fmt == 'svg' else None,
+    )
+    qr_code.add_data(link)
+    qr_code.make(fit=True)
+    if fmt == 'svg':
+        img = qr_code.make_image()
+    else:
+        img = qr_code.make_image(fill_color="black", back_color="white")
+    output = io.BytesIO()
+    img.save(output)
+    return output.getvalue()
+
+
+class QRCodeCache:
+    """
+    Rendered QR codes of image links. The QR code depends only on the link and the format,
+    so it is cached in a bounded in-process LRU in front of Redis, and the hash of the link and format
+    is also the ETag of the response. Cache misses are rendered in a thread pool.
+    """
+
+    def __init__(self, r: redis.Redis, maxsize: int, ttl: int):
+        self.r = r
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    @staticmethod
+    def etag(link: str, fmt: str) -> str:
+        """
+        The etag function returns the ETag of the QR code of the link in the given format.
+
+        :param link: str: Link of the image
+        :param fmt: str: png or svg
+        :return: A quoted ETag
+        """
+        digest = hashlib.sha256(f"{fmt}:{link}".encode('utf-8')).hexdigest()[:32]
+        return f'"{digest}"'
+
+    async def get(self, link: str, fmt: str) -> Tuple[bytes, str]:
+        """
+        The get function returns the QR code of the link, from the cache of this worker, from Redis
+        or rendered in a thread.
+
+        :param self: Represent the instance of the class
+        :param link: str: Link of the image
+        :param fmt: str: png or svg
+        :return: A tuple of the content and the ETag
+        """
+        etag = self.etag(link, fmt)
+        content = self._data.get(etag)
+        if content is not None:
+            self.hits += 1
+            self._data.move_to_end(etag)
+            return content, etag
+
+        key = f"qrcode:{etag[1:-1]}"
+        content = await self._redis_get(key)
+        if content is not None:
+            self.redis_hits += 1
+        else:
+            self.misses += 1
+            content = await asyncio.to_thread(render_qrcode, link, fmt)
+            await self._redis_set(key, content)
+        self._put(etag, content)
+        return content, etag
+
+    def _put(self, etag: str, content: bytes) -> None:
+        self._data[etag] = content
+        self._data.move_to_end(etag)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def _redis_get(self, key: str) -> Optional[bytes]:
+        try:
+            return await self.r.get(key)
+        except redis.RedisError as err:
+            logger.warning("redis_read_failed", key=key, error=str(err))
+            return None
+
+    async def _redis_set(self, key: str, content: bytes) -> None:
+        try:
+            await self.r.set(key, content, ex=self.ttl)
+        except redis.RedisError as err:
+            logger.warning("redis_save_failed", key=key, error=str(err))
+
+    def clear(self) -> None:
+        """
+        The clear function removes all QR codes from the cache of this worker and resets the counters.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        self._data.clear()
+        self.hits = self.redis_hits = self.misses = 0
+
+    def info(self) -> dict:
+        """
+        The info function returns the statistics of the cache.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with the cache statistics
+        """
+        return {'size': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits,
+                'redis_hits': self.redis_hits, 'misses': self.misses}
+
+
+qrcode_cache = QRCodeCache(redis_client, settings.qrcode_cache_size, settings.qrcode_cache_ttl)
@@ -0,0 +1,137 @@
+import time
+from abc import ABC, abstractmethod
+
+import redis.asyncio as redis
+from jose import jwt
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import User
+from src.repository import users as repository_users
+from src.services.asyncdevlogging import logger
+
+
+class RefreshTokenStore(ABC):
+    """
+    Storage of the refresh tokens issued to users.
+    A refresh token is accepted once: rotate replaces it with the new token, and presenting a token
+    that is not stored any more (e.g. a stolen token used after the owner refreshed it)
+    revokes all refresh tokens of the user.
+    """
+
+    @abstractmethod
+    async def add(self, user: User, token: str, db: AsyncSession) -> None:
+        """
+        The add function stores a refresh token issued to the user at login.
+
+        :param self: Represent the instance of the class
+        :param user: User: Owner of the token
+        :param token: str: New refresh token
+        :param db: AsyncSession: Pass the database session to the function
+        :return: None
+        """
+
+    @abstractmethod
+    async def rotate(self, user: User, old_token: str, new_token: str, db: AsyncSession) -> bool:
+        """
+        The rotate function replaces old_token with new_token.
+        If old_token is not stored, all refresh tokens of the user are revoked.
+
+        :param self: Represent the instance of the class
+        :param user: User: Owner of the tokens
+        :param old_token: str: Refresh token sent by the client
+        :param new_token: str: Refresh token issued instead of it
+        :param db: AsyncSession: Pass the database session to the function
+        :return: True if old_token was stored and has been replaced
+        """
+
+    @abstractmethod
+    async def revoke_all(self, user: User, db: AsyncSession) -> None:
+        """
+        The revoke_all function removes all refresh tokens of the user, on every device.
+
+        :param self: Represent the instance of the class
+        :param user: User: Owner of the tokens
+        :param db: AsyncSession: Pass the database session to the function
+        :return: None
+        """
+
+
+class DatabaseRefreshTokenStore(RefreshTokenStore):
+    """
+    Keeps one refresh token per user in the users.refresh_token column.
+    """
+
+    async def add(self, user: User, token: str, db: AsyncSession) -> None:
+        await repository_users.update_token(user, token, db)
+
+    async def rotate(self, user: User, old_token: str, new_token: str, db: AsyncSession) -> bool:
+        if user.refresh_token != old_token:
+            await self.revoke_all(user, db)
+            return False
+        await repository_users.update_token(user, new_token, db)
+        return True
+
+    async def revoke_all(self, user: User, db: AsyncSession) -> None:
+        if user.refresh_token is not None:
+            await repository_users.update_token(user, None, db)
+
+
+class RedisRefreshTokenStore(RefreshTokenStore):
+    """
+    Keeps the refresh tokens of each user in a Redis hash of jti -> expiration time, one field per device.
+    The hash expires together with the newest token, expired fields are pruned when a token is added.
+    Tokens still stored in users.refresh_token (issued before the move to Redis) are accepted once
+    and moved to Redis on rotation. If Redis is not available, the database store is used.
+    """
+
+    def __init__(self, r: redis.Redis, fallback: DatabaseRefreshTokenStore):
+        self.r = r
+        self.fallback = fallback
+
+    @staticmethod
+    def _key(user: User) -> str:
+        return f"refresh_tokens:{user.id}"
+
+    async def _store(self, user: User, token: str) -> None:
+        claims = jwt.get_unverified_claims(token)
+        key = self._key(user)
+        now = time.time()
+        tokens = await self.r.hgetall(key)
+        expired = [jti for jti, exp in tokens.items() if float(exp) <= now]
+        async with self.r.pipeline(transaction=True) as pipe:
+            if expired:
+                pipe.hdel(key, *expired)
+            pipe.hset(key, claims['jti'], claims['exp'])
+            pipe.expireat(key, int(claims['exp']))
+            await pipe.execute()
+
+    async def add(self, user: User, token: str, db: AsyncSession) -> None:
+        try:
+            await self._store(user, token)
+        except redis.RedisError as err:
+            logger.warning("redis_save_failed", key=self._key(user), error=str(err))
+            await self.fallback.add(user, token, db)
+
+    async def rotate(self, user: User, old_token: str, new_token: str, db: AsyncSession) -> bool:
+        jti = jwt.get_unverified_claims(old_token).get('jti')
+        try:
+            # HDEL removes the field once, so of two concurrent refreshes with the same token only one succeeds
+            stored = jti is not None and await self.r.hdel(self._key(user), jti)
+        except redis.RedisError as err:
+            logger.warning("redis_read_failed", key=self._key(user), error=str(err))
+            return await self.fallback.rotate(user, old_token, new_token, db)
+
+        if not stored:
+            if user.refresh_token != old_token:
+                await self.revoke_all(user, db)
+                return False
+            await repository_users.update_token(user, None, db)
+        await self.add(user, new_token, db)
+        return True
+
+    async def revoke_all(self, user: User, db: AsyncSession) -> None:
+        try:
+            await self.r.delete(self._key(user))
+        except redis.RedisError as err:
+            logger.warning("redis_delete_failed", key=self._key(user), error=str(err))
+        await self.fallback.revoke_all(user, db)
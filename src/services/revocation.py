@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import math
+import time
+from typing import List
+
+import redis.asyncio as redis
+
+from src.conf.config import settings
+from src.database.db import redis_client
+from src.services.asyncdevlogging import logger
+
+
+REVOKED_CHANNEL = 'tokens:revoked'
+REVOKED_PREFIX = 'revoked:'
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter of strings. It never gives a false negative,
+    false positives happen with about error_rate probability while it holds at most capacity items.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        """
+        The add function sets the bits of the item.
+
+        :param self: Represent the instance of the class
+        :param item: str: Item to add
+        :return: None
+        """
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def clear(self) -> None:
+        """
+        The clear function removes all items from the filter.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        self._bits = bytearray(len(self._bits))
+        self.count = 0
+
+
+class RevocationList:
+    """
+    Revoked token ids (jti) shared by all workers. Every revoked jti is a Redis key that expires
+    together with the token. Each worker keeps a Bloom filter of the revoked jtis, filled from Redis
+    and from the jtis the other workers publish, so a token that was never revoked is accepted
+    without a Redis call. Only jtis found in the filter are confirmed in Redis.
+    A Bloom filter cannot forget items, so it is rebuilt from the live Redis keys every rebuild_interval seconds,
+    which drops the jtis of expired tokens and keeps the filter within its capacity.
+    """
+
+    def __init__(self, r: redis.Redis, capacity: int, error_rate: float, rebuild_interval: float = 3600):
+        self.r = r
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.rebuild_interval = rebuild_interval
+        self.synced = True
+        self.redis_checks = 0
+        self.rebuilds = 0
+        self._building: List[BloomFilter] = []
+
+    def _add(self, jti: str) -> None:
+        self.bloom.add(jti)
+        # rebuilds scanning Redis right now must not miss the jtis revoked meanwhile
+        for bloom in self._building:
+            bloom.add(jti)
+
+    async def revoke(self, jti: str, exp: float) -> None:
+        """
+        The revoke function stores the jti in Redis until the token expires and tells the other workers about it.
+
+        :param self: Represent the instance of the class
+        :param jti: str: Id of the token
+        :param exp: float: Expiration time of the token as a timestamp
+        :return: None
+        """
+        self._add(jti)
+        ttl = int(exp - time.time()) + 1
+        if ttl <= 0:
+            return
+        await self.r.set(f"{REVOKED_PREFIX}{jti}", 1, ex=ttl)
+        await self.r.publish(REVOKED_CHANNEL, jti)
+
+    async def is_revoked(self, jti: str) -> bool:
+        """
+        The is_revoked function checks if the token with the given jti has been revoked.
+        While the filter is being rebuilt after a lost connection every check goes to Redis.
+
+        :param self: Represent the instance of the class
+        :param jti: str: Id of the token
+        :return: True if the token has been revoked
+        """
+        if self.synced and jti not in self.bloom:
+            return False
+        self.redis_checks += 1
+        return bool(await self.r.exists(f"{REVOKED_PREFIX}{jti}"))
+
+    async def warm(self) -> None:
+        """
+        The warm function builds a new Bloom filter from the jtis revoked in Redis and replaces the current one.
+        The current filter keeps answering while Redis is scanned. Several rebuilds may run at once
+        (the periodic one and the one after a resubscribe), each fills its own filter.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        bloom = BloomFilter(self.bloom.capacity, self.bloom.error_rate)
+        self._building.append(bloom)
+        try:
+            async for key in self.r.scan_iter(match=f"{REVOKED_PREFIX}*", count=1000):
+                key = key.decode() if isinstance(key, bytes) else key
+                bloom.add(key[len(REVOKED_PREFIX):])
+        finally:
+            self._building.remove(bloom)
+        self.bloom = bloom
+        self.rebuilds += 1
+
+    async def rebuild(self) -> None:
+        """
+        The rebuild function rebuilds the Bloom filter from Redis every rebuild_interval seconds.
+        It runs for the lifetime of the application; a failed rebuild keeps the current filter until the next one.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        while True:
+            await asyncio.sleep(self.rebuild_interval)
+            try:
+                await self.warm()
+            except redis.RedisError as err:
+                logger.warning("revocation_rebuild_failed", error=str(err))
+
+    async def listen(self) -> None:
+        """
+        The listen function subscribes to the jtis revoked by the other workers and adds them to the Bloom filter.
+        It runs for the lifetime of the application. After (re)subscribing, the filter is rebuilt from Redis,
+        because revocations may have been missed.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        while True:
+            self.synced = False
+            try:
+                async with self.r.pubsub() as pubsub:
+                    await pubsub.subscribe(REVOKED_CHANNEL)
+                    await self.warm()
+                    self.synced = True
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            jti = message['data']
+                            self._add(jti.decode() if isinstance(jti, bytes) else jti)
+            except redis.RedisError as err:
+                logger.warning("redis_subscribe_failed", channel=REVOKED_CHANNEL, error=str(err))
+                await asyncio.sleep(1)
+
+
+revocation_list = RevocationList(redis_client, settings.revocation_bloom_capacity, settings.revocation_bloom_error_rate,
+                                 settings.revocation_bloom_rebuild_interval)
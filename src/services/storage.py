@@ -0,0 +1,276 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import urllib.request
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import BinaryIO, List, Optional, Tuple
+
+import cloudinary
+import cloudinary.uploader
+from starlette.staticfiles import StaticFiles
+
+from src.conf.config import settings
+
+
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# leading bytes of the image formats accepted by the upload routes
+SIGNATURES = (
+    (b'\xff\xd8\xff', '.jpg', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', '.png', 'image/png'),
+    (b'GIF87a', '.gif', 'image/gif'),
+    (b'GIF89a', '.gif', 'image/gif'),
+    (b'BM', '.bmp', 'image/bmp'),
+)
+
+
+def sniff_type(head: bytes) -> Tuple[str, str]:
+    """
+    The sniff_type function finds the extension and media type of a file from its first bytes.
+
+    :param head: bytes: First bytes of the file
+    :return: A tuple of the extension and the media type
+    """
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return '.webp', 'image/webp'
+    for signature, extension, media_type in SIGNATURES:
+        if head.startswith(signature):
+            return extension, media_type
+    return '.bin', 'application/octet-stream'
+
+
+def hash_file(file: BinaryIO) -> str:
+    """
+    The hash_file function computes the sha256 of the file, reading it in chunks.
+    The file is rewound afterwards, so it can be uploaded.
+
+    :param file: BinaryIO: Seekable file to hash
+    :return: The sha256 hex digest
+    """
+    digest = hashlib.sha256()
+    file.seek(0)
+    while chunk := file.read(CHUNK_SIZE):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def content_key(file: BinaryIO) -> Tuple[str, str, str]:
+    """
+    The content_key function builds the content-addressed key of the file, e.g. 3f/a2/3fa2...e1.jpg.
+    The file is rewound afterwards, so it can be uploaded.
+
+    :param file: BinaryIO: Seekable file to hash
+    :return: A tuple of the key, the sha256 hex digest and the media type
+    """
+    sha = hash_file(file)
+    head = file.read(16)
+    file.seek(0)
+    extension, media_type = sniff_type(head)
+    return f'{sha[:2]}/{sha[2:4]}/{sha}{extension}', sha, media_type
+
+
+class StorageBackend(ABC):
+    """
+    Storage of the uploaded images. The methods block, they are called through the upload thread pool.
+    Backends that transform images on delivery set supports_transformation_url and implement transformation_url.
+    """
+
+    supports_transformation_url = False
+
+    @abstractmethod
+    def upload(self, file: BinaryIO, public_id: str) -> dict:
+        """
+        The upload function stores the file.
+
+        :param self: Represent the instance of the class
+        :param file: BinaryIO: File to store
+        :param public_id: str: Name of the image, backends with content-addressed keys only report it back
+        :return: A dictionary describing the stored file, passed to url
+        """
+
+    @abstractmethod
+    def url(self, public_id: str, r: dict, **options) -> str:
+        """
+        The url function builds the public link of a stored file.
+
+        :param self: Represent the instance of the class
+        :param public_id: str: Name of the image
+        :param r: dict: Result of upload
+        :param options: Resize options (width, height, crop), used by backends that resize on delivery
+        :return: The url of the file
+        """
+
+    @abstractmethod
+    def read(self, link: str) -> bytes:
+        """
+        The read function returns the content of a stored image by its link.
+
+        :param self: Represent the instance of the class
+        :param link: str: Link of the image, as returned by url
+        :return: The bytes of the image
+        """
+
+    def transformation_url(self, link: str, transformation: List[dict]) -> str:
+        """
+        The transformation_url function builds the link of a transformed copy of the image.
+        Only backends with supports_transformation_url implement it.
+
+        :param self: Represent the instance of the class
+        :param link: str: Link of the original image
+        :param transformation: List[dict]: Steps of the transformation
+        :return: The url of the transformed image
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not transform images on delivery")
+
+
+class CloudinaryStorage(StorageBackend):
+    """
+    Stores images in Cloudinary under their public id, resizing and transformations are done by Cloudinary urls.
+    """
+
+    supports_transformation_url = True
+
+    def __init__(self, cloud_name: str, api_key: str, api_secret: str, timeout: float):
+        cloudinary.config(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret, secure=True)
+        self.timeout = timeout
+
+    def upload(self, file: BinaryIO, public_id: str) -> dict:
+        return cloudinary.uploader.upload(file, public_id=public_id, overwrite=True, timeout=self.timeout)
+
+    def url(self, public_id: str, r: dict, **options) -> str:
+        return cloudinary.CloudinaryImage(public_id).build_url(version=r.get('version'), **options)
+
+    def read(self, link: str) -> bytes:
+        with urllib.request.urlopen(link, timeout=self.timeout) as response:
+            return response.read()
+
+    def transformation_url(self, link: str, transformation: List[dict]) -> str:
+        image_name = link[link.find('/upload/') + 8:]
+        return cloudinary.CloudinaryImage(image_name).build_url(transformation=transformation)
+
+
+class LocalStorage(StorageBackend):
+    """
+    Stores images on the local disk under content-addressed paths, so the same bytes are stored once
+    and a stored file never changes. The files are served by the static route mounted at base_url.
+    """
+
+    def __init__(self, root: str, base_url: str):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip('/')
+
+    def upload(self, file: BinaryIO, public_id: str) -> dict:
+        key, sha, media_type = content_key(file)
+        path = self.root / key
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # written to a temporary file first, so a half-written file is never served
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.upload-')
+            try:
+                with os.fdopen(fd, 'wb') as tmp:
+                    shutil.copyfileobj(file, tmp, CHUNK_SIZE)
+                os.replace(tmp_path, path)
+            except BaseException:
+                Path(tmp_path).unlink(missing_ok=True)
+                raise
+        return {'public_id': public_id, 'key': key, 'version': sha, 'content_type': media_type}
+
+    def url(self, public_id: str, r: dict, **options) -> str:
+        return f"{self.base_url}/{r['key']}"
+
+    def read(self, link: str) -> bytes:
+        if not link.startswith(f"{self.base_url}/"):
+            raise FileNotFoundError(link)
+        path = self.path(link[len(self.base_url) + 1:]).resolve()
+        if self.root.resolve() not in path.parents:
+            raise FileNotFoundError(link)
+        return path.read_bytes()
+
+    def path(self, key: str) -> Path:
+        """
+        The path function returns where the file with the given key is stored.
+
+        :param self: Represent the instance of the class
+        :param key: str: Key of the file
+        :return: The path of the file
+        """
+        return self.root / key
+
+
+class S3Storage(StorageBackend):
+    """
+    Stores images in an S3-compatible bucket (AWS S3, MinIO) under content-addressed keys.
+    Needs boto3, installed with the s3 extra.
+    """
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, access_key: Optional[str] = None,
+                 secret_key: Optional[str] = None, region: Optional[str] = None, public_url: Optional[str] = None):
+        import boto3
+        from botocore.exceptions import ClientError
+
+        self.client = boto3.client('s3', endpoint_url=endpoint_url, aws_access_key_id=access_key,
+                                   aws_secret_access_key=secret_key, region_name=region)
+        self.ClientError = ClientError
+        self.bucket = bucket
+        if public_url is None:
+            public_url = f"{endpoint_url.rstrip('/')}/{bucket}" if endpoint_url else f"https://{bucket}.s3.amazonaws.com"
+        self.public_url = public_url.rstrip('/')
+
+    def _exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except self.ClientError as err:
+            if err.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+        return True
+
+    def upload(self, file: BinaryIO, public_id: str) -> dict:
+        key, sha, media_type = content_key(file)
+        if not self._exists(key):
+            self.client.upload_fileobj(file, self.bucket, key, ExtraArgs={
+                'ContentType': media_type,
+                'CacheControl': IMMUTABLE_CACHE_CONTROL,
+            })
+        return {'public_id': public_id, 'key': key, 'version': sha, 'content_type': media_type}
+
+    def url(self, public_id: str, r: dict, **options) -> str:
+        return f"{self.public_url}/{r['key']}"
+
+    def read(self, link: str) -> bytes:
+        if not link.startswith(f"{self.public_url}/"):
+            raise FileNotFoundError(link)
+        return self.client.get_object(Bucket=self.bucket, Key=link[len(self.public_url) + 1:])['Body'].read()
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    StaticFiles for content-addressed files: a file at a path never changes, so clients may cache it forever.
+    """
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+def get_storage() -> StorageBackend:
+    """
+    The get_storage function creates the storage backend chosen by settings.storage_backend.
+
+    :return: A StorageBackend object
+    """
+    if settings.storage_backend == 'local':
+        return LocalStorage(settings.storage_local_root, settings.storage_public_url or settings.storage_local_url)
+    if settings.storage_backend == 's3':
+        return S3Storage(settings.s3_bucket, settings.s3_endpoint_url, settings.s3_access_key,
+                         settings.s3_secret_key, settings.s3_region, settings.storage_public_url)
+    return CloudinaryStorage(settings.cloudinary_name, settings.cloudinary_api_key,
+                             settings.cloudinary_api_secret, settings.cloudinary_upload_timeout)
+
+
+storage = get_storage()
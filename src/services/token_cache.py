@@ -0,0 +1,85 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from src.conf.config import settings
+
+
+class DecodedTokenCache:
+    """
+    Bounded LRU cache of the verified claims of access tokens, kept by one worker.
+    Entries are keyed by a hash of the token, so raw tokens are not kept in memory,
+    and live until the token expires. Only the signature check and JSON parsing are skipped:
+    callers still check scope, revocation and token version on every request.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode('utf-8'), digest_size=16).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        """
+        The get function returns the claims of the token, if it has been verified before and has not expired.
+
+        :param self: Represent the instance of the class
+        :param token: str: Encoded token
+        :return: The claims of the token or None
+        """
+        key = self._key(token)
+        payload = self._data.get(key)
+        if payload is None or payload['exp'] <= time.time():
+            if payload is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(key)
+        return payload
+
+    def put(self, token: str, payload: dict) -> None:
+        """
+        The put function caches the verified claims of the token and evicts the least recently used entry if the cache is full.
+        Tokens without an expiration time are not cached.
+
+        :param self: Represent the instance of the class
+        :param token: str: Encoded token
+        :param payload: dict: Claims returned by jwt.decode
+        :return: None
+        """
+        if not isinstance(payload.get('exp'), (int, float)):
+            return
+        key = self._key(token)
+        self._data[key] = payload
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        The clear function removes all tokens from the cache and resets the counters.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self) -> dict:
+        """
+        The info function returns the hit and miss counters of the cache.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with hits, misses, size and maxsize
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data), 'maxsize': self.maxsize}
+
+
+decoded_token_cache = DecodedTokenCache(settings.decoded_token_cache_size)
@@ -0,0 +1,235 @@
+import asyncio
+import io
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException, status
+from PIL import Image as PILImage, ImageDraw, ImageEnhance, ImageFilter, ImageOps
+
+from src.conf import messages
+from src.conf.config import settings
+from src.database.models import Image, TransformationsType
+from src.services.cloud_image import CloudImage, upload_service
+
+
+SEPIA_MATRIX = (
+    0.393, 0.769, 0.189, 0,
+    0.349, 0.686, 0.168, 0,
+    0.272, 0.534, 0.131, 0,
+)
+
+
+def _basic(img: PILImage.Image) -> PILImage.Image:
+    img = ImageOps.fit(img.convert('RGB'), (500, 500))
+    img = ImageOps.autocontrast(img)
+    return ImageEnhance.Brightness(img).enhance(1.1)
+
+
+def _avatar(img: PILImage.Image) -> PILImage.Image:
+    img = ImageOps.fit(img.convert('RGB'), (500, 500), centering=(0.5, 0.4))
+    mask = PILImage.new('L', img.size, 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, 499, 499), fill=255)
+    ImageDraw.Draw(img).ellipse((0, 0, 499, 499), outline=(165, 42, 42), width=5)
+    img.putalpha(mask)
+    return img
+
+
+def _black_white(img: PILImage.Image) -> PILImage.Image:
+    return ImageOps.grayscale(img)
+
+
+def _sepia(img: PILImage.Image) -> PILImage.Image:
+    return img.convert('RGB').convert('RGB', SEPIA_MATRIX)
+
+
+def _cartoonify(img: PILImage.Image) -> PILImage.Image:
+    img = img.convert('RGB').filter(ImageFilter.SMOOTH_MORE)
+    edges = ImageOps.invert(img.convert('L').filter(ImageFilter.FIND_EDGES)).point(lambda p: 255 if p > 200 else 0)
+    return PILImage.composite(ImageOps.posterize(img, 3), PILImage.new('RGB', img.size), edges)
+
+
+def _oil_paint(img: PILImage.Image) -> PILImage.Image:
+    return img.convert('RGB').filter(ImageFilter.ModeFilter(7))
+
+
+def _vector(img: PILImage.Image) -> PILImage.Image:
+    return img.convert('RGB').filter(ImageFilter.SMOOTH_MORE).quantize(colors=5).convert('RGB')
+
+
+def _outline(img: PILImage.Image) -> PILImage.Image:
+    img = img.convert('RGB')
+    img = img.resize((200, max(1, round(img.height * 200 / img.width))))
+    img = ImageOps.expand(img, border=15, fill='yellow')
+    return ImageOps.expand(img, border=20, fill='blue')
+
+
+EFFECTS = {
+    TransformationsType.basic.value: _basic,
+    TransformationsType.avatar.value: _avatar,
+    TransformationsType.black_white.value: _black_white,
+    TransformationsType.sepia.value: _sepia,
+    TransformationsType.cartoonify.value: _cartoonify,
+    TransformationsType.oil_paint.value: _oil_paint,
+    TransformationsType.vector.value: _vector,
+    TransformationsType.outline.value: _outline,
+}
+
+
+def apply_transformation(data: bytes, type_value: str) -> bytes:
+    """
+    The apply_transformation function applies a TransformationsType effect to an image with Pillow.
+    It runs in a worker process. Images with transparency are saved as PNG, the others as JPEG.
+
+    :param data: bytes: Content of the source image
+    :param type_value: str: Value of the TransformationsType
+    :return: The content of the transformed image
+    """
+    with PILImage.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img)
+        result = EFFECTS[type_value](img)
+    output = io.BytesIO()
+    if result.mode in ('RGBA', 'LA', 'P'):
+        result.save(output, format='PNG', optimize=True)
+    else:
+        result.save(output, format='JPEG', quality=90)
+    return output.getvalue()
+
+
+class TransformationEngine(ABC):
+    """
+    Creates the transformed copies of images for /api/images/transaction/{image_id}/{type}.
+    """
+
+    @abstractmethod
+    async def transform(self, image: Image, type: TransformationsType) -> str:
+        """
+        The transform function returns the link of the image transformed with the given type.
+
+        :param self: Represent the instance of the class
+        :param image: Image: Source image
+        :param type: TransformationsType: Transformation to apply
+        :return: The link of the transformed image
+        """
+
+
+class CloudinaryEngine(TransformationEngine):
+    """
+    Builds Cloudinary urls that transform the image on delivery.
+    """
+
+    async def transform(self, image: Image, type: TransformationsType) -> str:
+        return CloudImage.transformation(image, type)
+
+
+class LocalEngine(TransformationEngine):
+    """
+    Transforms images with Pillow in a process pool and stores the result through the storage backend.
+    At most workers + queue_size transformations are in flight, further ones are rejected with status code 503.
+    A transformation that takes longer than timeout seconds is answered with status code 504,
+    it still counts as in flight until its worker process finishes it.
+    """
+
+    executor: Optional[ProcessPoolExecutor] = None
+
+    def __init__(self, workers: int, queue_size: int, timeout: float):
+        self.workers = workers
+        self.max_pending = workers + queue_size
+        self.timeout = timeout
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.time_total = 0.0
+
+    async def transform(self, image: Image, type: TransformationsType) -> str:
+        if type.value not in EFFECTS:
+            raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED,
+                                detail=messages.MSC501_TRANSFORMATION_NOT_SUPPORTED)
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail=messages.MSC503_TRANSFORMATION_QUEUE_FULL,
+                                headers={'Retry-After': '1'})
+
+        if LocalEngine.executor is None:
+            LocalEngine.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        self.pending += 1
+        started = time.monotonic()
+        try:
+            try:
+                source = await upload_service.run(CloudImage.storage.read, image.link)
+            except OSError:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.MSC404_IMAGE_NOT_FOUND)
+            future = asyncio.get_running_loop().run_in_executor(LocalEngine.executor, apply_transformation,
+                                                                 source, type.value)
+        except BaseException:
+            self.pending -= 1
+            raise
+        # from here on the slot is released when the worker process is done, not when the request gives up
+        future.add_done_callback(self._done)
+        try:
+            # shield keeps the timeout from cancelling the future, which could not stop the worker process anyway
+            data = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                                detail=messages.MSC504_TRANSFORMATION_TIMEOUT)
+
+        public_id = f"FRT-PHOTO-SHARE-IMAGES/transformed-{image.id}-{type.value}"
+        r = await upload_service.run(CloudImage.image_upload, io.BytesIO(data), public_id)
+        self.completed += 1
+        self.time_total += time.monotonic() - started
+        return CloudImage.get_url_for_image(public_id, r)
+
+    def _done(self, future: asyncio.Future) -> None:
+        self.pending -= 1
+        if not future.cancelled():
+            # the result of a timed out transformation is never awaited
+            future.exception()
+
+    def metrics(self) -> dict:
+        """
+        The metrics function returns the state of the transformation pool, times are in seconds.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with the pool metrics
+        """
+        return {
+            'workers': self.workers,
+            'in_flight': self.pending,
+            'queue_depth': max(self.pending - self.workers, 0),
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+            'time_avg': self.time_total / self.completed if self.completed else 0.0,
+        }
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """
+        The shutdown function stops the worker processes of the transformation pool.
+
+        :param cls: Represent the class
+        :return: None
+        """
+        if cls.executor is not None:
+            cls.executor.shutdown(cancel_futures=True)
+            cls.executor = None
+
+
+def get_engine() -> TransformationEngine:
+    """
+    The get_engine function creates the transformation engine chosen by settings.transformation_engine.
+
+    :return: A TransformationEngine object
+    """
+    if settings.transformation_engine == 'local':
+        return LocalEngine(settings.transformation_workers, settings.transformation_queue_size,
+                           settings.transformation_timeout)
+    return CloudinaryEngine()
+
+
+transformation_engine = get_engine()
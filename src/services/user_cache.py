@@ -0,0 +1,343 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import redis.asyncio as redis
+
+from src.conf.config import settings
+from src.database.models import User, Role
+from src.services.asyncdevlogging import logger
+
+
+CACHE_SCHEMA_VERSION = 2
+CACHE_TTL = 900
+
+USERS_CHANNEL = 'users:invalidate'
+TOKEN_VERSIONS_CHANNEL = 'token_versions:invalidate'
+
+
+def password_version(password_hash: str) -> str:
+    """
+    The password_version function returns a short fingerprint of the stored password hash.
+    It changes whenever the password is changed, without putting the hash itself into the cache.
+
+    :param password_hash: str: Hashed password from the database
+    :return: A string of 12 hex digits
+    """
+    return hashlib.sha256(password_hash.encode('utf-8')).hexdigest()[:12]
+
+
+class CachedUser:
+    """
+    Snapshot of the fields of a User that authentication and authorization need.
+    It is stored in Redis as a compact JSON array instead of a pickled ORM instance.
+    """
+    __slots__ = ('id', 'email', 'role', 'status_active', 'confirmed', 'password_version', 'token_version')
+
+    def __init__(self, id: int, email: str, role: Role, status_active: bool, confirmed: bool,
+                 password_version: str, token_version: int = 0):
+        self.id = id
+        self.email = email
+        self.role = role
+        self.status_active = status_active
+        self.confirmed = confirmed
+        self.password_version = password_version
+        self.token_version = token_version
+
+    def __eq__(self, other):
+        if not isinstance(other, CachedUser):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"CachedUser(id={self.id}, email={self.email!r}, role={self.role})"
+
+    @classmethod
+    def from_user(cls, user: User) -> 'CachedUser':
+        """
+        The from_user function takes the snapshot of a user loaded from the database.
+
+        :param user: User: User from the database
+        :return: A CachedUser object
+        """
+        return cls(
+            id=user.id,
+            email=user.email,
+            role=user.role,
+            status_active=bool(user.status_active),
+            confirmed=bool(user.confirmed),
+            password_version=password_version(user.password),
+            token_version=user.token_version or 0,
+        )
+
+    def dumps(self) -> bytes:
+        """
+        The dumps function serializes the snapshot, the first element is the schema version.
+
+        :param self: Represent the instance of the class
+        :return: Bytes to store in Redis
+        """
+        return json.dumps(
+            [CACHE_SCHEMA_VERSION, self.id, self.email, self.role.value if self.role else None,
+             self.status_active, self.confirmed, self.password_version, self.token_version],
+            separators=(',', ':'),
+        ).encode('utf-8')
+
+    @classmethod
+    def loads(cls, data: bytes) -> Optional['CachedUser']:
+        """
+        The loads function restores a snapshot made by dumps.
+        Entries of another schema version or in an unknown format (e.g. pickled users
+        written by older releases) give None, so the caller treats them as a cache miss.
+
+        :param data: bytes: Value from Redis
+        :return: A CachedUser object or None
+        """
+        try:
+            values = json.loads(data)
+            if not isinstance(values, list) or values[0] != CACHE_SCHEMA_VERSION:
+                return None
+            _, user_id, email, role, status_active, confirmed, version, token_version = values
+            return cls(user_id, email, Role(role) if role else None, status_active, confirmed, version, token_version)
+        except (ValueError, TypeError, IndexError):
+            return None
+
+
+class TokenClaims:
+    """
+    The id, email and role of the user taken from a verified access token.
+    It is used instead of the user when the token version in the token is still the current one.
+    """
+    __slots__ = ('id', 'email', 'role', 'token_version')
+
+    def __init__(self, id: int, email: str, role: Role, token_version: int):
+        self.id = id
+        self.email = email
+        self.role = role
+        self.token_version = token_version
+
+    def __repr__(self):
+        return f"TokenClaims(id={self.id}, email={self.email!r}, role={self.role})"
+
+
+class LocalUserCache:
+    """
+    Bounded LRU cache of email -> CachedUser kept by one worker in front of the Redis tier.
+    Changes of a user are broadcast to all workers through Redis pub/sub; entries also expire
+    after ttl seconds, so a missed message delays a ban or role change by at most ttl.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, email: str) -> Optional[CachedUser]:
+        """
+        The get function returns the cached user with the given email, if it has not expired, and counts the hit or miss.
+
+        :param self: Represent the instance of the class
+        :param email: str: Email of the user
+        :return: A CachedUser object or None
+        """
+        entry = self._data.get(email)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[email]
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(email)
+        return entry[1]
+
+    def put(self, user: CachedUser) -> None:
+        """
+        The put function caches the user for ttl seconds and evicts the least recently used entry if the cache is full.
+
+        :param self: Represent the instance of the class
+        :param user: CachedUser: Snapshot of the user
+        :return: None
+        """
+        self._data[user.email] = (time.monotonic() + self.ttl, user)
+        self._data.move_to_end(user.email)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def discard(self, email: str) -> None:
+        """
+        The discard function removes the user from the cache of this worker.
+
+        :param self: Represent the instance of the class
+        :param email: str: Email of the user
+        :return: None
+        """
+        self._data.pop(email, None)
+
+    def clear(self) -> None:
+        """
+        The clear function removes all users from the cache and resets the counters.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self) -> dict:
+        """
+        The info function returns the hit and miss counters of the cache.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with hits, misses, size, maxsize and ttl
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data),
+                'maxsize': self.maxsize, 'ttl': self.ttl}
+
+    async def listen(self, r: redis.Redis) -> None:
+        """
+        The listen function subscribes to the user changes published by the workers and drops the users from the cache.
+        It runs for the lifetime of the application. If the connection is lost the cache is cleared,
+        because changes may have been missed, and the subscription is restored.
+
+        :param self: Represent the instance of the class
+        :param r: redis.Redis: Redis connection
+        :return: None
+        """
+        while True:
+            try:
+                async with r.pubsub() as pubsub:
+                    await pubsub.subscribe(USERS_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            email = message['data']
+                            self.discard(email.decode() if isinstance(email, bytes) else email)
+            except redis.RedisError as err:
+                logger.warning("redis_subscribe_failed", channel=USERS_CHANNEL, error=str(err))
+                self._data.clear()
+                await asyncio.sleep(1)
+
+
+class TokenVersionCache:
+    """
+    Current token version of each user: in-process LRU entries with a TTL in front of Redis keys.
+    A bump of the version deletes the Redis key and is broadcast to all workers through Redis pub/sub,
+    so tokens issued before the bump stop matching; a missed message is bounded by ttl.
+    Versions are stored from the user snapshot loaded from Redis or the database, and only if no other worker
+    stored one first, so a stale snapshot cannot overwrite a newer version; never bumped here.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def _get_local(self, user_id: int) -> Optional[int]:
+        entry = self._data.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[user_id]
+            return None
+        self._data.move_to_end(user_id)
+        return entry[1]
+
+    def _put_local(self, user_id: int, version: int) -> None:
+        self._data[user_id] = (time.monotonic() + self.ttl, version)
+        self._data.move_to_end(user_id)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def get(self, user_id: int, r: redis.Redis) -> Optional[int]:
+        """
+        The get function returns the current token version of the user from this worker or from Redis.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the user
+        :param r: redis.Redis: Redis connection
+        :return: The token version or None if it is not known
+        """
+        version = self._get_local(user_id)
+        if version is None:
+            value = await r.get(f"token_version:{user_id}")
+            if value is None:
+                self.misses += 1
+                return None
+            version = int(value)
+            self._put_local(user_id, version)
+        self.hits += 1
+        return version
+
+    async def put(self, user_id: int, version: int, r: redis.Redis) -> bool:
+        """
+        The put function stores the token version of a user snapshot just loaded from Redis or the database.
+        The Redis key is written with SET NX, so an existing version is never overwritten. It expires together
+        with the snapshot it was read from, so a version read before a concurrent bump lives no longer
+        than the stale snapshot itself.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the user
+        :param version: int: Token version of the user
+        :param r: redis.Redis: Redis connection
+        :return: True if the version was stored
+        """
+        stored = await r.set(f"token_version:{user_id}", version, ex=CACHE_TTL, nx=True)
+        if stored:
+            self._put_local(user_id, version)
+        return bool(stored)
+
+    async def invalidate(self, user_id: int, r: redis.Redis) -> None:
+        """
+        The invalidate function forgets the token version of the user in Redis and in all workers.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the user
+        :param r: redis.Redis: Redis connection
+        :return: None
+        """
+        self._data.pop(user_id, None)
+        await r.delete(f"token_version:{user_id}")
+        await r.publish(TOKEN_VERSIONS_CHANNEL, user_id)
+
+    def clear(self) -> None:
+        """
+        The clear function removes all versions from this worker and resets the counters.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    async def listen(self, r: redis.Redis) -> None:
+        """
+        The listen function subscribes to the version bumps published by the workers and drops the versions.
+        It runs for the lifetime of the application. If the connection is lost the versions are cleared,
+        because bumps may have been missed, and the subscription is restored.
+
+        :param self: Represent the instance of the class
+        :param r: redis.Redis: Redis connection
+        :return: None
+        """
+        while True:
+            try:
+                async with r.pubsub() as pubsub:
+                    await pubsub.subscribe(TOKEN_VERSIONS_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            self._data.pop(int(message['data']), None)
+            except redis.RedisError as err:
+                logger.warning("redis_subscribe_failed", channel=TOKEN_VERSIONS_CHANNEL, error=str(err))
+                self._data.clear()
+                await asyncio.sleep(1)
+
+
+user_cache = LocalUserCache(settings.user_cache_size, settings.user_cache_ttl)
+token_versions = TokenVersionCache(settings.user_cache_size, settings.user_cache_ttl)
@@ -3,11 +3,15 @@ from typing import Optional
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from unittest.mock import AsyncMock
 from main import app
 from src.database.models import Base, Role, User
-from src.database.db import get_db
+from src.database.db import get_db, get_async_url
+from src.repository.tags import tag_cache
+from src.services.user_cache import user_cache, token_versions
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 
@@ -16,6 +20,10 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# TestClient may run every request in its own event loop, so async connections are not pooled
+async_engine = create_async_engine(get_async_url(SQLALCHEMY_DATABASE_URL), poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 
 @pytest.fixture(scope='module')
 def session():
@@ -23,6 +31,8 @@ def session():
 
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    # tag ids from the previous test module are not valid for the new database
+    tag_cache.clear()
 
     db = TestingSessionLocal()
     try:
@@ -31,13 +41,18 @@ def session():
         db.close()
 
 
+@pytest.fixture(autouse=True)
+def clear_user_cache():
+    # tests change users directly in the database, so users cached by earlier tests may be stale
+    user_cache.clear()
+    token_versions.clear()
+
+
 @pytest.fixture(scope="module")
 def client(session):
-    def override_get_db():
-        try:
-            yield session
-        finally:
-            session.close()
+    async def override_get_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
     app.dependency_overrides[get_db] = override_get_db
     yield TestClient(app)
 
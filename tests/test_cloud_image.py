@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import unittest
+
+from fastapi import HTTPException
+
+from src.services.cloud_image import UploadService
+
+
+class TestUploadService(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.service = UploadService(workers=1, queue_size=1, timeout=0.5)
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.service.shutdown()
+
+    def blocking_upload(self, file, public_id):
+        self.release.wait(5)
+        return {'public_id': public_id, 'thread': threading.current_thread().name}
+
+    async def test_upload_runs_in_pool(self):
+        self.release.set()
+
+        result = await self.service.run(self.blocking_upload, b'file', 'public_id')
+
+        self.assertEqual(result['public_id'], 'public_id')
+        self.assertTrue(result['thread'].startswith('cloudinary-upload'))
+        self.assertEqual(self.service.metrics()['completed'], 1)
+
+    async def test_event_loop_is_not_blocked(self):
+        upload = asyncio.create_task(self.service.run(self.blocking_upload, b'file', 'public_id'))
+        await asyncio.sleep(0.05)
+
+        self.assertFalse(upload.done())
+        self.assertEqual(self.service.metrics()['in_flight'], 1)
+        self.release.set()
+        await upload
+        self.assertEqual(self.service.metrics()['in_flight'], 0)
+
+    async def test_timeout(self):
+        self.service.timeout = 0.05
+
+        with self.assertRaises(HTTPException) as err:
+            await self.service.run(self.blocking_upload, b'file', 'public_id')
+
+        self.assertEqual(err.exception.status_code, 504)
+        self.assertEqual(self.service.metrics()['in_flight'], 1)
+        self.release.set()
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.service.metrics()['in_flight'], 0)
+
+    async def test_full_pool_is_rejected(self):
+        uploads = [asyncio.create_task(self.service.run(self.blocking_upload, b'file', str(i))) for i in range(2)]
+        await asyncio.sleep(0.05)
+
+        with self.assertRaises(HTTPException) as err:
+            await self.service.run(self.blocking_upload, b'file', 'public_id')
+
+        self.assertEqual(err.exception.status_code, 503)
+        self.release.set()
+        await asyncio.gather(*uploads)
+        self.assertEqual(self.service.metrics()['rejected'], 1)
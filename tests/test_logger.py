@@ -0,0 +1,75 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from src.services.asyncdevlogging import QueueLogger
+
+
+class TestQueueLogger(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'logs' / 'app.log'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_logger(self, **kwargs):
+        options = dict(max_bytes=1024 * 1024, rotate_interval=3600, backup_count=2, queue_size=1000,
+                       batch_size=100, flush_interval=0.05)
+        options.update(kwargs)
+        return QueueLogger(str(self.path), **options)
+
+    def read_records(self, path=None):
+        return [json.loads(line) for line in (path or self.path).read_text().splitlines()]
+
+    def test_records_are_json_lines(self):
+        logger = self.make_logger()
+
+        logger.info('signup', email='user@example.com')
+        logger.error('redis_read_failed', error='timeout')
+        logger.close()
+
+        records = self.read_records()
+        self.assertEqual([record['event'] for record in records], ['signup', 'redis_read_failed'])
+        self.assertEqual(records[0]['level'], 'info')
+        self.assertEqual(records[0]['email'], 'user@example.com')
+        self.assertIn('ts', records[0])
+        self.assertEqual(logger.info_stats()['written'], 2)
+
+    def test_level_threshold_and_sampling(self):
+        logger = self.make_logger(level='info', sample_rates={'info': 0.5})
+
+        logger.debug('ignored')
+        with patch('src.services.asyncdevlogging.random.random', side_effect=[0.2, 0.7]):
+            logger.info('kept')
+            logger.info('sampled out')
+        logger.warning('not sampled')
+        logger.close()
+
+        records = self.read_records()
+        self.assertEqual([record['event'] for record in records], ['kept', 'not sampled'])
+        self.assertEqual(records[0]['sample_rate'], 0.5)
+        self.assertEqual(logger.sampled_out, 1)
+
+    def test_rotation_by_size(self):
+        logger = self.make_logger(max_bytes=200, batch_size=1)
+
+        for i in range(20):
+            logger.info('event', number=i, padding='x' * 50)
+        logger.close()
+
+        backups = sorted(self.path.parent.glob('app.log.*'))
+        self.assertEqual([path.name for path in backups], ['app.log.1', 'app.log.2'])
+        self.assertEqual(self.read_records()[-1]['number'], 19)
+
+    def test_full_queue_drops_records(self):
+        logger = self.make_logger(queue_size=1)
+
+        with patch.object(logger, '_start'):
+            logger.info('first')
+            logger.info('second')
+
+        self.assertEqual(logger.dropped, 1)
@@ -8,3 +8,9 @@ def test_read_main():
     response = client.get("/")
     assert response.status_code == 200
 
+
+
+def test_password_hashing_metrics():
+    response = client.get("/api/healthchecker/password_hashing")
+    assert response.status_code == 200
+    assert {'queue_depth', 'wait_time_avg', 'wait_time_max'} <= response.json().keys()
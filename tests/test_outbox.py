@@ -0,0 +1,185 @@
+import asyncio
+import json
+import socket
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+import aiosmtplib
+from aiosmtpd.controller import Controller
+from aiosmtpd.handlers import Sink
+
+from src.services.outbox import DEAD_KEY, OUTBOX_KEY, EmailOutbox, SMTPSender, render_message
+
+
+class RecordingHandler(Sink):
+
+    def __init__(self):
+        self.envelopes = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.envelopes.append(envelope)
+        return '250 OK'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def outbox_message(attempts=0):
+    return json.dumps({'id': 'id', 'template': 'email_template.html', 'subject': 'Confirm your email ',
+                       'recipients': ['user@example.com'], 'attempts': attempts, 'enqueued_at': time.time(),
+                       'template_body': {'host': 'http://localhost/', 'username': 'user', 'token': 'token'}})
+
+
+class TestSMTPSender(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.handler = RecordingHandler()
+        self.controller = Controller(self.handler, hostname='127.0.0.1', port=free_port())
+        self.controller.start()
+        self.sender = SMTPSender('127.0.0.1', self.controller.port, use_tls=False, start_tls=False)
+
+    async def asyncTearDown(self):
+        await self.sender.close()
+
+    def tearDown(self):
+        self.controller.stop()
+
+    async def test_batch_is_sent_over_one_connection(self):
+        emails = [render_message(json.loads(outbox_message())) for _ in range(3)]
+
+        results = await self.sender.send(emails)
+        results += await self.sender.send(emails[:1])
+
+        self.assertEqual(results, [None] * 4)
+        self.assertEqual(len(self.handler.envelopes), 4)
+        self.assertEqual(self.sender.connections, 1)
+        self.assertEqual(self.handler.envelopes[0].rcpt_tos, ['user@example.com'])
+        self.assertIn(b'/api/auth/confirmed_email/token', self.handler.envelopes[0].content)
+
+    async def test_reconnects_after_disconnect(self):
+        email = render_message(json.loads(outbox_message()))
+        await self.sender.send([email])
+        self.sender._smtp.close()
+
+        self.assertEqual(await self.sender.send([email]), [None])
+        self.assertEqual(self.sender.connections, 2)
+
+    async def test_lost_connection_fails_only_the_rest_of_the_batch(self):
+        emails = [render_message(json.loads(outbox_message())) for _ in range(3)]
+        disconnected = aiosmtplib.SMTPServerDisconnected('lost')
+        smtp = AsyncMock()
+        smtp.send_message.side_effect = [None, disconnected, disconnected]
+        self.sender._connect = AsyncMock(return_value=smtp)
+
+        results = await self.sender.send(emails)
+
+        self.assertEqual(results, [None, disconnected, disconnected])
+        self.assertEqual(smtp.send_message.await_count, 3)
+
+
+class TestEmailOutbox(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.pipe = MagicMock()
+        self.pipe.execute = AsyncMock()
+        self.r = MagicMock()
+        self.r.zadd = AsyncMock()
+        self.r.pipeline.return_value.__aenter__.return_value = self.pipe
+        self.claim = AsyncMock()
+        self.r.register_script.return_value = self.claim
+        self.sender = AsyncMock()
+        self.sender.connections = 1
+        self.outbox = EmailOutbox(self.r, self.sender, batch_size=10, max_attempts=3, backoff=30, backoff_max=3600)
+
+    async def test_enqueue(self):
+        await self.outbox.enqueue('email_template.html', 'Subject', ['user@example.com'], {'username': 'user'})
+
+        key, mapping = self.r.zadd.await_args.args
+        message = json.loads(next(iter(mapping)))
+        self.assertEqual(key, OUTBOX_KEY)
+        self.assertEqual(message['recipients'], ['user@example.com'])
+        self.assertEqual(message['attempts'], 0)
+
+    async def test_sent_emails_are_removed(self):
+        item = outbox_message()
+        self.claim.return_value = [item]
+        self.sender.send.return_value = [None]
+
+        self.assertEqual(await self.outbox.process_batch(), 1)
+
+        self.pipe.zrem.assert_called_once_with(OUTBOX_KEY, item)
+        self.pipe.zadd.assert_not_called()
+        self.assertEqual(self.outbox.sent, 1)
+
+    async def test_failed_email_is_retried_with_backoff(self):
+        item = outbox_message(attempts=1)
+        self.claim.return_value = [item]
+        self.sender.send.return_value = [OSError('connection refused')]
+
+        before = time.time()
+        await self.outbox.process_batch()
+
+        self.pipe.zrem.assert_called_once_with(OUTBOX_KEY, item)
+        key, mapping = self.pipe.zadd.call_args.args
+        (retry, due), = mapping.items()
+        self.assertEqual(json.loads(retry)['attempts'], 2)
+        self.assertGreaterEqual(due, before + 60)
+        self.assertEqual(self.outbox.failed, 1)
+
+    async def test_partial_failure_reschedules_only_failed_emails(self):
+        sent, failed = outbox_message(), outbox_message(attempts=1)
+        self.claim.return_value = [sent, failed]
+        self.sender.send.return_value = [None, OSError('connection lost')]
+
+        await self.outbox.process_batch()
+
+        self.assertEqual(self.pipe.zrem.call_count, 2)
+        (retry, _), = self.pipe.zadd.call_args.args[1].items()
+        self.assertEqual(json.loads(retry)['attempts'], 2)
+        self.assertEqual((self.outbox.sent, self.outbox.failed), (1, 1))
+
+    async def test_run_keeps_looping_after_errors(self):
+        self.outbox.poll_interval = 0
+        self.claim.side_effect = [RuntimeError('boom'), asyncio.CancelledError()]
+
+        with self.assertRaises(asyncio.CancelledError):
+            await self.outbox.run()
+
+        self.assertEqual(self.claim.await_count, 2)
+        self.sender.close.assert_awaited_once()
+
+    async def test_email_goes_to_dead_list_after_max_attempts(self):
+        self.claim.return_value = [outbox_message(attempts=2)]
+        self.sender.send.return_value = [OSError('rejected')]
+
+        await self.outbox.process_batch()
+
+        self.pipe.zadd.assert_not_called()
+        key, dead = self.pipe.rpush.call_args.args
+        self.assertEqual(key, DEAD_KEY)
+        self.assertEqual(json.loads(dead)['attempts'], 3)
+        self.pipe.ltrim.assert_called_once_with(DEAD_KEY, -self.outbox.dead_max, -1)
+        self.pipe.expire.assert_called_once_with(DEAD_KEY, self.outbox.dead_ttl)
+
+    async def test_send_now_does_not_store_the_email(self):
+        self.sender.send.return_value = [None]
+
+        await self.outbox.send_now('new_password.html', 'Subject', ['user@example.com'],
+                                   {'host': 'http://localhost/', 'username': 'user', 'new_password': 'secret'})
+
+        self.r.zadd.assert_not_awaited()
+        email, = self.sender.send.await_args.args[0]
+        self.assertIn('secret', email.get_content())
+        self.assertEqual(self.outbox.sent, 1)
+
+    async def test_metrics_report_lag(self):
+        self.pipe.execute.return_value = [3, 2, [(b'message', time.time() - 5)], 1]
+
+        metrics = await self.outbox.metrics()
+
+        self.assertEqual((metrics['queued'], metrics['due'], metrics['dead']), (3, 2, 1))
+        self.assertGreaterEqual(metrics['lag'], 5)
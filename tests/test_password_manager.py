@@ -0,0 +1,42 @@
+import unittest
+
+from fastapi import HTTPException, status
+
+from src.conf import messages
+from src.services.auth import PasswordManager
+
+
+class TestPasswordManagerPool(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.password_manager = PasswordManager()
+
+    @classmethod
+    def tearDownClass(cls):
+        PasswordManager.shutdown()
+
+    async def test_hash_and_verify(self):
+        hashed = await self.password_manager.get_password_hash_async('Qwerty@1')
+
+        self.assertTrue(await self.password_manager.verify_password_async('Qwerty@1', hashed))
+        self.assertFalse(await self.password_manager.verify_password_async('wrong', hashed))
+        self.assertTrue(self.password_manager.verify_password('Qwerty@1', hashed))
+
+        metrics = self.password_manager.metrics()
+        self.assertEqual(metrics['completed'], 3)
+        self.assertEqual(metrics['in_flight'], 0)
+        self.assertGreaterEqual(metrics['wait_time_max'], 0.0)
+
+    async def test_queue_full(self):
+        self.password_manager.max_pending = 0
+
+        with self.assertRaises(HTTPException) as exc_info:
+            await self.password_manager.get_password_hash_async('Qwerty@1')
+
+        self.assertEqual(exc_info.exception.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(exc_info.exception.detail, messages.MSC503_PASSWORD_QUEUE_FULL)
+        self.assertEqual(self.password_manager.metrics()['rejected'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from src.services.qrcode_cache import QRCodeCache, render_qrcode
+
+
+class TestQRCodeCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.r = AsyncMock()
+        self.r.get.return_value = None
+        self.cache = QRCodeCache(self.r, maxsize=2, ttl=60)
+
+    def test_render(self):
+        self.assertTrue(render_qrcode('https://example.com/image.jpg', 'png').startswith(b'\x89PNG'))
+        self.assertIn(b'<svg', render_qrcode('https://example.com/image.jpg', 'svg'))
+
+    def test_etag_depends_on_link_and_format(self):
+        etag = QRCodeCache.etag('https://example.com/1.jpg', 'png')
+
+        self.assertEqual(etag, QRCodeCache.etag('https://example.com/1.jpg', 'png'))
+        self.assertNotEqual(etag, QRCodeCache.etag('https://example.com/1.jpg', 'svg'))
+        self.assertNotEqual(etag, QRCodeCache.etag('https://example.com/2.jpg', 'png'))
+        self.assertTrue(etag.startswith('"') and etag.endswith('"'))
+
+    async def test_miss_is_rendered_once(self):
+        with patch('src.services.qrcode_cache.render_qrcode', return_value=b'png') as render_mock:
+            first = await self.cache.get('https://example.com/1.jpg', 'png')
+            second = await self.cache.get('https://example.com/1.jpg', 'png')
+
+        render_mock.assert_called_once_with('https://example.com/1.jpg', 'png')
+        self.assertEqual(first, second)
+        self.r.set.assert_awaited_once_with(f"qrcode:{first[1][1:-1]}", b'png', ex=60)
+        self.assertEqual(self.cache.info()['hits'], 1)
+        self.assertEqual(self.cache.info()['misses'], 1)
+
+    async def test_redis_hit_is_not_rendered(self):
+        self.r.get.return_value = b'cached'
+
+        with patch('src.services.qrcode_cache.render_qrcode') as render_mock:
+            content, _ = await self.cache.get('https://example.com/1.jpg', 'svg')
+
+        render_mock.assert_not_called()
+        self.assertEqual(content, b'cached')
+        self.assertEqual(self.cache.info()['redis_hits'], 1)
@@ -0,0 +1,87 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+import redis.asyncio as redis
+from jose import jwt
+
+from src.database.models import User
+from src.services.auth import auth_service
+from src.services.refresh_tokens import DatabaseRefreshTokenStore, RedisRefreshTokenStore
+
+
+class TestRedisRefreshTokenStore(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.user = User(id=5, email='refresh@example.com', refresh_token=None)
+        self.session = AsyncMock()
+
+        self.pipe = MagicMock()
+        self.pipe.execute = AsyncMock()
+        pipeline = MagicMock()
+        pipeline.__aenter__ = AsyncMock(return_value=self.pipe)
+        pipeline.__aexit__ = AsyncMock(return_value=False)
+        self.r = AsyncMock()
+        self.r.pipeline = MagicMock(return_value=pipeline)
+        self.r.hgetall.return_value = {}
+        self.store = RedisRefreshTokenStore(self.r, DatabaseRefreshTokenStore())
+
+        self.token = await auth_service.token_manager.create_refresh_token(data={'sub': self.user.email})
+        self.new_token = await auth_service.token_manager.create_refresh_token(data={'sub': self.user.email})
+
+    async def test_add(self):
+        await self.store.add(self.user, self.token, self.session)
+
+        claims = jwt.get_unverified_claims(self.token)
+        self.pipe.hset.assert_called_once_with('refresh_tokens:5', claims['jti'], claims['exp'])
+        self.pipe.expireat.assert_called_once_with('refresh_tokens:5', claims['exp'])
+        self.assertIsNone(self.user.refresh_token)
+        self.session.commit.assert_not_awaited()
+
+    async def test_expired_tokens_are_pruned(self):
+        self.r.hgetall.return_value = {b'old': b'1', b'current': b'99999999999'}
+
+        await self.store.add(self.user, self.token, self.session)
+
+        self.pipe.hdel.assert_called_once_with('refresh_tokens:5', b'old')
+
+    async def test_rotate(self):
+        self.r.hdel.return_value = 1
+
+        self.assertTrue(await self.store.rotate(self.user, self.token, self.new_token, self.session))
+
+        self.r.hdel.assert_awaited_once_with('refresh_tokens:5', jwt.get_unverified_claims(self.token)['jti'])
+        self.pipe.hset.assert_called_once_with('refresh_tokens:5', jwt.get_unverified_claims(self.new_token)['jti'],
+                                               jwt.get_unverified_claims(self.new_token)['exp'])
+        self.r.delete.assert_not_awaited()
+
+    async def test_reused_token_revokes_all(self):
+        self.r.hdel.return_value = 0
+        self.user.refresh_token = 'another device'
+
+        self.assertFalse(await self.store.rotate(self.user, self.token, self.new_token, self.session))
+
+        self.r.delete.assert_awaited_once_with('refresh_tokens:5')
+        self.assertIsNone(self.user.refresh_token)
+        self.pipe.hset.assert_not_called()
+
+    async def test_token_from_database_is_moved_to_redis(self):
+        self.r.hdel.return_value = 0
+        self.user.refresh_token = self.token
+
+        self.assertTrue(await self.store.rotate(self.user, self.token, self.new_token, self.session))
+
+        self.assertIsNone(self.user.refresh_token)
+        self.pipe.hset.assert_called_once()
+
+    async def test_database_fallback(self):
+        self.r.hgetall.side_effect = redis.ConnectionError('down')
+        self.r.hdel.side_effect = redis.ConnectionError('down')
+
+        await self.store.add(self.user, self.token, self.session)
+        self.assertEqual(self.user.refresh_token, self.token)
+
+        self.assertTrue(await self.store.rotate(self.user, self.token, self.new_token, self.session))
+        self.assertEqual(self.user.refresh_token, self.new_token)
+
+        self.assertFalse(await self.store.rotate(self.user, self.token, self.new_token, self.session))
+        self.assertIsNone(self.user.refresh_token)
@@ -0,0 +1,113 @@
+import re
+import unittest
+
+from fastapi_pagination import Params
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, Comment, Image, Role, Tag, User
+from src.repository import comments as repository_comments
+from src.repository import images as repository_images
+from src.repository import profile as repository_profile
+from src.repository import ratings as repository_ratings
+from src.repository import users as repository_users
+from src.schemas.images import CursorParams, SortDirection
+from src.services.cursor import encode_cursor
+
+
+class TestRepositoryIndexes(unittest.IsolatedAsyncioTestCase):
+    """
+    Runs repository functions against SQLite, captures the SELECT statements they issue
+    and checks with EXPLAIN QUERY PLAN that the filtered tables are searched by index.
+    """
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine('sqlite+aiosqlite://', poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        self.session = AsyncSession(self.engine, expire_on_commit=False)
+        self.user = User(id=1, username='user', email='user@example.com', password='password', avatar='avatar',
+                         role=Role.user)
+        self.tag = Tag(id=1, name='tag')
+        self.session.add_all([
+            self.user,
+            self.tag,
+            Image(id=1, description='image', link='link', user_id=1, tags=[self.tag]),
+            Comment(id=1, comment='comment', user_id=1, image_id=1),
+        ])
+        await self.session.commit()
+
+        self.statements = []
+        event.listen(self.engine.sync_engine, 'before_cursor_execute', self.capture)
+
+    async def asyncTearDown(self):
+        if event.contains(self.engine.sync_engine, 'before_cursor_execute', self.capture):
+            event.remove(self.engine.sync_engine, 'before_cursor_execute', self.capture)
+        await self.session.close()
+        await self.engine.dispose()
+
+    def capture(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            self.statements.append((statement, parameters))
+
+    async def query_plans(self):
+        event.remove(self.engine.sync_engine, 'before_cursor_execute', self.capture)
+        plans = []
+        async with self.engine.connect() as conn:
+            for statement, parameters in self.statements:
+                result = await conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)
+                plans.append([row[3] for row in result])
+        return plans
+
+    async def assertSearchedByIndex(self, table, index):
+        plans = await self.query_plans()
+        self.assertTrue(plans, 'no SELECT statements were issued')
+        details = [detail for plan in plans for detail in plan]
+        self.assertTrue(
+            any(re.match(rf'SEARCH {table}(_\d+)? USING (COVERING )?INDEX {index}\b', detail) for detail in details),
+            details,
+        )
+        self.assertFalse(any(re.match(rf'SCAN {table}(_\d+)?\b', detail) for detail in details), details)
+
+    async def test_get_comments_by_image(self):
+        await repository_comments.get_comments_by_image(1, SortDirection.desc, CursorParams(size=10), self.session)
+        await self.assertSearchedByIndex('comments', 'ix_comments_image_id_id')
+
+    async def test_get_comments_by_image_next_page(self):
+        cursor_params = CursorParams(size=10, cursor=encode_cursor({'id': 2}))
+        await repository_comments.get_comments_by_image(1, SortDirection.desc, cursor_params, self.session)
+        await self.assertSearchedByIndex('comments', 'ix_comments_image_id_id')
+
+    async def test_get_images_by_user(self):
+        await repository_images.get_images_by_user(self.session, self.user, Params(page=1, size=10), SortDirection.desc)
+        await self.assertSearchedByIndex('images', 'ix_images_user_id_id')
+
+    async def test_get_images_by_tag(self):
+        await repository_images.get_images_by_tag(self.tag, SortDirection.desc, self.session)
+        await self.assertSearchedByIndex('image_m2m_tag', 'ix_image_m2m_tag_tag_id_image_id')
+
+    async def test_image_tags_loading(self):
+        await repository_images.get_image(1, self.user, self.session)
+        await self.assertSearchedByIndex('image_m2m_tag', 'ix_image_m2m_tag_image_id_tag_id')
+
+    async def test_read_profile_comments_count(self):
+        await repository_profile.read_profile(self.user, self.session)
+        await self.assertSearchedByIndex('comments', 'ix_comments_user_id')
+
+    async def test_read_profile_images_count(self):
+        await repository_profile.read_profile(self.user, self.session)
+        await self.assertSearchedByIndex('images', 'ix_images_user_id_id')
+
+    async def test_get_user_by_username(self):
+        await repository_users.get_user_by_username('user', self.session)
+        await self.assertSearchedByIndex('users', 'ix_users_username')
+
+    async def test_get_ratings(self):
+        await repository_ratings.get_ratings(1, self.session)
+        await self.assertSearchedByIndex('ratings', 'ix_ratings_image_id')
+
+
+if __name__ == '__main__':
+    unittest.main()
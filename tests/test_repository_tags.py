@@ -0,0 +1,120 @@
+import unittest
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, Tag
+from src.repository.tags import TagCache, get_or_create_tags, get_tag_by_name, tag_cache
+
+
+class TestGetOrCreateTags(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine('sqlite+aiosqlite://', poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        self.session = AsyncSession(self.engine, expire_on_commit=False)
+        self.session.add(Tag(id=1, name='old'))
+        await self.session.commit()
+
+        tag_cache.clear()
+        self.statements = []
+        event.listen(self.engine.sync_engine, 'before_cursor_execute', self.capture)
+
+    async def asyncTearDown(self):
+        event.remove(self.engine.sync_engine, 'before_cursor_execute', self.capture)
+        await self.session.close()
+        await self.engine.dispose()
+
+    def capture(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    async def test_new_and_existing_tags(self):
+        tags = await get_or_create_tags(['new', 'old', 'new', 'other'], self.session)
+
+        self.assertEqual([tag.name for tag in tags], ['new', 'old', 'other'])
+        self.assertEqual(tags[1].id, 1)
+        self.assertEqual(len(self.statements), 2)
+        self.assertIn('ON CONFLICT', self.statements[0])
+
+    async def test_all_tags_new(self):
+        tags = await get_or_create_tags(['a', 'b'], self.session)
+
+        self.assertEqual([tag.name for tag in tags], ['a', 'b'])
+        self.assertEqual(len(self.statements), 1)
+
+    async def test_tags_are_not_committed(self):
+        await get_or_create_tags(['new'], self.session)
+        await self.session.rollback()
+
+        result = await self.session.execute(select(Tag.name))
+        self.assertEqual(result.scalars().all(), ['old'])
+
+    async def test_empty_names(self):
+        self.assertEqual(await get_or_create_tags([], self.session), [])
+        self.assertEqual(self.statements, [])
+
+    async def test_cached_tags_loaded_by_id(self):
+        await get_tag_by_name('old', self.session)
+        self.statements.clear()
+
+        tags = await get_or_create_tags(['old'], self.session)
+
+        self.assertEqual([(tag.id, tag.name) for tag in tags], [(1, 'old')])
+        self.assertEqual(len(self.statements), 1)
+        self.assertNotIn('INSERT', self.statements[0])
+
+    async def test_get_tag_by_name_cached(self):
+        await get_tag_by_name('old', self.session)
+        tag = await get_tag_by_name('old', self.session)
+
+        self.assertEqual((tag.id, tag.name), (1, 'old'))
+        self.assertEqual(len(self.statements), 1)
+        self.assertEqual(tag_cache.info()['hits'], 1)
+        self.assertEqual(tag_cache.info()['misses'], 1)
+
+    async def test_created_tags_are_cached_on_commit(self):
+        tags = await get_or_create_tags(['new'], self.session)
+        self.assertIsNone(tag_cache.get('new'))
+
+        await self.session.commit()
+
+        self.assertEqual(tag_cache.get('new'), tags[0].id)
+
+    async def test_created_tags_are_not_cached_on_rollback(self):
+        await get_or_create_tags(['new'], self.session)
+        await self.session.rollback()
+        await get_or_create_tags(['other'], self.session)
+        await self.session.commit()
+
+        self.assertIsNone(tag_cache.get('new'))
+        self.assertIsNotNone(tag_cache.get('other'))
+
+
+class TestTagCache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = TagCache(maxsize=2)
+        cache.put(Tag(id=1, name='a'))
+        cache.put(Tag(id=2, name='b'))
+        cache.get('a')
+        cache.put(Tag(id=3, name='c'))
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.info(), {'hits': 3, 'misses': 1, 'size': 2, 'maxsize': 2})
+
+    def test_discard(self):
+        cache = TagCache(maxsize=2)
+        cache.put(Tag(id=1, name='a'))
+        cache.discard('a')
+        cache.discard('missing')
+
+        self.assertIsNone(cache.get('a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
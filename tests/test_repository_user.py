@@ -5,7 +5,7 @@ import pickle
 import pytest
 from unittest.mock import MagicMock, AsyncMock,patch
 from pydantic import EmailStr
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.schemas.users import UserModel
 from src.services.auth import auth_service
 from src.database.models import Role, User
@@ -23,7 +23,8 @@ from src.repository.users import (
 import aioredis
 class TestUsers(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
-        self.session = AsyncMock(spec=Session)
+        self.session = AsyncMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock()
         self.user_admin = User(
             id=1,
             username='Admin',
@@ -51,50 +52,50 @@ class TestUsers(unittest.IsolatedAsyncioTestCase):
             status_active=True
         )
     async def test_get_user_by_email_found(self):
-        self.session.query().filter_by().first.return_value = self.user_admin
+        self.session.execute.return_value.scalar_one_or_none.return_value = self.user_admin
         result = await get_user_by_email(self.user_admin.email, self.session)
         self.assertIsInstance(result, User)
         self.assertEqual(result.email, self.user_admin.email)
 
     async def test_get_user_by_email_not_found(self):
-        self.session.query().filter_by().first.return_value = None
+        self.session.execute.return_value.scalar_one_or_none.return_value = None
         result = await get_user_by_email('nonexistent@mail.com', self.session)
         self.assertIsNone(result)
 
     async def test_get_user_by_id_found(self):
-        self.session.query(User).filter(User.id == self.user.id).first.return_value = self.user
+        self.session.execute.return_value.scalar_one_or_none.return_value = self.user
         result = await get_user_by_id(self.user.id, self.session)
         self.assertIsInstance(result, User)
         self.assertEqual(result.id, self.user.id)
 
 
     async def test_get_user_admin_by_id_found(self):
-        self.session.query(User).filter(User.id == self.user.id).first.return_value = self.user_admin
+        self.session.execute.return_value.scalar_one_or_none.return_value = self.user_admin
         result = await get_user_by_id(self.user_admin.id, self.session)
         self.assertIsInstance(result, User)
         self.assertEqual(result.id, self.user_admin.id)
 
     async def test_get_user_by_id_not_found(self):
-        self.session.query(User).filter(User.id == self.user.id).first.return_value = None
+        self.session.execute.return_value.scalar_one_or_none.return_value = None
         result = await get_user_by_id(999, self.session)
         self.assertIsNone(result)
 
 
     async def test_get_user_admin_id_not_found(self):
-        self.session.query(User).filter(User.id == self.user_admin.id).first.return_value = None
+        self.session.execute.return_value.scalar_one_or_none.return_value = None
         result = await get_user_by_id(99, self.session)
         self.assertIsNone(result)
 
     async def test_create_user_first_success(self):
         # Test creating the first user as an admin
-        self.session.query().count.return_value = 0
+        self.session.execute.return_value.scalar_one_or_none.return_value = None
         result = await create_user(UserModel(username='Admin', email=self.user_admin.email, password=self.user_admin.password), self.session)
         self.assertIsInstance(result, User)
         self.assertEqual(result.role, Role.admin)
 
     async def test_create_user_not_first_success(self):
         # Test creating a regular user when there are existing users
-        self.session.query().count.return_value = 1
+        self.session.execute.return_value.scalar_one_or_none.return_value = self.user_admin
         result = await create_user(UserModel(username='User', email=self.user.email, password=self.user.password),
                                    self.session)
         self.assertIsInstance(result, User)
@@ -110,21 +111,22 @@ class TestUsers(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(self.user.refresh_token, 'new_refresh_token')
 
     async def test_update_token_fail(self):
-        self.session.query().filter_by().first.return_value = None
+        self.session.execute.return_value.scalar_one_or_none.return_value = None
         result = await update_token(User(), 'new_refresh_token', self.session)
         self.assertIsNone(result)
 
     async def test_confirmed_email_success(self):
+        self.session.execute.return_value.scalar_one_or_none.return_value = self.user
         await confirmed_email(self.user.email, self.session)
         self.assertTrue(self.user.confirmed)
 
     async def test_update_avatar_success(self):
-        self.session.query().filter_by().first.return_value = self.user
+        self.session.execute.return_value.scalar_one_or_none.return_value = self.user
         result = await update_avatar(self.user.email, 'new_avatar_url', self.session)
         self.assertEqual(result.avatar, 'new_avatar_url')
 
     async def test_get_user_by_username_success(self):
-        self.session.query().filter().first.return_value = self.user_admin
+        self.session.execute.return_value.scalars.return_value.first.return_value = self.user_admin
         result = await get_user_by_username('Admin', self.session)
         self.assertIsInstance(result, User)
         self.assertEqual(result.username, 'Admin')
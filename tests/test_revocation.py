@@ -0,0 +1,151 @@
+import asyncio
+import time
+import unittest
+import uuid
+from unittest.mock import AsyncMock, MagicMock
+
+from fastapi import HTTPException
+from jose import jwt
+
+from src.services.auth import auth_service
+from src.services.revocation import BloomFilter, RevocationList, REVOKED_CHANNEL, REVOKED_PREFIX
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        items = [uuid.uuid4().hex for _ in range(1000)]
+        for item in items:
+            bloom.add(item)
+
+        self.assertTrue(all(item in bloom for item in items))
+        self.assertEqual(bloom.count, 1000)
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for _ in range(1000):
+            bloom.add(uuid.uuid4().hex)
+
+        false_positives = sum(uuid.uuid4().hex in bloom for _ in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_clear(self):
+        bloom = BloomFilter(capacity=10, error_rate=0.01)
+        bloom.add('jti')
+        bloom.clear()
+
+        self.assertNotIn('jti', bloom)
+
+
+class TestRevocationList(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.r = AsyncMock()
+        self.revocation_list = RevocationList(self.r, capacity=100, error_rate=0.01)
+
+    async def test_not_revoked_skips_redis(self):
+        self.assertFalse(await self.revocation_list.is_revoked('jti'))
+
+        self.r.exists.assert_not_awaited()
+        self.assertEqual(self.revocation_list.redis_checks, 0)
+
+    async def test_revoke(self):
+        await self.revocation_list.revoke('jti', time.time() + 60)
+
+        key, value = self.r.set.await_args.args
+        self.assertEqual(key, f'{REVOKED_PREFIX}jti')
+        self.assertTrue(0 < self.r.set.await_args.kwargs['ex'] <= 61)
+        self.r.publish.assert_awaited_once_with(REVOKED_CHANNEL, 'jti')
+
+        self.r.exists.return_value = 1
+        self.assertTrue(await self.revocation_list.is_revoked('jti'))
+        self.r.exists.assert_awaited_once_with(f'{REVOKED_PREFIX}jti')
+
+    async def test_expired_token_is_not_stored(self):
+        await self.revocation_list.revoke('jti', time.time() - 60)
+
+        self.r.set.assert_not_awaited()
+
+    async def test_unsynced_filter_checks_redis(self):
+        self.revocation_list.synced = False
+        self.r.exists.return_value = 0
+
+        self.assertFalse(await self.revocation_list.is_revoked('jti'))
+        self.r.exists.assert_awaited_once()
+
+    async def test_warm(self):
+        async def scan_iter(**kwargs):
+            yield f'{REVOKED_PREFIX}jti'.encode()
+        self.r.scan_iter = MagicMock(side_effect=scan_iter)
+
+        await self.revocation_list.warm()
+
+        self.assertIn('jti', self.revocation_list.bloom)
+
+    async def test_warm_drops_expired_jtis(self):
+        self.revocation_list.bloom.add('expired')
+        revoked_meanwhile = 'revoked'
+
+        async def scan_iter(**kwargs):
+            await self.revocation_list.revoke(revoked_meanwhile, time.time() + 60)
+            yield f'{REVOKED_PREFIX}live'.encode()
+        self.r.scan_iter = MagicMock(side_effect=scan_iter)
+
+        await self.revocation_list.warm()
+
+        bloom = self.revocation_list.bloom
+        self.assertNotIn('expired', bloom)
+        self.assertIn('live', bloom)
+        self.assertIn(revoked_meanwhile, bloom)
+        self.assertEqual(self.revocation_list.rebuilds, 1)
+
+    async def test_concurrent_warm(self):
+        first_started = asyncio.Event()
+        second_done = asyncio.Event()
+
+        async def slow_scan(**kwargs):
+            first_started.set()
+            await second_done.wait()
+            await self.revocation_list.revoke('revoked', time.time() + 60)
+            yield f'{REVOKED_PREFIX}first'.encode()
+
+        async def fast_scan(**kwargs):
+            yield f'{REVOKED_PREFIX}second'.encode()
+
+        self.r.scan_iter = MagicMock(side_effect=slow_scan)
+        first = asyncio.create_task(self.revocation_list.warm())
+        await first_started.wait()
+        self.r.scan_iter = MagicMock(side_effect=fast_scan)
+        await self.revocation_list.warm()
+        second_done.set()
+        await first
+
+        bloom = self.revocation_list.bloom
+        self.assertIn('first', bloom)
+        self.assertIn('revoked', bloom)
+        self.assertEqual(self.revocation_list.rebuilds, 2)
+
+
+class TestTokenRevocation(unittest.IsolatedAsyncioTestCase):
+
+    async def test_revoked_token_is_rejected(self):
+        token_manager = auth_service.token_manager
+        token = await token_manager.create_access_token(data={'sub': 'a@example.com'})
+        payload = jwt.decode(token, token_manager.SECRET_KEY, algorithms=[token_manager.ALGORITHM])
+        self.assertIn('jti', payload)
+
+        r_mock = AsyncMock()
+        r_mock.exists.return_value = 1
+        original = token_manager.revocation_list
+        token_manager.revocation_list = RevocationList(r_mock, capacity=100, error_rate=0.01)
+        try:
+            self.assertTrue(await token_manager.is_token_valid(payload))
+            await token_manager.invalidate_token(payload)
+            self.assertFalse(await token_manager.is_token_valid(payload))
+
+            with self.assertRaises(HTTPException) as exc_info:
+                await token_manager.get_current_user(token, AsyncMock())
+            self.assertEqual(exc_info.exception.status_code, 401)
+        finally:
+            token_manager.revocation_list = original
@@ -6,7 +6,7 @@ from src.database.models import User, Comment
 
 
 def test_add_comment(client, session, user_token, user, comment, mock_ratelimiter, monkeypatch):
-    with patch.object(auth_service.token_manager, 'r') as r_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         mock_image = AsyncMock()
         monkeypatch.setattr('src.repository.images.get_image', mock_image)
@@ -21,7 +21,7 @@ def test_add_comment(client, session, user_token, user, comment, mock_ratelimite
 
 
 def test_get_comments_by_image_id(client, session, user_token, user, comment, mock_ratelimiter, monkeypatch):
-    with patch.object(auth_service.token_manager, 'r') as r_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         mock_image = AsyncMock()
         monkeypatch.setattr('src.repository.images.get_image', mock_image)
@@ -36,7 +36,7 @@ def test_get_comments_by_image_id(client, session, user_token, user, comment, mo
 
 
 def test_update_comment(client, session, user_token, user, comment, mock_ratelimiter, monkeypatch):
-    with patch.object(auth_service.token_manager, 'r') as r_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         user = session.query(User).filter_by(email=user.get('email')).first()
         test_comment = session.query(Comment).filter_by(user_id=user.id).first()
@@ -53,7 +53,7 @@ def test_update_comment(client, session, user_token, user, comment, mock_ratelim
 
 
 def test_remove_comment_by_user(client, session, user_token, user, comment, mock_ratelimiter, monkeypatch):
-    with patch.object(auth_service.token_manager, 'r') as r_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         user = session.query(User).filter_by(email=user.get('email')).first()
         test_comment = session.query(Comment).filter_by(user_id=user.id).first()
@@ -67,7 +67,7 @@ def test_remove_comment_by_user(client, session, user_token, user, comment, mock
 
 
 def test_remove_comment_by_admin(client, session, admin_token, admin, mock_ratelimiter, monkeypatch):
-    with patch.object(auth_service.token_manager, 'r') as r_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         admin = session.query(User).filter_by(email=admin.get('email')).first()
         test_comment = Comment(user_id=admin.id, comment='Test comment')
@@ -83,7 +83,7 @@ def test_remove_comment_by_admin(client, session, admin_token, admin, mock_ratel
 
 
 def test_update_comment_not_found(client, session, user_token, user, comment, mock_ratelimiter, monkeypatch):
-    with patch.object(auth_service.token_manager, 'r') as r_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.patch(
             '/api/comment/999',
@@ -94,7 +94,7 @@ def test_update_comment_not_found(client, session, user_token, user, comment, mo
 
 
 def test_remove_comment_not_found(client, session, admin_token, user, comment, mock_ratelimiter, monkeypatch):
-    with patch.object(auth_service.token_manager, 'r') as r_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.delete(
             '/api/comment/9999',
@@ -3,11 +3,14 @@ import io
 import unittest.mock as um
 from src.conf import messages
 from src.services.auth import auth_service
-from src.database.models import User, Image
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from src.database.models import User, Image, Tag, TransformationsType
+from src.services.transformations import transformation_engine
 
 
 def test_create_image_by_admin(client, session, admin, admin_token, image, monkeypatch, mock_ratelimiter):
-    with patch.object(auth_service.token_manager, 'r') as redis_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         mock_public_id = MagicMock()
         monkeypatch.setattr('src.services.cloud_image.CloudImage.generate_name_image', mock_public_id)
@@ -36,7 +39,7 @@ def test_create_image_by_admin(client, session, admin, admin_token, image, monke
 
 
 def test_create_image_by_user(client, session, user, user_token, image, monkeypatch, mock_ratelimiter):
-    with patch.object(auth_service.token_manager, 'r') as redis_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         mock_public_id = MagicMock()
         monkeypatch.setattr('src.services.cloud_image.CloudImage.generate_name_image', mock_public_id)
@@ -64,7 +67,7 @@ def test_create_image_by_user(client, session, user, user_token, image, monkeypa
         assert 'id' in data
 
 def test_get_image(client, session, user_token, image, monkeypatch, mock_ratelimiter):
-    with patch.object(auth_service.token_manager, 'r') as redis_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         response = client.get(
             '/api/images/1',
@@ -78,7 +81,7 @@ def test_get_image(client, session, user_token, image, monkeypatch, mock_ratelim
 
 
 def test_image_no_such_image(client, session, user_token, image, monkeypatch, mock_ratelimiter):
-    with patch.object(auth_service.token_manager, 'r') as redis_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         response = client.get(
                     '/api/images/999',
@@ -90,7 +93,7 @@ def test_image_no_such_image(client, session, user_token, image, monkeypatch, mo
 
 
 def test_image_qrcode(client, session, user, user_token, image, monkeypatch, mock_ratelimiter):
-    with patch.object(auth_service.token_manager, 'r') as redis_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
 
         user = session.query(User).filter_by(email=user.get('email')).first()
@@ -107,7 +110,7 @@ def test_image_qrcode(client, session, user, user_token, image, monkeypatch, moc
 
 
 def test_get_image_by_tag_name(client, session, user_token, image, monkeypatch, mock_ratelimiter):
-    with patch.object(auth_service.token_manager, 'r') as redis_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
 
         response = client.get(
@@ -123,7 +126,7 @@ def test_get_image_by_tag_name(client, session, user_token, image, monkeypatch,
 
 
 def test_get_image_by_tag_name_no_tags(client, session, user_token, image, monkeypatch, mock_ratelimiter):
-    with patch.object(auth_service.token_manager, 'r') as redis_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
 
     response = client.get(
@@ -137,7 +140,7 @@ def test_get_image_by_tag_name_no_tags(client, session, user_token, image, monke
 
 
 def test_transforme_image(client, session, user, user_token, image, monkeypatch, mock_ratelimiter):
-    with patch.object(auth_service.token_manager, 'r') as redis_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         user = session.query(User).filter_by(email=user.get('email')).first()
         test_image = session.query(Image).filter_by(user_id=user.id).first()
@@ -153,8 +156,77 @@ def test_transforme_image(client, session, user, user_token, image, monkeypatch,
         assert data['description'] == 'Test image basic'
 
 
+def test_get_images_by_user_cursor(client, session, user, user_token, image, monkeypatch, mock_ratelimiter):
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        user = session.query(User).filter_by(email=user.get('email')).first()
+        expected = [image.id for image in session.query(Image).filter_by(user_id=user.id).order_by(Image.id.desc())]
+
+        ids = []
+        cursor = None
+        for _ in range(len(expected)):
+            params = {'size': 1}
+            if cursor:
+                params['cursor'] = cursor
+            response = client.get(
+                '/api/images/by_user/cursor',
+                params=params,
+                headers={'Authorization': f'''Bearer {user_token['access_token']}'''}
+            )
+            assert response.status_code == 200, response.text
+            data = response.json()
+            assert len(data['items']) == 1
+            ids.append(data['items'][0]['id'])
+            cursor = data['next_cursor']
+
+        assert ids == expected
+        assert cursor is None
+
+
+def test_get_images_by_user_invalid_cursor(client, session, user_token, image, monkeypatch, mock_ratelimiter):
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        response = client.get(
+            '/api/images/by_user/cursor',
+            params={'cursor': 'not-a-cursor'},
+            headers={'Authorization': f'''Bearer {user_token['access_token']}'''}
+        )
+        assert response.status_code == 400, response.text
+        assert response.json()['detail'] == messages.MSC400_INVALID_CURSOR
+
+
+def test_get_images_by_user_query_count(client, session, user, user_token, image, monkeypatch, mock_ratelimiter):
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        user = session.query(User).filter_by(email=user.get('email')).first()
+        for number in range(3):
+            session.add(Image(description=f'Image {number}', link=f'link_{number}', user_id=user.id,
+                              tags=[Tag(name=f'tag_{number}')]))
+        session.commit()
+
+        statements = []
+
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(Engine, 'before_cursor_execute', count_statement)
+        try:
+            response = client.get(
+                '/api/images/by_user',
+                headers={'Authorization': f'''Bearer {user_token['access_token']}'''}
+            )
+        finally:
+            event.remove(Engine, 'before_cursor_execute', count_statement)
+
+        assert response.status_code == 200, response.text
+        assert len(response.json()['items']) >= 3
+        assert all(item['tags'] for item in response.json()['items'])
+        # tags of the whole page are loaded by one statement
+        assert len([statement for statement in statements if 'image_m2m_tag' in statement]) == 1
+
+
 def test_update_image(client, session, user, user_token, image, monkeypatch, mock_ratelimiter):
-    with patch.object(auth_service.token_manager, 'r') as redis_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         user = session.query(User).filter_by(email=user.get('email')).first()
         test_image = session.query(Image).filter_by(user_id=user.id).first()
@@ -173,7 +245,7 @@ def test_update_image(client, session, user, user_token, image, monkeypatch, moc
 
 
 def test_remove_image(client, session, user, user_token, image, monkeypatch, mock_ratelimiter):
-    with patch.object(auth_service.token_manager, 'r') as redis_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
 
         user = session.query(User).filter_by(email=user.get('email')).first()
@@ -188,3 +260,75 @@ def test_remove_image(client, session, user, user_token, image, monkeypatch, moc
         assert data['message'] == messages.IMAGE_DELETED
         assert session.query(Image).filter_by(id=test_image.id).first() is None
 
+
+
+def test_repeated_transformation_returns_existing_image(client, session, user, user_token, image, monkeypatch,
+                                                        mock_ratelimiter):
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as redis_mock, \
+            patch('src.repository.images.redis_client', new_callable=AsyncMock) as images_redis_mock:
+        redis_mock.get.return_value = None
+        images_redis_mock.get.return_value = None
+        user = session.query(User).filter_by(email=user.get('email')).first()
+        test_image = Image(description='source', link='http://localhost/media/source.jpg', user_id=user.id)
+        session.add(test_image)
+        session.commit()
+        transform_mock = AsyncMock(return_value='http://localhost/media/transformed.jpg')
+        monkeypatch.setattr(transformation_engine, 'transform', transform_mock)
+
+        responses = [
+            client.post(
+                f'/api/images/transaction/{test_image.id}/sepia',
+                headers={'Authorization': f'''Bearer {user_token['access_token']}'''}
+            )
+            for _ in range(2)
+        ]
+
+        assert [response.status_code for response in responses] == [200, 200], responses[-1].text
+        assert responses[0].json()['id'] == responses[1].json()['id']
+        transform_mock.assert_awaited_once()
+        session.expire_all()
+        assert session.query(Image).filter_by(source_image_id=test_image.id, type=TransformationsType.sepia).count() == 1
+
+
+def test_image_qrcode_not_modified(client, session, user, user_token, image, monkeypatch, mock_ratelimiter):
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        user = session.query(User).filter_by(email=user.get('email')).first()
+        test_image = session.query(Image).filter_by(user_id=user.id).first()
+        headers = {'Authorization': f'''Bearer {user_token['access_token']}'''}
+
+        response = client.get(f'/api/images/qrcode/{test_image.id}', params={'format': 'svg'}, headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.headers['Content-Type'] == 'image/svg+xml'
+        etag = response.headers['ETag']
+
+        response = client.get(f'/api/images/qrcode/{test_image.id}', params={'format': 'svg'},
+                              headers={**headers, 'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.headers['ETag'] == etag
+        assert response.content == b''
+
+
+def test_same_content_is_uploaded_once(client, session, user, user_token, image, monkeypatch, mock_ratelimiter):
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        mock_upload = MagicMock(return_value={'version': '1'})
+        monkeypatch.setattr('src.services.cloud_image.CloudImage.image_upload', mock_upload)
+        monkeypatch.setattr('src.services.cloud_image.CloudImage.get_url_for_image',
+                            MagicMock(return_value='https://example.com/dedup.jpg'))
+        content = b'\xff\xd8\xff' + b'same content for dedup'
+
+        responses = [
+            client.post(
+                '/api/images/',
+                params={'description': image['description'], 'tags': image['tags']},
+                files={'file': (filename, content, 'image/jpeg')},
+                headers={'Authorization': f'''Bearer {user_token['access_token']}'''}
+            )
+            for filename in ('first.jpg', 'retry.jpg')
+        ]
+
+        assert [response.status_code for response in responses] == [200, 200], responses[-1].text
+        mock_upload.assert_called_once()
+        assert responses[0].json()['link'] == responses[1].json()['link'] == 'https://example.com/dedup.jpg'
+        assert responses[0].json()['id'] != responses[1].json()['id']
@@ -1,4 +1,4 @@
-from unittest.mock import patch
+from unittest.mock import patch, AsyncMock
 from src.services.auth import auth_service
 from src.conf import messages
 from src.database.models import User
@@ -8,7 +8,7 @@ from datetime import datetime
 
 
 def test_add_rating(client, session, user_token, mock_ratelimiter):
-    with patch.object(auth_service.token_manager, 'r') as r_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         user2 = User(
             id=3,
@@ -41,8 +41,33 @@ def test_add_rating(client, session, user_token, mock_ratelimiter):
         assert "rating" in response.json()
 
 
+def test_image_rating_loaded_with_image(client, session, user_token, mock_ratelimiter):
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.get(
+            '/api/images/4',
+            headers={'Authorization': f'Bearer {user_token["access_token"]}'}
+        )
+        assert response.status_code == 200, response.text
+        assert response.json()['rating'] == 5.0
+
+
+def test_get_average_rating(client, session, user_token, mock_ratelimiter):
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        test_image = session.query(Image).filter_by(id=4).first()
+        assert (test_image.rating_sum, test_image.rating_count) == (5.0, 1)
+
+        response = client.get(
+            '/api/ratings/4',
+            headers={'Authorization': f'Bearer {user_token["access_token"]}'}
+        )
+        assert response.status_code == 200, response.text
+        assert response.json() == {'rating': 5.0}
+
+
 def test_add_rating_self_image(client, session, user, user_token, mock_ratelimiter):
-    with patch.object(auth_service.token_manager, 'r') as r_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         test_image = Image(
             id=5,
@@ -67,7 +92,7 @@ def test_add_rating_self_image(client, session, user, user_token, mock_ratelimit
 
 
 def test_remove_rating(client, session, user, user_token, mock_ratelimiter):
-    with patch.object(auth_service.token_manager, 'r') as r_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         test_user = User(
             username="test_user",
@@ -90,7 +115,7 @@ def test_remove_rating(client, session, user, user_token, mock_ratelimiter):
 
 
 def test_get_all_ratings(client, session, user, user_token, mock_ratelimiter):
-    with patch.object(auth_service.token_manager, 'r') as r_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         test_image = Image(description="Test image", user_id=user.get('id'), link="test_image_link_test")
         session.add(test_image)
@@ -112,7 +137,7 @@ def test_get_all_ratings(client, session, user, user_token, mock_ratelimiter):
 
 
 def test_get_all_ratings_not_found(client, session, user, user_token, mock_ratelimiter):
-    with patch.object(auth_service.token_manager, 'r') as r_mock:
+    with patch.object(auth_service.token_manager, 'r', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.get(
             f"/api/ratings/999/all",
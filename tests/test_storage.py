@@ -0,0 +1,92 @@
+import io
+import os
+import tempfile
+import unittest
+import uuid
+from pathlib import Path
+
+from src.services.storage import LocalStorage, S3Storage, StorageBackend, content_key, sniff_type
+
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 100
+JPEG = b'\xff\xd8\xff\xe0' + b'\x01' * 100
+
+
+class TestContentKey(unittest.TestCase):
+
+    def test_sniff_type(self):
+        self.assertEqual(sniff_type(PNG), ('.png', 'image/png'))
+        self.assertEqual(sniff_type(JPEG), ('.jpg', 'image/jpeg'))
+        self.assertEqual(sniff_type(b'RIFF\x00\x00\x00\x00WEBPVP8 '), ('.webp', 'image/webp'))
+        self.assertEqual(sniff_type(b'text'), ('.bin', 'application/octet-stream'))
+
+    def test_key_depends_on_content_only(self):
+        file = io.BytesIO(PNG)
+        key, sha, media_type = content_key(file)
+
+        self.assertEqual(key, f'{sha[:2]}/{sha[2:4]}/{sha}.png')
+        self.assertEqual(media_type, 'image/png')
+        self.assertEqual(file.tell(), 0)
+        self.assertEqual(content_key(io.BytesIO(PNG))[0], key)
+        self.assertNotEqual(content_key(io.BytesIO(JPEG))[0], key)
+
+
+class TestLocalStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = LocalStorage(self.tmp.name, '/media/')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_upload_and_url(self):
+        r = self.storage.upload(io.BytesIO(PNG), 'FRT-PHOTO-SHARE-IMAGES/name')
+
+        self.assertEqual(self.storage.path(r['key']).read_bytes(), PNG)
+        self.assertEqual(self.storage.url('FRT-PHOTO-SHARE-IMAGES/name', r), f"/media/{r['key']}")
+        self.assertEqual(r['content_type'], 'image/png')
+
+    def test_same_content_is_stored_once(self):
+        first = self.storage.upload(io.BytesIO(PNG), 'first')
+        second = self.storage.upload(io.BytesIO(PNG), 'second')
+
+        self.assertEqual(first['key'], second['key'])
+        files = [path for path in Path(self.tmp.name).rglob('*') if path.is_file()]
+        self.assertEqual(len(files), 1)
+
+    def test_no_transformation_urls(self):
+        self.assertFalse(self.storage.supports_transformation_url)
+        with self.assertRaises(TypeError):
+            StorageBackend()
+
+
+@unittest.skipUnless(os.environ.get('MINIO_ENDPOINT'), 'set MINIO_ENDPOINT to run against MinIO')
+class TestS3Storage(unittest.TestCase):
+    """
+    Runs against a MinIO server, e.g. docker run -p 9000:9000 minio/minio server /data
+    with MINIO_ENDPOINT=http://localhost:9000 and the default minioadmin credentials.
+    """
+
+    def setUp(self):
+        self.bucket = f'imageiq-test-{uuid.uuid4().hex[:8]}'
+        self.storage = S3Storage(self.bucket, os.environ['MINIO_ENDPOINT'],
+                                 os.environ.get('MINIO_ACCESS_KEY', 'minioadmin'),
+                                 os.environ.get('MINIO_SECRET_KEY', 'minioadmin'), 'us-east-1')
+        self.storage.client.create_bucket(Bucket=self.bucket)
+
+    def tearDown(self):
+        for item in self.storage.client.list_objects_v2(Bucket=self.bucket).get('Contents', []):
+            self.storage.client.delete_object(Bucket=self.bucket, Key=item['Key'])
+        self.storage.client.delete_bucket(Bucket=self.bucket)
+
+    def test_upload_and_url(self):
+        r = self.storage.upload(io.BytesIO(JPEG), 'name')
+        self.storage.upload(io.BytesIO(JPEG), 'other name')
+
+        stored = self.storage.client.get_object(Bucket=self.bucket, Key=r['key'])
+        self.assertEqual(stored['Body'].read(), JPEG)
+        self.assertEqual(stored['ContentType'], 'image/jpeg')
+        self.assertEqual(self.storage.client.list_objects_v2(Bucket=self.bucket)['KeyCount'], 1)
+        self.assertEqual(self.storage.url('name', r),
+                         f"{os.environ['MINIO_ENDPOINT'].rstrip('/')}/{self.bucket}/{r['key']}")
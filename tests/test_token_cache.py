@@ -0,0 +1,98 @@
+import time
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from fastapi import HTTPException
+from jose import jwt
+
+from src.database.models import User, Role
+from src.services.auth import auth_service
+from src.services.revocation import RevocationList
+from src.services.token_cache import DecodedTokenCache
+
+
+class TestDecodedTokenCache(unittest.TestCase):
+
+    def test_hit_and_miss(self):
+        cache = DecodedTokenCache(maxsize=2)
+        payload = {'sub': 'a@example.com', 'exp': time.time() + 60}
+
+        self.assertIsNone(cache.get('token'))
+        cache.put('token', payload)
+
+        self.assertIs(cache.get('token'), payload)
+        self.assertEqual(cache.info()['hits'], 1)
+        self.assertEqual(cache.info()['misses'], 1)
+
+    def test_expired_token_is_a_miss(self):
+        cache = DecodedTokenCache(maxsize=2)
+        cache.put('token', {'sub': 'a@example.com', 'exp': time.time() - 1})
+
+        self.assertIsNone(cache.get('token'))
+        self.assertEqual(cache.info()['size'], 0)
+
+    def test_token_without_exp_is_not_cached(self):
+        cache = DecodedTokenCache(maxsize=2)
+        cache.put('token', {'sub': 'a@example.com'})
+
+        self.assertEqual(cache.info()['size'], 0)
+
+    def test_lru_eviction(self):
+        cache = DecodedTokenCache(maxsize=2)
+        exp = time.time() + 60
+        cache.put('a', {'exp': exp})
+        cache.put('b', {'exp': exp})
+        cache.get('a')
+        cache.put('c', {'exp': exp})
+
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+
+
+class TestGetCurrentUserWithTokenCache(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.token_manager = auth_service.token_manager
+        self.token_manager.decoded_token_cache.clear()
+        self.token_manager.token_versions.clear()
+        user = User(id=9, email='jwt@example.com', password='hash', role=Role.user,
+                    confirmed=True, status_active=True, token_version=0)
+        self.token = await self.token_manager.create_access_token(data=self.token_manager.access_token_data(user))
+
+        self.r_patch = patch.object(self.token_manager, 'r', new_callable=AsyncMock)
+        r_mock = self.r_patch.start()
+        r_mock.get.return_value = b'0'
+        r_mock.exists.return_value = 1
+        self.original_revocation_list = self.token_manager.revocation_list
+        self.token_manager.revocation_list = RevocationList(r_mock, capacity=100, error_rate=0.01)
+
+    async def asyncTearDown(self):
+        self.token_manager.revocation_list = self.original_revocation_list
+        self.r_patch.stop()
+        self.token_manager.decoded_token_cache.clear()
+
+    async def test_revoked_token_is_rejected_from_cache(self):
+        await self.token_manager.get_current_user(self.token, AsyncMock())
+        self.assertEqual(self.token_manager.decoded_token_cache.info()['size'], 1)
+
+        payload = self.token_manager.decoded_token_cache.get(self.token)
+        await self.token_manager.invalidate_token(payload)
+
+        with self.assertRaises(HTTPException) as exc_info:
+            await self.token_manager.get_current_user(self.token, AsyncMock())
+        self.assertEqual(exc_info.exception.status_code, 401)
+
+    async def test_cached_token_is_decoded_once(self):
+        with patch('src.services.auth.jwt.decode', wraps=jwt.decode) as decode_mock, \
+                patch('src.repository.users.get_user_by_email', new_callable=AsyncMock) as get_user_mock:
+            for _ in range(3):
+                await self.token_manager.get_current_user(self.token, AsyncMock())
+            self.assertEqual(decode_mock.call_count, 1)
+            self.assertEqual(self.token_manager.decoded_token_cache.info()['hits'], 2)
+
+            self.token_manager.decoded_token_cache.clear()
+            await self.token_manager.get_current_user(self.token, AsyncMock())
+            self.assertEqual(decode_mock.call_count, 2)
+
+        get_user_mock.assert_not_awaited()
@@ -0,0 +1,74 @@
+import io
+import unittest
+from unittest.mock import MagicMock, patch
+
+from fastapi import HTTPException
+from PIL import Image as PILImage
+
+from src.database.models import Image, TransformationsType
+from src.services.transformations import EFFECTS, LocalEngine, apply_transformation
+
+
+def make_image(size=(640, 480), format='JPEG') -> bytes:
+    output = io.BytesIO()
+    PILImage.new('RGB', size, (200, 120, 40)).save(output, format=format)
+    return output.getvalue()
+
+
+class TestApplyTransformation(unittest.TestCase):
+
+    def test_every_effect_produces_an_image(self):
+        source = make_image()
+        for type_value in EFFECTS:
+            with self.subTest(type_value):
+                with PILImage.open(io.BytesIO(apply_transformation(source, type_value))) as result:
+                    self.assertIn(result.format, ('JPEG', 'PNG'))
+
+    def test_sizes(self):
+        source = make_image()
+        with PILImage.open(io.BytesIO(apply_transformation(source, 'basic'))) as result:
+            self.assertEqual(result.size, (500, 500))
+        with PILImage.open(io.BytesIO(apply_transformation(source, 'avatar'))) as result:
+            self.assertEqual((result.size, result.format, result.mode), ((500, 500), 'PNG', 'RGBA'))
+        with PILImage.open(io.BytesIO(apply_transformation(source, 'outline'))) as result:
+            self.assertEqual(result.width, 270)
+
+    def test_black_white_and_sepia(self):
+        source = make_image()
+        with PILImage.open(io.BytesIO(apply_transformation(source, 'black_white'))) as result:
+            self.assertEqual(result.mode, 'L')
+        with PILImage.open(io.BytesIO(apply_transformation(source, 'sepia'))) as result:
+            r, g, b = result.convert('RGB').getpixel((0, 0))
+            self.assertGreater(r, g)
+            self.assertGreater(g, b)
+
+
+class TestLocalEngine(unittest.IsolatedAsyncioTestCase):
+
+    def tearDown(self):
+        LocalEngine.shutdown()
+
+    async def test_transformed_image_is_stored(self):
+        engine = LocalEngine(workers=1, queue_size=1, timeout=30)
+        image = Image(id=5, link='/media/source.jpg')
+        storage = MagicMock()
+        storage.read.return_value = make_image()
+
+        with patch('src.services.cloud_image.CloudImage.storage', storage), \
+                patch('src.services.cloud_image.CloudImage.image_upload', return_value={'key': 'key'}) as upload, \
+                patch('src.services.cloud_image.CloudImage.get_url_for_image', return_value='/media/key') as url:
+            link = await engine.transform(image, TransformationsType.sepia)
+
+        self.assertEqual(link, '/media/key')
+        storage.read.assert_called_once_with('/media/source.jpg')
+        self.assertEqual(upload.call_args.args[1], 'FRT-PHOTO-SHARE-IMAGES/transformed-5-sepia')
+        url.assert_called_once_with('FRT-PHOTO-SHARE-IMAGES/transformed-5-sepia', {'key': 'key'})
+        self.assertEqual(engine.metrics()['completed'], 1)
+
+    async def test_background_removal_is_not_supported(self):
+        engine = LocalEngine(workers=1, queue_size=1, timeout=30)
+
+        with self.assertRaises(HTTPException) as err:
+            await engine.transform(Image(id=5, link='/media/source.jpg'), TransformationsType.delete_bg)
+
+        self.assertEqual(err.exception.status_code, 501)
@@ -1,12 +1,12 @@
 import unittest
 import asyncio
 from asynctest import patch, TestCase, MagicMock
-from unittest.mock import MagicMock, call
-from sqlalchemy.orm import Session
+from unittest.mock import AsyncMock, MagicMock, call
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 from tests.conftest_comments import TestingSessionLocal
 from src.database.models import Comment, User, Image
-from src.schemas.images import CommentModel, SortDirection
+from src.schemas.images import CommentModel, SortDirection, CursorParams
 from src.repository.comments import (
     add_comment,
     update_comment,
@@ -16,6 +16,7 @@ from src.repository.comments import (
     get_comments_by_image
 )
 from src.conf import messages
+from src.services.cursor import decode_cursor
 import sys
 import os
 
@@ -24,9 +25,9 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 class AsyncTestComments(TestCase):
     async def setUp(self):
-        self.mock_session = MagicMock()
+        self.mock_session = AsyncMock(spec=AsyncSession)
         self.mock_session.add = MagicMock()
-        self.mock_session.commit = MagicMock()
+        self.mock_session.execute.return_value = MagicMock()
         self.user = User(id=1, username="testuser")  
 
     @patch('tests.conftest.TestingSessionLocal', new_callable=MagicMock)
@@ -47,12 +48,11 @@ class AsyncTestComments(TestCase):
         comment_id = 1
         body = CommentModel(comment="Updated Comment")
         user = User(id=1)
-        db_session = MagicMock(Session)
+        db_session = AsyncMock(spec=AsyncSession)
+        db_session.execute.return_value = MagicMock()
         mock_comment = Comment(id=comment_id, comment="Original Comment", user_id=user.id)
 
-        with patch.object(db_session.query(Comment), 'filter_by', return_value=db_session.query(Comment).filter_by.return_value):
-            db_session.query(Comment).filter_by().first.return_value = mock_comment
-
+        with patch.object(db_session.execute.return_value, 'scalar_one_or_none', return_value=mock_comment):
             updated_comment = await update_comment(comment_id, body, user, db_session)
 
             self.assertIsNotNone(updated_comment)
@@ -62,11 +62,10 @@ class AsyncTestComments(TestCase):
         comment_id = 1
         body = CommentModel(comment="Updated Comment")
         user = User(id=1)
-        db_session = MagicMock(Session)
-        
-        with patch.object(db_session.query(Comment), 'filter_by', return_value=db_session.query(Comment).filter_by.return_value):
-            db_session.query(Comment).filter_by().first.return_value = None
+        db_session = AsyncMock(spec=AsyncSession)
+        db_session.execute.return_value = MagicMock()
 
+        with patch.object(db_session.execute.return_value, 'scalar_one_or_none', return_value=None):
             with self.assertRaises(HTTPException) as exc_info:
                 await update_comment(comment_id, body, user, db_session)
 
@@ -77,12 +76,10 @@ class AsyncTestComments(TestCase):
         comment_id = 1
         body = CommentModel(comment="Updated Comment")
         user = User(id=1)
-        db_session = MagicMock(Session)
-        
-        
-        with patch.object(db_session.query(Comment), 'filter_by', return_value=db_session.query(Comment).filter_by.return_value):
-            db_session.query(Comment).filter_by().first.return_value = Comment(user_id=2)
+        db_session = AsyncMock(spec=AsyncSession)
+        db_session.execute.return_value = MagicMock()
 
+        with patch.object(db_session.execute.return_value, 'scalar_one_or_none', return_value=Comment(user_id=2)):
             with self.assertRaises(HTTPException) as exc_info:
                 await update_comment(comment_id, body, user, db_session)
 
@@ -99,11 +96,10 @@ class AsyncTestComments(TestCase):
     async def test_remove_comment_not_found(self):
         comment_id = 999
         user = User(id=1)
-        db_session = MagicMock(Session)
-
-        with patch.object(db_session.query(Comment), 'filter_by') as mock_filter_by:
-            mock_filter_by.return_value.first.return_value = None
+        db_session = AsyncMock(spec=AsyncSession)
+        db_session.execute.return_value = MagicMock()
 
+        with patch.object(db_session.execute.return_value, 'scalar_one_or_none', return_value=None):
             with self.assertRaises(HTTPException) as exc_info:
                 await remove_comment(comment_id, user, db_session)
 
@@ -115,14 +111,16 @@ class AsyncTestComments(TestCase):
     async def test_get_comments_by_image_sorted_asc(self):
         image_id = 1
         sort_direction = SortDirection.asc
-        db_session = MagicMock(Session)
+        db_session = AsyncMock(spec=AsyncSession)
+        db_session.execute.return_value = MagicMock()
         mock_comment1 = Comment(id=1, image_id=image_id, comment="Comment 1")
         mock_comment2 = Comment(id=2, image_id=image_id, comment="Comment 2")
 
-        with patch.object(db_session.query(Comment), 'filter_by', return_value=db_session.query(Comment).filter_by.return_value):
-            db_session.query(Comment).filter_by().order_by.return_value.all.return_value = [mock_comment1, mock_comment2]
+        with patch.object(db_session.execute.return_value, 'scalars') as mock_scalars:
+            mock_scalars.return_value.all.return_value = [mock_comment1, mock_comment2]
 
-            comments = await get_comments_by_image(image_id, sort_direction, db_session)
+            page = await get_comments_by_image(image_id, sort_direction, CursorParams(size=2), db_session)
+            comments = page['items']
 
             self.assertEqual(comments, [mock_comment1, mock_comment2])
             self.assertEqual(comments[0].id, 1)
@@ -135,14 +133,16 @@ class AsyncTestComments(TestCase):
     async def test_get_comments_by_image_sorted_desc(self):
         image_id = 1
         sort_direction = SortDirection.desc
-        db_session = MagicMock(Session)
+        db_session = AsyncMock(spec=AsyncSession)
+        db_session.execute.return_value = MagicMock()
         mock_comment1 = Comment(id=1, image_id=image_id, comment="Comment 1")
         mock_comment2 = Comment(id=2, image_id=image_id, comment="Comment 2")
 
-        with patch.object(db_session.query(Comment), 'filter_by', return_value=db_session.query(Comment).filter_by.return_value):
-            db_session.query(Comment).filter_by().order_by.return_value.all.return_value = [mock_comment2, mock_comment1]
+        with patch.object(db_session.execute.return_value, 'scalars') as mock_scalars:
+            mock_scalars.return_value.all.return_value = [mock_comment2, mock_comment1]
 
-            comments = await get_comments_by_image(image_id, sort_direction, db_session)
+            page = await get_comments_by_image(image_id, sort_direction, CursorParams(size=2), db_session)
+            comments = page['items']
 
             self.assertEqual(comments, [mock_comment2, mock_comment1])
             self.assertEqual(comments[0].id, 2)
@@ -151,6 +151,33 @@ class AsyncTestComments(TestCase):
             self.assertEqual(comments[1].id, 1)
             self.assertEqual(comments[1].image_id, image_id)
             self.assertEqual(comments[1].comment, "Comment 1")
+            self.assertIsNone(page['next_cursor'])
+
+    async def test_get_comments_by_image_next_cursor(self):
+        image_id = 1
+        db_session = AsyncMock(spec=AsyncSession)
+        db_session.execute.return_value = MagicMock()
+        mock_comment1 = Comment(id=1, image_id=image_id, comment="Comment 1")
+        mock_comment2 = Comment(id=2, image_id=image_id, comment="Comment 2")
+        mock_comment3 = Comment(id=3, image_id=image_id, comment="Comment 3")
+
+        with patch.object(db_session.execute.return_value, 'scalars') as mock_scalars:
+            mock_scalars.return_value.all.return_value = [mock_comment3, mock_comment2, mock_comment1]
+
+            page = await get_comments_by_image(image_id, SortDirection.desc, CursorParams(size=2), db_session)
+
+            self.assertEqual(page['items'], [mock_comment3, mock_comment2])
+            self.assertEqual(decode_cursor(page['next_cursor'], ('id',)), {'id': 2})
+
+    async def test_get_comments_by_image_invalid_cursor(self):
+        db_session = AsyncMock(spec=AsyncSession)
+
+        with self.assertRaises(HTTPException) as exc_info:
+            await get_comments_by_image(1, SortDirection.desc, CursorParams(cursor='bad'), db_session)
+
+        self.assertEqual(exc_info.exception.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(exc_info.exception.detail, messages.MSC400_INVALID_CURSOR)
+        db_session.execute.assert_not_called()
 
 
 
@@ -159,8 +186,7 @@ class AsyncTestComments(TestCase):
         added_comment = await add_comment(comment_model, image_id=1, user=self.user, db=self.mock_session)
         comment_id = added_comment.id
 
-        mock_query = self.mock_session.query.return_value.filter_by.return_value
-        mock_query.first.return_value = added_comment   
+        self.mock_session.execute.return_value.scalar_one_or_none.return_value = added_comment
 
         retrieved_comment = await get_comment_by_id(comment_id=comment_id, db=self.mock_session)
         self.assertIsInstance(retrieved_comment, Comment)
@@ -170,8 +196,7 @@ class AsyncTestComments(TestCase):
 
     async def test_get_comments(self):
         image_id = 1
-        mock_query = self.mock_session.query.return_value.filter_by.return_value
-        mock_query.all.return_value = []   
+        self.mock_session.execute.return_value.scalars.return_value.all.return_value = []
 
         comments = await get_comments(image_id=image_id, db=self.mock_session)
         self.assertIsInstance(comments, list)
@@ -3,10 +3,10 @@ import sys
 sys.path.insert(0, '')
 
 from unittest import IsolatedAsyncioTestCase
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock
 from fastapi import HTTPException, status
 from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.conf import messages
 from src.database.models import Rating, Image, User, Role
 from src.schemas.images import RatingModel
@@ -20,7 +20,8 @@ from src.repository.ratings import(
 
 class TestRatings(IsolatedAsyncioTestCase):
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = AsyncMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock()
         self.user = User(id=1)
         self.image = Image(id=1)
         
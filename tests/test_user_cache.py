@@ -0,0 +1,191 @@
+import pickle
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+from src.database.models import User, Role
+from src.services.auth import auth_service
+from src.services.user_cache import (CachedUser, LocalUserCache, TokenClaims, TokenVersionCache, CACHE_SCHEMA_VERSION,
+                                     CACHE_TTL, TOKEN_VERSIONS_CHANNEL, USERS_CHANNEL, password_version)
+
+
+class TestCachedUser(unittest.TestCase):
+
+    def setUp(self):
+        self.user = User(
+            id=1,
+            username='test_user',
+            email='test_user@example.com',
+            password='$2b$12$hWg6B6pKNVn8RqtKsYyy7eZtE.C.xZQYI7X1oOOFPUSj8hp0a/3W.',
+            avatar='https://www.gravatar.com/avatar/94d093eda664addd6e450d7e9881bcad',
+            refresh_token='refresh_token',
+            created_at=datetime(2024, 1, 1),
+            updated_at=datetime(2024, 1, 1),
+            role=Role.user,
+            confirmed=True,
+            status_active=True,
+            token_version=2,
+        )
+
+    def test_round_trip(self):
+        cached = CachedUser.from_user(self.user)
+
+        restored = CachedUser.loads(cached.dumps())
+
+        self.assertEqual(restored, cached)
+        self.assertEqual(restored.id, 1)
+        self.assertEqual(restored.email, 'test_user@example.com')
+        self.assertEqual(restored.role, Role.user)
+        self.assertTrue(restored.status_active)
+        self.assertTrue(restored.confirmed)
+        self.assertEqual(restored.password_version, password_version(self.user.password))
+        self.assertEqual(restored.token_version, 2)
+        self.assertNotIn(self.user.password.encode(), cached.dumps())
+
+    def test_password_version_changes_with_password(self):
+        before = CachedUser.from_user(self.user).password_version
+        self.user.password = '$2b$12$another.hash'
+
+        self.assertNotEqual(CachedUser.from_user(self.user).password_version, before)
+
+    def test_other_schema_version_is_a_miss(self):
+        data = CachedUser.from_user(self.user).dumps().replace(
+            f'[{CACHE_SCHEMA_VERSION},'.encode(), f'[{CACHE_SCHEMA_VERSION + 1},'.encode(), 1
+        )
+
+        self.assertIsNone(CachedUser.loads(data))
+
+    def test_pickled_user_is_a_miss(self):
+        self.assertIsNone(CachedUser.loads(pickle.dumps(self.user)))
+        self.assertIsNone(CachedUser.loads(b'not json'))
+
+    def test_snapshot_is_smaller_than_pickle(self):
+        pickled = pickle.dumps(self.user)
+        snapshot = CachedUser.from_user(self.user).dumps()
+
+        self.assertLess(len(snapshot), len(pickled) / 4)
+
+
+class TestLocalUserCache(unittest.TestCase):
+
+    def setUp(self):
+        self.user = CachedUser(1, 'a@example.com', Role.user, True, True, 'version')
+
+    def test_hit_and_miss(self):
+        cache = LocalUserCache(maxsize=2, ttl=60)
+
+        self.assertIsNone(cache.get('a@example.com'))
+        cache.put(self.user)
+
+        self.assertIs(cache.get('a@example.com'), self.user)
+        self.assertEqual(cache.info()['hits'], 1)
+        self.assertEqual(cache.info()['misses'], 1)
+
+    def test_expired_entry_is_a_miss(self):
+        cache = LocalUserCache(maxsize=2, ttl=60)
+        cache.put(self.user)
+
+        with patch('src.services.user_cache.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(cache.get('a@example.com'))
+        self.assertEqual(cache.info()['size'], 0)
+
+    def test_lru_eviction(self):
+        cache = LocalUserCache(maxsize=2, ttl=60)
+        cache.put(self.user)
+        cache.put(CachedUser(2, 'b@example.com', Role.user, True, True, 'version'))
+        cache.get('a@example.com')
+        cache.put(CachedUser(3, 'c@example.com', Role.user, True, True, 'version'))
+
+        self.assertIsNotNone(cache.get('a@example.com'))
+        self.assertIsNone(cache.get('b@example.com'))
+        self.assertIsNotNone(cache.get('c@example.com'))
+
+
+class TestClearUserCash(unittest.IsolatedAsyncioTestCase):
+
+    async def test_invalidation_is_published(self):
+        token_manager = auth_service.token_manager
+        user = CachedUser(1, 'a@example.com', Role.user, True, True, 'version')
+        token_manager.user_cache.put(user)
+
+        with patch.object(token_manager, 'r', new_callable=AsyncMock) as r_mock:
+            await token_manager.clear_user_cash('a@example.com')
+
+            r_mock.delete.assert_awaited_once_with('user:a@example.com')
+            r_mock.publish.assert_awaited_once_with(USERS_CHANNEL, 'a@example.com')
+        self.assertIsNone(token_manager.user_cache.get('a@example.com'))
+
+
+class TestTokenVersions(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.token_manager = auth_service.token_manager
+        self.token_manager.user_cache.clear()
+        self.token_manager.token_versions.clear()
+        self.user = User(id=7, email='claims@example.com', password='hash', role=Role.moderator,
+                         confirmed=True, status_active=True, token_version=3)
+
+    async def test_token_version_cache(self):
+        cache = TokenVersionCache(maxsize=2, ttl=60)
+        r_mock = AsyncMock()
+        r_mock.get.return_value = None
+
+        self.assertIsNone(await cache.get(1, r_mock))
+        self.assertTrue(await cache.put(1, 5, r_mock))
+        r_mock.set.assert_awaited_once_with('token_version:1', 5, ex=CACHE_TTL, nx=True)
+        self.assertEqual(await cache.get(1, r_mock), 5)
+
+        await cache.invalidate(1, r_mock)
+        r_mock.publish.assert_awaited_once_with(TOKEN_VERSIONS_CHANNEL, 1)
+        self.assertIsNone(await cache.get(1, r_mock))
+
+    async def test_token_version_put_keeps_existing_version(self):
+        cache = TokenVersionCache(maxsize=2, ttl=60)
+        r_mock = AsyncMock()
+        r_mock.get.return_value = None
+        r_mock.set.return_value = None
+
+        self.assertFalse(await cache.put(1, 5, r_mock))
+        self.assertIsNone(await cache.get(1, r_mock))
+
+    async def test_current_version_authorizes_without_loading_user(self):
+        token = await self.token_manager.create_access_token(data=self.token_manager.access_token_data(self.user))
+
+        with patch.object(self.token_manager, 'r', new_callable=AsyncMock) as r_mock, \
+                patch('src.repository.users.get_user_by_email', new_callable=AsyncMock) as get_user_mock:
+            r_mock.get.return_value = b'3'
+            current_user = await self.token_manager.get_current_user(token, AsyncMock())
+
+        get_user_mock.assert_not_awaited()
+        self.assertIsInstance(current_user, TokenClaims)
+        self.assertEqual((current_user.id, current_user.email, current_user.role), (7, 'claims@example.com', Role.moderator))
+
+    async def test_old_version_loads_user(self):
+        token = await self.token_manager.create_access_token(data=self.token_manager.access_token_data(self.user))
+        self.user.token_version = 4
+        self.user.role = Role.user
+
+        with patch.object(self.token_manager, 'r', new_callable=AsyncMock) as r_mock, \
+                patch('src.repository.users.get_user_by_email', new_callable=AsyncMock) as get_user_mock:
+            r_mock.get.return_value = None
+            get_user_mock.return_value = self.user
+            current_user = await self.token_manager.get_current_user(token, AsyncMock())
+
+        get_user_mock.assert_awaited_once()
+        self.assertIsInstance(current_user, CachedUser)
+        self.assertEqual(current_user.role, Role.user)
+        self.assertEqual(await self.token_manager.token_versions.get(7, AsyncMock()), 4)
+
+    async def test_snapshot_from_redis_publishes_version(self):
+        token = await self.token_manager.create_access_token(data=self.token_manager.access_token_data(self.user))
+        snapshot = CachedUser.from_user(self.user).dumps()
+
+        with patch.object(self.token_manager, 'r', new_callable=AsyncMock) as r_mock, \
+                patch('src.repository.users.get_user_by_email', new_callable=AsyncMock) as get_user_mock:
+            r_mock.get.side_effect = [None, snapshot]
+            current_user = await self.token_manager.get_current_user(token, AsyncMock())
+
+        get_user_mock.assert_not_awaited()
+        self.assertIsInstance(current_user, CachedUser)
+        r_mock.set.assert_awaited_once_with('token_version:7', 3, ex=CACHE_TTL, nx=True)